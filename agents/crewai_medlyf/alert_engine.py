@@ -0,0 +1,204 @@
+"""
+Alert engine for the crew's alerting agent.
+
+The alerting agent submits an alert for every forecast or plan that crosses
+the threshold, so a hospital that stays over capacity would alert on every
+upload and a city-wide surge would send one notification per hospital. The
+engine sits between the two:
+
+- dedup: an alert for a (hospital, kind) already alerted within
+  ALERT_DEDUP_TTL_S is suppressed. Entries expire in insertion order, so the
+  cache is trimmed in O(1) per alert and never outgrows the live hospitals.
+- digest: alerts that pass are queued per recipient and sent together,
+  ALERT_DIGEST_WINDOW_S after the first one, as one notification.
+- rate limit: each recipient has a token bucket (ALERT_RATE_PER_MIN, burst
+  ALERT_BURST). A digest without a token waits for the next one, and alerts
+  arriving meanwhile join it.
+
+Suppressed and delayed alerts are counted in medlyf_alerts_total.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+from metrics import METRICS
+
+ALERT_DEDUP_TTL_S = float(os.getenv("ALERT_DEDUP_TTL_S", "3600"))
+ALERT_DIGEST_WINDOW_S = float(os.getenv("ALERT_DIGEST_WINDOW_S", "5"))  # 0 = no grouping
+ALERT_RATE_PER_MIN = float(os.getenv("ALERT_RATE_PER_MIN", "6"))  # notifications per recipient
+ALERT_BURST = int(os.getenv("ALERT_BURST", "3"))
+ALERT_DIGEST_MAX = int(os.getenv("ALERT_DIGEST_MAX", "50"))  # alerts listed in one digest; the rest are counted
+
+ALERTS = METRICS.counter("medlyf_alerts_total", "Alerts by outcome (queued, deduped, rate_limited, sent, failed).",
+                         ("kind", "outcome"))
+DIGESTS = METRICS.counter("medlyf_alert_digests_total", "Notifications sent (each one a digest of alerts).")
+
+
+class DedupCache:
+    """Keys seen within ttl_s; every key has the same TTL, so the oldest expire first."""
+
+    def __init__(self, ttl_s, clock=time.monotonic):
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self._expires = OrderedDict()
+
+    def _evict(self, now):
+        while self._expires:
+            key, expires = next(iter(self._expires.items()))
+            if expires > now:
+                break
+            del self._expires[key]
+
+    def seen(self, key):
+        """True if key was added less than ttl_s ago; otherwise adds it."""
+        now = self.clock()
+        self._evict(now)
+        if key in self._expires:
+            return True
+        self._expires[key] = now + self.ttl_s
+        return False
+
+    def __len__(self):
+        return len(self._expires)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s, burst, clock=time.monotonic):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate_per_s)
+        self.updated = now
+
+    def take(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_s(self):
+        """Seconds until a token is available."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 or self.rate_per_s <= 0 else (1 - self.tokens) / self.rate_per_s
+
+
+class AlertEngine:
+    """
+    submit() dedups an alert and queues it for its recipients; send(recipient,
+    alerts) is awaited once per digest.
+    """
+
+    def __init__(self, send, dedup_ttl_s=ALERT_DEDUP_TTL_S, window_s=ALERT_DIGEST_WINDOW_S,
+                 rate_per_min=ALERT_RATE_PER_MIN, burst=ALERT_BURST, clock=time.monotonic):
+        self.send = send
+        self.window_s = window_s
+        self.rate_per_s = rate_per_min / 60
+        self.burst = burst
+        self.clock = clock
+        self.dedup = DedupCache(dedup_ttl_s, clock)
+        self._buckets = {}
+        self._pending = {}  # recipient -> [alert]
+        self._timer = None
+        self._tasks = set()
+        self.counts = {"queued": 0, "deduped": 0, "rate_limited": 0, "sent": 0, "failed": 0}
+
+    def _count(self, kind, outcome, n=1):
+        self.counts[outcome] += n
+        ALERTS.inc(n, kind=kind, outcome=outcome)
+
+    def submit(self, hospital_id, kind, message, recipients, severity="high"):
+        """Returns "queued" or "deduped"."""
+        if self.dedup.seen((hospital_id, kind)):
+            self._count(kind, "deduped")
+            return "deduped"
+        alert = {"hospital_id": hospital_id, "kind": kind, "message": message, "severity": severity}
+        for recipient in recipients:
+            self._pending.setdefault(recipient, []).append(alert)
+        self._count(kind, "queued")
+        self._schedule(self.window_s)
+        return "queued"
+
+    def _schedule(self, delay_s):
+        if self._timer is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(max(delay_s, 0), lambda: self._spawn(self.flush()))
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        """Sends every recipient's queued alerts its bucket allows; the rest wait for a token."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        ready, wait_s = [], None
+        for recipient, alerts in list(self._pending.items()):
+            bucket = self._buckets.get(recipient)
+            if bucket is None:
+                bucket = self._buckets[recipient] = TokenBucket(self.rate_per_s, self.burst, self.clock)
+            if bucket.take():
+                ready.append((recipient, self._pending.pop(recipient)))
+            else:
+                for alert in alerts:
+                    if not alert.get("delayed"):  # counted once, however long it waits
+                        alert["delayed"] = True
+                        self._count(alert["kind"], "rate_limited")
+                w = bucket.wait_s()
+                wait_s = w if wait_s is None else min(wait_s, w)
+        if wait_s is not None:
+            self._schedule(wait_s)
+        await asyncio.gather(*(self._send(recipient, alerts) for recipient, alerts in ready))
+
+    async def _send(self, recipient, alerts):
+        try:
+            await self.send(recipient, alerts)
+        except Exception as e:
+            print(f"[AlertEngine] notification to {recipient} failed: {e}")
+            for alert in alerts:
+                self._count(alert["kind"], "failed")
+            return
+        DIGESTS.inc()
+        for alert in alerts:
+            self._count(alert["kind"], "sent")
+
+    async def drain(self):
+        """Sends everything queued, ignoring the rate limit (shutdown)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        await asyncio.gather(*self._tasks, *(self._send(r, alerts) for r, alerts in pending.items()),
+                             return_exceptions=True)
+
+    def stats(self):
+        return {
+            **self.counts,
+            "pending": sum(len(a) for a in self._pending.values()),
+            "dedup_keys": len(self.dedup),
+            "recipients": len(self._buckets),
+        }
+
+
+def digest(alerts, limit=ALERT_DIGEST_MAX):
+    """(hospital_id, message, severity) summarising alerts for one notification."""
+    if len(alerts) == 1:
+        a = alerts[0]
+        return a["hospital_id"], a["message"], a["severity"]
+    hospitals = list(dict.fromkeys(a["hospital_id"] for a in alerts))
+    lines = [f"{a['hospital_id']}: {a['message']}" for a in alerts[:limit]]
+    if len(alerts) > limit:
+        lines.append(f"... and {len(alerts) - limit} more")
+    severity = "high" if any(a["severity"] == "high" for a in alerts) else alerts[0]["severity"]
+    message = f"{len(alerts)} alerts for {len(hospitals)} hospitals:\n" + "\n".join(lines)
+    return (hospitals[0] if len(hospitals) == 1 else "city"), message, severity
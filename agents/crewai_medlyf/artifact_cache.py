@@ -0,0 +1,370 @@
+"""
+Content-addressed local cache for model artifacts.
+
+A checkout of this repo holds Git LFS pointer stubs (~130 bytes naming the
+sha256 and size of the real file) instead of the pickles, and a node may
+have no network. resolve() turns a models folder into real, verified files:
+
+- expected files come from the folder's manifest.json ({name: {"sha256",
+  "size"}}) and from any LFS pointers in it, which pin the same two values
+- a real file whose size and sha256 match is kept; a pointer, or a file that
+  doesn't match (corrupt, truncated), is replaced by the cached object
+  <ARTIFACT_CACHE_DIR>/objects/<sha256[:2]>/<sha256>, or fetched from the
+  first source that has a matching copy: a local directory, a tarball or
+  "hf:<repo_id>" (Hugging Face)
+- files are verified and fetched in parallel; every fetched file is checked
+  against its pin before it enters the cache, and the cache is never
+  written in place (tmp file + rename), so several processes and nodes
+  can share it
+- the pins used are written to manifest.json, so files keep being verified
+  after their pointers have been replaced
+
+A folder with no model files and no pins is bootstrapped from the first
+source that lists any. prewarm() fills the cache without touching a
+models folder, so air-gapped nodes can start from a cache populated
+ahead of time:
+
+    python artifact_cache.py prewarm models --source /mnt/models.tar.gz
+    python artifact_cache.py resolve models    # what a server does at startup
+    python artifact_cache.py verify models     # read-only: exit 1 on any mismatch
+    python artifact_cache.py manifest models   # pin the files now in models/
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ARTIFACT_CACHE_DIR = os.getenv("ARTIFACT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "medlyf",
+                                                                  "artifacts"))
+# Comma-separated directories, tarballs or hf:<repo_id>, tried in order
+MODEL_SOURCES = [s.strip() for s in os.getenv("MODEL_SOURCES", "").split(",") if s.strip()]
+ARTIFACT_FETCH_THREADS = int(os.getenv("ARTIFACT_FETCH_THREADS", "4"))
+
+MANIFEST_FILE = "manifest.json"
+LFS_HEADER = b"version https://git-lfs.github.com/spec/v1"
+LFS_MAX_POINTER_BYTES = 1024
+
+
+class CorruptArtifact(ValueError):
+    """A file does not match the sha256 / size it is pinned to."""
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def lfs_pointer(path):
+    """{"sha256", "size"} if `path` is a Git LFS pointer stub, else None."""
+    try:
+        if os.path.getsize(path) > LFS_MAX_POINTER_BYTES:
+            return None
+        with open(path, "rb") as f:
+            text = f.read(LFS_MAX_POINTER_BYTES)
+    except OSError:
+        return None
+    if not text.startswith(LFS_HEADER):
+        return None
+    fields = dict(line.split(" ", 1) for line in text.decode("utf-8", "replace").splitlines() if " " in line)
+    oid, size = fields.get("oid", ""), fields.get("size", "")
+    if not oid.startswith("sha256:") or not size.isdigit():
+        return None
+    return {"sha256": oid.split(":", 1)[1], "size": int(size)}
+
+
+def _load_manifest(models_dir):
+    try:
+        with open(os.path.join(models_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        print(f"   ⚠️ Ignoring unreadable {MANIFEST_FILE}: {e}")
+        return {}
+
+
+def read_manifest(models_dir, want=lambda fname: True):
+    """{name: {"sha256", "size"}} from manifest.json plus the folder's LFS pointers."""
+    pins = _load_manifest(models_dir)
+    for fname in sorted(os.listdir(models_dir)) if os.path.isdir(models_dir) else []:
+        if want(fname):
+            pointer = lfs_pointer(os.path.join(models_dir, fname))
+            if pointer is not None:
+                pins[fname] = pointer
+    return {fname: pin for fname, pin in pins.items() if want(fname)}
+
+
+def write_manifest(models_dir, want=lambda fname: True):
+    """Pins every real model file now in models_dir; returns the manifest."""
+    manifest = {}
+    for fname in sorted(os.listdir(models_dir)):
+        path = os.path.join(models_dir, fname)
+        if want(fname) and os.path.isfile(path) and lfs_pointer(path) is None:
+            manifest[fname] = {"sha256": file_digest(path), "size": os.path.getsize(path)}
+    _atomic_write(os.path.join(models_dir, MANIFEST_FILE), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def _atomic_write(path, data):
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _atomic_copy(src, dest):
+    tmp = f"{dest}.tmp-{os.getpid()}-{threading.get_ident()}"
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+# ---------- sources ----------
+class DirSource:
+    def __init__(self, path):
+        self.path = path
+        self.name = path
+
+    def list(self):
+        return {f for f in os.listdir(self.path) if os.path.isfile(os.path.join(self.path, f))}
+
+    def fetch(self, fname, dest):
+        shutil.copyfile(os.path.join(self.path, fname), dest)
+
+
+class TarSource:
+    """Files anywhere in a (optionally compressed) tarball, by base name."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = path
+        self._members = None
+
+    def list(self):
+        if self._members is None:
+            with tarfile.open(self.path) as tar:
+                self._members = {os.path.basename(m.name): m for m in tar.getmembers() if m.isfile()}
+        return set(self._members)
+
+    def fetch(self, fname, dest):
+        self.list()
+        # One handle per call (fetches run in parallel and TarFile isn't thread-safe);
+        # the stored TarInfo lets it seek straight to the member
+        with tarfile.open(self.path) as tar, tar.extractfile(self._members[fname]) as src, open(dest, "wb") as out:
+            shutil.copyfileobj(src, out, 1 << 20)
+
+
+class HubSource:
+    """A Hugging Face model repo; huggingface_hub is imported only when it is used."""
+
+    def __init__(self, repo_id):
+        self.repo_id = repo_id
+        self.name = f"hf:{repo_id}"
+        self._files = None
+
+    def list(self):
+        if self._files is None:
+            from huggingface_hub import list_repo_files
+            self._files = set(list_repo_files(self.repo_id, repo_type="model"))
+        return self._files
+
+    def fetch(self, fname, dest):
+        from huggingface_hub import hf_hub_download
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(dest)) as tmp:
+            shutil.move(hf_hub_download(self.repo_id, fname, repo_type="model", local_dir=tmp), dest)
+
+
+def parse_source(spec):
+    if spec.startswith("hf:"):
+        return HubSource(spec[3:])
+    if spec.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")):
+        return TarSource(spec)
+    return DirSource(spec)
+
+
+# ---------- cache ----------
+class ArtifactCache:
+    def __init__(self, root=ARTIFACT_CACHE_DIR, threads=ARTIFACT_FETCH_THREADS):
+        self.root = root
+        self.threads = threads
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    def has(self, pin):
+        path = self.object_path(pin["sha256"])
+        return os.path.isfile(path) and os.path.getsize(path) == pin["size"]
+
+    def put(self, path, pin):
+        """Adds the file at `path` under its pin; raises CorruptArtifact if it doesn't match."""
+        verify(path, pin)
+        dest = self.object_path(pin["sha256"])
+        if not os.path.isfile(dest):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            _atomic_copy(path, dest)
+        return dest
+
+    def fetch(self, fname, pin, sources, log):
+        """Cached object for (fname, pin), fetched from the first source with a matching copy."""
+        if pin is not None and self.has(pin):
+            return self.object_path(pin["sha256"]), "cache"
+        os.makedirs(self.root, exist_ok=True)
+        for source in sources:
+            try:
+                if fname not in source.list():
+                    continue
+                with tempfile.TemporaryDirectory(dir=self.root) as tmp:
+                    dest = os.path.join(tmp, os.path.basename(fname))
+                    source.fetch(fname, dest)
+                    actual = pin or {"sha256": file_digest(dest), "size": os.path.getsize(dest)}
+                    return self.put(dest, actual), source.name
+            except CorruptArtifact as e:
+                log.setdefault("corrupt_sources", []).append(f"{source.name}/{fname}: {e}")
+            except Exception as e:
+                log.setdefault("source_errors", {})[source.name] = f"{type(e).__name__}: {e}"
+        return None, None
+
+    def resolve(self, models_dir, sources=(), want=lambda fname: True):
+        """
+        Makes every pinned (or, for an empty folder, every available) model
+        file in models_dir real and verified. Returns a report; files it
+        couldn't resolve are listed under "unusable" and left as they are.
+        """
+        start = time.perf_counter()
+        sources = [parse_source(s) if isinstance(s, str) else s for s in sources]
+        os.makedirs(models_dir, exist_ok=True)
+        pins = read_manifest(models_dir, want)
+        local = [f for f in os.listdir(models_dir) if want(f) and os.path.isfile(os.path.join(models_dir, f))]
+        log = {}
+        if not pins and not local:
+            pins = self._bootstrap_listing(sources, want, log)
+
+        def one(fname):
+            path, pin = os.path.join(models_dir, fname), pins[fname]
+            if pin is not None and os.path.isfile(path) and lfs_pointer(path) is None:
+                try:
+                    verify(path, pin)
+                    if not self.has(pin):
+                        self.put(path, pin)
+                    return fname, "ok", pin
+                except CorruptArtifact:
+                    status = "repaired"
+                except OSError:
+                    return fname, "ok", pin  # verified, but the cache isn't writable
+            else:
+                status = "fetched"
+            obj, origin = self.fetch(fname, pin, sources, log)
+            if obj is None:
+                return fname, "missing" if status == "fetched" else "corrupt", pin
+            _atomic_copy(obj, path)
+            return fname, f"{status}:{origin}", {"sha256": os.path.basename(obj), "size": os.path.getsize(obj)}
+
+        with ThreadPoolExecutor(max_workers=max(1, self.threads)) as pool:
+            results = list(pool.map(one, sorted(pins)))
+        files = {fname: status for fname, status, _ in results}
+        unusable = sorted(f for f, s in files.items() if s in ("missing", "corrupt"))
+        for fname in unusable:
+            print(f"   ⚠️ Model file {fname} is {files[fname]}: not served")
+        # Pointers are gone once resolved: keep their pins so later starts still verify
+        resolved = {fname: pin for fname, _, pin in results if pin is not None}
+        if resolved and resolved != _load_manifest(models_dir):
+            _atomic_write(os.path.join(models_dir, MANIFEST_FILE),
+                          json.dumps(dict(_load_manifest(models_dir), **resolved), indent=2, sort_keys=True).encode())
+        return dict(log, files=files, unusable=unusable, seconds=round(time.perf_counter() - start, 3))
+
+    def _bootstrap_listing(self, sources, want, log):
+        for source in sources:
+            try:
+                names = sorted(f for f in source.list() if want(os.path.basename(f)))
+            except Exception as e:
+                log.setdefault("source_errors", {})[source.name] = f"{type(e).__name__}: {e}"
+                continue
+            if names:
+                return {name: None for name in names}
+        return {}
+
+    def prewarm(self, models_dir, sources=(), want=lambda fname: True):
+        """Fetches every pinned file of models_dir into the cache (models_dir is not modified)."""
+        sources = [parse_source(s) if isinstance(s, str) else s for s in sources]
+        local = DirSource(models_dir)
+        pins, log = read_manifest(models_dir, want), {}
+
+        def one(fname):
+            # Real, matching files in the folder itself count as a source too
+            obj, origin = self.fetch(fname, pins[fname], [local, *sources], log)
+            return fname, origin or "missing"
+
+        with ThreadPoolExecutor(max_workers=max(1, self.threads)) as pool:
+            files = dict(pool.map(one, sorted(pins)))
+        return dict(log, files=files, missing=sorted(f for f, s in files.items() if s == "missing"))
+
+
+def verify(path, pin):
+    size = os.path.getsize(path)
+    if size != pin["size"]:
+        raise CorruptArtifact(f"{os.path.basename(path)}: {size} bytes, expected {pin['size']}")
+    digest = file_digest(path)
+    if digest != pin["sha256"]:
+        raise CorruptArtifact(f"{os.path.basename(path)}: sha256 {digest[:12]}, expected {pin['sha256'][:12]}")
+
+
+def verify_folder(models_dir, want=lambda fname: True, threads=ARTIFACT_FETCH_THREADS):
+    """
+    Checks every pinned file of models_dir against its pin without changing
+    anything. Each file is "ok", "pointer" (not resolved yet), "missing" or
+    "corrupt"; the ones that aren't ok are listed under "mismatched".
+    """
+    pins = read_manifest(models_dir, want)
+
+    def one(fname):
+        path = os.path.join(models_dir, fname)
+        if not os.path.isfile(path):
+            return fname, "missing"
+        if lfs_pointer(path) is not None:
+            return fname, "pointer"
+        try:
+            verify(path, pins[fname])
+        except CorruptArtifact:
+            return fname, "corrupt"
+        return fname, "ok"
+
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+        files = dict(pool.map(one, sorted(pins)))
+    return {"files": files, "mismatched": sorted(f for f, s in files.items() if s != "ok")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["prewarm", "resolve", "verify", "manifest"])
+    parser.add_argument("models_dir")
+    parser.add_argument("--source", action="append", default=[], help="directory, tarball or hf:<repo_id>")
+    parser.add_argument("--cache", default=ARTIFACT_CACHE_DIR)
+    args = parser.parse_args()
+
+    from model_registry import is_model_file
+
+    cache = ArtifactCache(args.cache)
+    if args.command == "manifest":
+        report = write_manifest(args.models_dir, is_model_file)
+    elif args.command == "prewarm":
+        report = cache.prewarm(args.models_dir, args.source or MODEL_SOURCES, is_model_file)
+    elif args.command == "resolve":
+        report = cache.resolve(args.models_dir, args.source or MODEL_SOURCES, is_model_file)
+    else:
+        report = verify_folder(args.models_dir, is_model_file)
+    print(json.dumps(report, indent=2))
+    if args.command == "verify" and report["mismatched"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
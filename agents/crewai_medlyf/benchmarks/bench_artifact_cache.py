@@ -0,0 +1,88 @@
+"""
+Cold-start time of artifact_cache.resolve() for a models folder of LFS
+pointer stubs: fetched from a tarball or a directory, served from a
+prewarmed cache (air-gapped node), and a warm restart where every file is
+already real and only verified. Each is timed with 1 and N fetch threads.
+
+Run: python benchmarks/bench_artifact_cache.py [--files 10,50] [--mb 20] [--threads 4]
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+
+import numpy as np
+
+from bench_support import save_results
+
+
+def write_upstream(workdir, n_files, size_mb, seed=0):
+    """n_files random model files (real) and the matching LFS pointer stubs (checkout)."""
+    rng = np.random.default_rng(seed)
+    real, checkout = os.path.join(workdir, "real"), os.path.join(workdir, "checkout")
+    os.makedirs(real)
+    os.makedirs(checkout)
+    for i in range(n_files):
+        data = rng.bytes(int(size_mb * 1e6 / n_files))
+        fname = f"prophet_Disease_{i:03d}.pkl"
+        with open(os.path.join(real, fname), "wb") as f:
+            f.write(data)
+        with open(os.path.join(checkout, fname), "w") as f:
+            f.write("version https://git-lfs.github.com/spec/v1\n"
+                    f"oid sha256:{hashlib.sha256(data).hexdigest()}\nsize {len(data)}\n")
+    tarball = os.path.join(workdir, "models.tar")
+    with tarfile.open(tarball, "w") as tar:
+        tar.add(real, arcname="models")
+    return real, checkout, tarball
+
+
+def timed_resolve(checkout, cache_root, sources, threads, fresh=True):
+    from artifact_cache import ArtifactCache
+    from model_registry import is_model_file
+
+    target = checkout + ".run"
+    if fresh:
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.copytree(checkout, target)
+    start = time.perf_counter()
+    report = ArtifactCache(cache_root, threads=threads).resolve(target, sources, want=is_model_file)
+    elapsed = time.perf_counter() - start
+    assert not report["unusable"], report
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", default="10,50")
+    parser.add_argument("--mb", type=float, default=20, help="total size of the model files")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    rows = []
+    for n in (int(f) for f in args.files.split(",")):
+        with tempfile.TemporaryDirectory() as workdir:
+            real, checkout, tarball = write_upstream(workdir, n, args.mb)
+            for threads in sorted({1, args.threads}):
+                cache = os.path.join(workdir, f"cache-{threads}")
+                row = {"files": n, "threads": threads, "mb": args.mb}
+                row["tarball_s"] = timed_resolve(checkout, cache, [tarball], threads)
+                shutil.rmtree(cache)
+                row["directory_s"] = timed_resolve(checkout, cache, [real], threads)
+                row["cache_s"] = timed_resolve(checkout, cache, [], threads)
+                row["warm_restart_s"] = timed_resolve(checkout, cache, [], threads, fresh=False)
+                for key in ("tarball_s", "directory_s", "cache_s", "warm_restart_s"):
+                    row[key] = round(row[key], 4)
+                rows.append(row)
+                print(f"{n} files / {args.mb} MB / {threads} threads: tarball {row['tarball_s']}s, "
+                      f"directory {row['directory_s']}s, cache {row['cache_s']}s, warm {row['warm_restart_s']}s")
+
+    save_results("artifact_cache", {"mb": args.mb}, rows, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+How the city-wide optimizer's solve time grows with the number of hospitals.
+
+Run: python benchmarks/bench_city_optimizer.py [--sizes 100,1000,5000] [--repeat 3]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from city_optimizer import plan_city  # noqa: E402
+
+
+def synthetic_city(n, seed=0):
+    """n hospitals around 80% capacity spread over a 30x30 km city."""
+    rng = np.random.default_rng(seed)
+    peaks = rng.normal(75, 15, n).clip(0)
+    coords = rng.uniform(0, 30, (n, 2))
+    return [f"H{i:05d}" for i in range(n)], peaks, coords
+
+
+def time_plan(ids, peaks, coords, repeat):
+    samples, summary = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, summary = plan_city(ids, peaks, 80.0, coords)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,500,1000,2000,5000,10000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Warm up imports (scipy) so the first row isn't dominated by them
+    plan_city(*synthetic_city(50)[:2], 80.0, synthetic_city(50)[2])
+
+    print(f"{'hospitals':>9} {'uniform_ms':>11} {'lp_ms':>9} {'transfers':>10} {'tankers':>8}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        ids, peaks, coords = synthetic_city(n)
+        uniform_ms, _ = time_plan(ids, peaks, None, args.repeat)
+        lp_ms, summary = time_plan(ids, peaks, coords, args.repeat)
+        print(f"{n:>9} {uniform_ms:>11.1f} {lp_ms:>9.1f} {summary['transferred']:>10.0f} {summary['tankers']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+End-to-end event latency through crew.py: data_uploaded -> prediction_ready
+-> optimized_plan -> job_created, per hospital.
+
+The crew runs in-process against fakeredis (or --redis-url) and a local
+jobs server; an observer on the same bus timestamps every stage. Hospital
+uploads are synthetic and above the alert threshold, so every hospital ends
+in a tanker job.
+
+Run: python benchmarks/bench_crew_latency.py [--hospitals 20] [--transport pubsub|streams] [--forecaster incremental|moving_average]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from bench_support import latency_summary, quiet, save_results, start_jobs_server, write_upload_csv
+
+STAGES = ["prediction_ready", "optimized_plan", "job_created"]
+
+
+def redis_client(url):
+    if url:
+        import redis.asyncio as aioredis
+        return aioredis.from_url(url, decode_responses=False)
+    import fakeredis
+    return fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=False)
+
+
+async def run(args, workdir):
+    os.chdir(workdir)  # crew keeps its models/ (and ingest cache) under the working directory
+    with quiet():
+        import crew
+    from event_transport import PubSubTransport, StreamTransport
+    from http_client import JobBatcher, ServerClient
+    from incremental_forecast import IncrementalForecaster
+    from ingestion import IngestCache
+
+    base_url, runner, received = await start_jobs_server(args.server_latency_ms / 1000)
+    r = redis_client(args.redis_url)
+    channel = f"bench_{os.getpid()}"
+    if args.transport == "streams":
+        crew._transport = StreamTransport(r, channel, "bench", consumer="crew", block_ms=100, encode=crew.encode)
+    else:
+        crew._transport = PubSubTransport(r, channel, encode=crew.encode)
+    crew.HTTP = ServerClient(base_url)
+    crew.JOBS = JobBatcher(crew.HTTP, window_s=crew.JOB_COALESCE_WINDOW_S)
+    crew.INGEST = IngestCache(Path(workdir) / "ingest")
+    crew.FORECASTER = IncrementalForecaster(Path(workdir) / "models", periods=5)
+    crew.OPT_WINDOW_S = args.opt_window
+    crew.METRICS_PORT = 0
+    if args.forecaster == "moving_average":
+        crew.fit_prophet_forecast = lambda df, hospital_id: (None, {})
+
+    uploads = {}
+    for i in range(args.hospitals):
+        hid = f"H{i:04d}"
+        # Half the hospitals run far above capacity (more than donors can
+        # cover, so each gets a tanker job), half have room to donate
+        level = 140.0 if i % 2 == 0 else 40.0
+        uploads[hid] = str(write_upload_csv(Path(workdir) / f"{hid}.csv", days=args.days, level=level, seed=i))
+
+    seen = {stage: {} for stage in STAGES}
+    sent_at = {}
+    done = asyncio.Event()
+    jobs = {"expected": 0, "created": 0}
+
+    async def observe(payload, on_done=None):
+        etype, hid, now = payload.get("event_type"), payload.get("hospital_id"), time.perf_counter()
+        if etype == "optimized_plan":
+            # A city plan covers every hospital with a forecast so far
+            for h in list(seen["prediction_ready"]):
+                seen[etype].setdefault(h, now)
+            jobs["expected"] += sum(a.get("action") == "request_tanker" for a in payload.get("plan", []))
+        elif etype in seen and hid in sent_at:
+            seen[etype].setdefault(hid, now)
+            jobs["created"] += etype == "job_created"
+        if on_done is not None:
+            await on_done(True)
+        # Finished once every hospital is planned and every requested tanker has its job
+        if len(seen["optimized_plan"]) == len(uploads) and jobs["created"] >= jobs["expected"]:
+            done.set()
+
+    if args.transport == "streams":
+        observer = StreamTransport(r, channel, "observer", consumer="observer", block_ms=100)
+    else:
+        observer = PubSubTransport(r, channel)
+    watch = asyncio.create_task(observer.consume(observe, crew.decode_event))
+    with quiet():
+        crew_task = asyncio.create_task(crew.subscriber_loop())
+    await asyncio.sleep(0.2)  # both subscribed before the first upload
+
+    started = time.perf_counter()
+    for hid, path in uploads.items():
+        sent_at[hid] = time.perf_counter()
+        await crew.publish_event({"event_type": "data_uploaded", "ts": crew.now(), "hospital_id": hid, "file_path": path})
+        if args.interval_ms:
+            await asyncio.sleep(args.interval_ms / 1000)
+    try:
+        with quiet():
+            await asyncio.wait_for(done.wait(), timeout=args.timeout)
+        timed_out = False
+    except asyncio.TimeoutError:
+        timed_out = True
+    wall = time.perf_counter() - started
+
+    for task in (crew_task, watch):
+        task.cancel()
+    await asyncio.gather(crew_task, watch, return_exceptions=True)
+    await crew.HTTP.close()
+    await runner.cleanup()
+
+    row = {
+        "hospitals": args.hospitals,
+        "transport": args.transport,
+        "forecaster": args.forecaster,
+        "wall_s": round(wall, 3),
+        "timed_out": timed_out,
+        "tankers_planned": jobs["expected"],
+        "jobs_received": received["jobs"],
+        "job_requests": received["requests"],
+    }
+    for stage in STAGES:
+        row[stage] = latency_summary([t - sent_at[h] for h, t in seen[stage].items()])
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hospitals", type=int, default=20)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--interval-ms", type=float, default=0, help="gap between uploads (0 = burst)")
+    parser.add_argument("--transport", choices=["pubsub", "streams"], default="pubsub")
+    parser.add_argument("--forecaster", choices=["incremental", "moving_average"], default="incremental")
+    parser.add_argument("--opt-window", type=float, default=0.2, help="crew OPT_WINDOW_S for the run")
+    parser.add_argument("--server-latency-ms", type=float, default=5)
+    parser.add_argument("--redis-url", help="real Redis instead of fakeredis")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            row = asyncio.run(run(args, workdir))
+        finally:
+            os.chdir(cwd)
+
+    print(f"{args.hospitals} hospitals, {args.transport}, {args.forecaster}: wall {row['wall_s']}s"
+          f"{' (TIMED OUT)' if row['timed_out'] else ''}, {row['jobs_received']} jobs in {row['job_requests']} requests")
+    for stage in STAGES:
+        s = row[stage]
+        print(f"  upload -> {stage:<17} n={s['n']:<4} p50 {s['p50_ms']} ms  p95 {s['p95_ms']} ms  p99 {s['p99_ms']} ms")
+    params = {k: v for k, v in vars(args).items() if k != "out"}
+    save_results("crew_latency", params, [row], args.out)
+
+
+if __name__ == "__main__":
+    main()
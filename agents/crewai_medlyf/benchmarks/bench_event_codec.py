@@ -0,0 +1,111 @@
+"""
+Payload size and encode / decode time of crew events: the original
+json.dumps / json.loads against event_codec's v1 (JSON rows), v2 JSON and
+v2 msgpack (columnar predictions), for each event type the crew publishes.
+
+Run: python benchmarks/bench_event_codec.py [--predictions 5,30] [--plan 20] [--repeat 2000]
+"""
+
+import argparse
+import json
+import time
+
+from bench_support import save_results
+
+CODECS = ["json", "v1", "v2-json", "v2-msgpack"]
+
+
+def sample_events(n_predictions, n_actions):
+    preds = [
+        {"ds": f"2024-03-{1 + i % 28:02d}", "yhat": 71.234567 + i, "yhat_lower": 65.987654 + i,
+         "yhat_upper": 77.456789 + i}
+        for i in range(n_predictions)
+    ]
+    plan = [
+        {"action": "request_tanker", "hospital_id": f"H{i:04d}", "quantity": 1 + i % 3,
+         "reason": f"predicted peak {90 + i % 10:.1f} over capacity 80.0"}
+        for i in range(n_actions)
+    ]
+    ts = "2024-03-01T10:15:00.123456Z"
+    return {
+        f"prediction_ready/{n_predictions}": {
+            "event_type": "prediction_ready", "ts": ts, "hospital_id": "H0001", "predictions": preds,
+            "model_meta": {"model": "prophet", "mode": "warm_start", "trained_rows": 180},
+        },
+        f"optimized_plan/{n_actions}": {
+            "event_type": "optimized_plan", "ts": ts, "hospital_id": "city", "plan": plan,
+            "summary": {"hospitals": n_actions, "shortfall": 42.5, "transfers": 3},
+        },
+        "alert_sent": {
+            "event_type": "alert_sent", "ts": ts, "hospital_id": "H0001", "severity": "high",
+            "message": "Predicted occupancy 91.2 >= 80.0 on 2024-03-02", "recipients": ["admin@example.com"],
+        },
+        "job_created": {
+            "event_type": "job_created", "ts": ts, "hospital_id": "H0001", "server_status": 201,
+            "job_payload": {"type": "oxygen_delivery", "hospitalId": "H0001", "quantity": 2, "priority": "high",
+                            "notes": "predicted peak 95.0 over capacity 80.0"},
+        },
+    }
+
+
+def codec_fns(name):
+    from event_codec import decode, encode
+
+    if name == "json":
+        return json.dumps, json.loads
+    if name == "v1":
+        return lambda e: encode(e, "v1"), decode
+    return lambda e: encode(e, name.split("-")[1]), decode
+
+
+def per_call_us(fn, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--predictions", default="5,30", help="prediction rows per prediction_ready")
+    parser.add_argument("--plan", type=int, default=20, help="actions in a city optimized_plan")
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    from event_codec import msgpack
+    codecs = [c for c in CODECS if c != "v2-msgpack" or msgpack is not None]
+
+    events = {}
+    for n in (int(p) for p in args.predictions.split(",")):
+        events.update(sample_events(n, args.plan))
+
+    rows = []
+    print(f"{'event':>22} {'codec':>10} {'bytes':>6} {'vs json':>7} {'encode_us':>9} {'decode_us':>9}")
+    for label, event in events.items():
+        baseline = None
+        for name in codecs:
+            enc, dec = codec_fns(name)
+            wire = enc(event)
+            size = len(wire.encode() if isinstance(wire, str) else wire)
+            baseline = baseline or size
+            encode_us = per_call_us(enc, event, args.repeat)
+            decode_us = per_call_us(dec, wire, args.repeat)
+            row = {
+                "event": label,
+                "codec": name,
+                "bytes": size,
+                "size_ratio": round(size / baseline, 3),
+                "encode_us": round(encode_us, 2),
+                "decode_us": round(decode_us, 2),
+                "encode_per_s": round(1e6 / encode_us),
+                "decode_per_s": round(1e6 / decode_us),
+            }
+            rows.append(row)
+            print(f"{label:>22} {name:>10} {size:>6} {row['size_ratio']:>7} {encode_us:>9.2f} {decode_us:>9.2f}")
+
+    save_results("event_codec", {"repeat": args.repeat, "plan": args.plan}, rows, args.out)
+
+
+if __name__ == "__main__":
+    main()
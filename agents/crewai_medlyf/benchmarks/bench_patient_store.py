@@ -0,0 +1,115 @@
+"""
+Load time and query latency of patient_store over synthetic admission
+exports (one JSON file per hospital, the shape of Data/*.json), against
+loading every file with json.load and scanning the records per query.
+
+Run: python benchmarks/bench_patient_store.py [--admissions 100000,1000000] [--hospitals 50] [--queries 2000]
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bench_support import latency_summary, save_results
+
+CONDITIONS = ["Stable", "Serious", "Critical", "Fair", "Good", "Moderate"]
+REASONS = ["Fever", "Accident", "Cough", "Headache", "Vomiting", "Chest Pain", "Viral Infection"]
+START = pd.Timestamp("2024-01-01")
+
+
+def write_exports(workdir, n, hospitals, days=365, seed=0):
+    rng = np.random.default_rng(seed)
+    admitted = START + pd.to_timedelta(rng.uniform(0, days * 86400, n), unit="s")
+    owner = rng.integers(0, hospitals, n)
+    condition = rng.integers(0, len(CONDITIONS), n)
+    reason = rng.integers(0, len(REASONS), n)
+    stamps = admitted.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    for h in range(hospitals):
+        idx = np.flatnonzero(owner == h)
+        records = [{"name": f"P{i}", "reason": REASONS[reason[i]], "injury": "-", "condition": CONDITIONS[condition[i]],
+                    "alive": True, "timeOfAdmit": stamps[i]} for i in idx]
+        (Path(workdir) / f"H{h:03d}.json").write_text(json.dumps(records))
+
+
+def time_queries(fn, windows, n):
+    samples = []
+    for i in range(n):
+        args = windows[i % len(windows)]
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return latency_summary(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--admissions", default="100000,1000000")
+    parser.add_argument("--hospitals", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--scan-queries", type=int, default=20, help="queries timed for the json.load + scan baseline")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    from patient_store import PatientStore
+
+    rng = np.random.default_rng(1)
+    rows = []
+    for n in (int(a) for a in args.admissions.split(",")):
+        with tempfile.TemporaryDirectory() as workdir:
+            write_exports(workdir, n, args.hospitals)
+            store = PatientStore(workdir)
+            start = time.perf_counter()
+            adm = store.get()
+            load_s = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(100):
+                store.get()
+            warm_get_ms = (time.perf_counter() - start) * 10
+
+            windows = []
+            for _ in range(200):
+                lo = START + pd.Timedelta(days=float(rng.uniform(0, 330)))
+                windows.append((lo, lo + pd.Timedelta(days=7), f"H{rng.integers(0, args.hospitals):03d}"))
+            queries = {
+                "admissions": lambda lo, hi, h: adm.admissions(lo, hi, h),
+                "condition_counts": lambda lo, hi, h: adm.counts(lo, hi, h),
+                "occupancy": lambda lo, hi, h: adm.occupancy(hi, h),
+                "city_condition_counts": lambda lo, hi, h: adm.counts(lo, hi),
+                "series": lambda lo, hi, h: adm.series(h),
+            }
+
+            # Baseline: what a consumer of the raw files does today
+            def scan(lo, hi, h):
+                counts = {}
+                for path in sorted(Path(workdir).glob("*.json")):
+                    for rec in json.loads(path.read_text()):
+                        t = pd.Timestamp(rec["timeOfAdmit"]).tz_localize(None)
+                        if lo <= t < hi:
+                            counts[rec["condition"]] = counts.get(rec["condition"], 0) + 1
+                return counts
+
+            row = {
+                "admissions": n,
+                "hospitals": args.hospitals,
+                "load_s": round(load_s, 3),
+                "warm_get_ms": round(warm_get_ms, 3),
+                "queries": {name: time_queries(fn, windows, args.queries) for name, fn in queries.items()},
+                "scan_baseline": time_queries(scan, windows, args.scan_queries) if n <= 100_000 else None,
+            }
+            rows.append(row)
+            print(f"{n} admissions / {args.hospitals} hospitals: load {row['load_s']}s, warm get {row['warm_get_ms']} ms")
+            for name, s in row["queries"].items():
+                print(f"  {name:<22} p50 {s['p50_ms']} ms  p99 {s['p99_ms']} ms")
+            if row["scan_baseline"]:
+                print(f"  {'json.load + scan':<22} p50 {row['scan_baseline']['p50_ms']} ms")
+
+    save_results("patient_store", {"queries": args.queries}, rows, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+/predict latency (p50/p95/p99) and throughput at several concurrency levels.
+
+By default the Flask app is served in-process (werkzeug, threaded) over a
+synthetic CSV and stub models; --url targets a running server instead (e.g.
+gunicorn -c gunicorn.conf.py). "table" requests hit the precomputed forecast
+table, "live" requests ask for a horizon outside it and run inference.
+
+Run: python benchmarks/bench_predict.py [--concurrency 1,4,16,64] [--duration 5] [--paths table,live]
+"""
+
+import argparse
+import asyncio
+import itertools
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import aiohttp
+
+from bench_support import (configure_forecasting_agent, disease_names, latency_summary, quiet, save_results,
+                           write_models, write_outbreak_csv)
+
+
+def serve_locally(workdir, n_diseases, models):
+    """Starts forecasting_agent's app on a free port; returns (base_url, server, diseases)."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    diseases = disease_names(n_diseases)
+    csv_path = write_outbreak_csv(Path(workdir) / "outbreaks.csv", diseases)
+    models_dir = write_models(Path(workdir) / "models", csv_path, kind=models)
+    fa, _ = configure_forecasting_agent(csv_path, models_dir)
+    with quiet():
+        fa.REGISTRY.warmup()
+        fa.materialize_forecasts()
+    server = make_server("127.0.0.1", 0, fa.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server, diseases
+
+
+async def load(base_url, diseases, horizons, concurrency, duration_s):
+    """concurrency clients requesting back to back for duration_s; returns the row for this level."""
+    latencies, statuses = [], Counter()
+    queries = itertools.cycle([(d, h) for h in horizons for d in diseases])
+    deadline = time.perf_counter() + duration_s
+
+    async def client(session):
+        while time.perf_counter() < deadline:
+            disease, horizon = next(queries)
+            start = time.perf_counter()
+            try:
+                async with session.get(f"{base_url}/predict", params={"disease": disease, "horizon": horizon}) as resp:
+                    await resp.read()
+                    statuses[resp.status] += 1
+            except aiohttp.ClientError:
+                statuses["error"] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = statuses.get(200, 0)
+    return {
+        "concurrency": concurrency,
+        "requests": sum(statuses.values()),
+        "ok": ok,
+        "shed_503": statuses.get(503, 0),
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "throughput_rps": round(ok / elapsed, 1) if elapsed else None,
+        **latency_summary(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="benchmark a running server instead of an in-process one")
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per concurrency level")
+    parser.add_argument("--paths", default="table,live")
+    parser.add_argument("--diseases", type=int, default=8)
+    parser.add_argument("--models", choices=["stub", "prophet"], default="stub")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.url:
+            base_url, server, diseases = args.url.rstrip("/"), None, disease_names(args.diseases)
+        else:
+            base_url, server, diseases = serve_locally(workdir, args.diseases, args.models)
+
+        rows = []
+        print(f"{'path':>5} {'conc':>5} {'rps':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'503':>5}")
+        for path in args.paths.split(","):
+            # Horizons 1-3 are materialized; 4-6 always run live inference
+            horizons = [1, 2, 3] if path == "table" else [4, 5, 6]
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                row = dict(path=path, **asyncio.run(load(base_url, diseases, horizons, concurrency, args.duration)))
+                rows.append(row)
+                print(f"{path:>5} {concurrency:>5} {row['throughput_rps']:>8} {row['p50_ms']:>8} "
+                      f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['shed_503']:>5}")
+        if server is not None:
+            server.shutdown()
+
+    params = {"url": args.url, "duration_s": args.duration, "diseases": args.diseases, "models": args.models}
+    save_results("predict", params, rows, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Per-call latency of Prophet inference: predict(make_future_dataframe(n))
+as forecasting_agent used to run it, against prophet_fast's NumPy engine
+(with and without uncertainty intervals), on real fitted models.
+
+Monthly models look like the outbreak models (yearly seasonality); daily
+ones like the crew's hospital models (daily + weekly seasonality).
+
+Run: python benchmarks/bench_prophet_fast.py [--models 4] [--periods 1,3] [--repeat 50]
+"""
+
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_support import fit_prophet, latency_summary, monthly_cases, save_results
+
+
+def fit_models(series, n):
+    from prophet import Prophet
+
+    models = []
+    for i in range(n):
+        if series == "monthly":
+            ds = pd.date_range("2020-01-01", periods=60, freq="MS")
+            models.append(fit_prophet(pd.DataFrame({"ds": ds, "y": monthly_cases(60, 100 * (1 + i), seed=i)})))
+        else:
+            rng = np.random.default_rng(i)
+            t = np.arange(180)
+            y = 70 + 0.05 * t + 5 * np.sin(2 * np.pi * t / 7) + rng.normal(0, 2, 180)
+            model = Prophet(daily_seasonality=True, weekly_seasonality=True)
+            model.fit(pd.DataFrame({"ds": pd.date_range("2024-01-01", periods=180, freq="D"), "y": y}))
+            models.append(model)
+    return models
+
+
+def time_calls(fn, models, repeat):
+    samples = []
+    for _ in range(repeat):
+        for model in models:
+            start = time.perf_counter()
+            fn(model)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models", type=int, default=4, help="fitted models per series type")
+    parser.add_argument("--series", default="monthly,daily")
+    parser.add_argument("--periods", default="1,3")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    from prophet_fast import engine_for
+
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    rows = []
+    print(f"{'series':>8} {'periods':>7} {'intervals':>9} {'predict_ms':>10} {'fast_ms':>8} {'speedup':>8} {'max_diff':>9}")
+    for series in args.series.split(","):
+        freq = "MS" if series == "monthly" else "D"
+        models = fit_models(series, args.models)
+        build = []
+        for model in models:
+            start = time.perf_counter()
+            assert engine_for(model) is not None, "model not supported by the fast path"
+            build.append(time.perf_counter() - start)
+
+        for periods in (int(p) for p in args.periods.split(",")):
+            slow = time_calls(lambda m: m.predict(m.make_future_dataframe(periods=periods, freq=freq)).tail(periods),
+                              models, args.repeat)
+            diff = max(
+                float(np.abs(engine_for(m).forecast(periods, freq)["yhat"]
+                             - m.predict(m.make_future_dataframe(periods=periods, freq=freq)).tail(periods)["yhat"]
+                             .to_numpy()).max())
+                for m in models
+            )
+            for intervals in (False, True):
+                fast = time_calls(lambda m: engine_for(m).forecast(periods, freq, intervals=intervals), models, args.repeat)
+                slow_s, fast_s = latency_summary(slow), latency_summary(fast)
+                row = {
+                    "series": series,
+                    "periods": periods,
+                    "intervals": intervals,
+                    "predict": slow_s,
+                    "fast": fast_s,
+                    "speedup": round(slow_s["p50_ms"] / fast_s["p50_ms"], 1) if fast_s["p50_ms"] else None,
+                    "max_abs_diff": diff,
+                    "engine_build": latency_summary(build),
+                }
+                rows.append(row)
+                print(f"{series:>8} {periods:>7} {str(intervals):>9} {slow_s['p50_ms']:>10} {fast_s['p50_ms']:>8} "
+                      f"{row['speedup']:>8} {diff:>9.2e}")
+
+    save_results("prophet_fast", {"models": args.models, "repeat": args.repeat}, rows, args.out)
+
+
+if __name__ == "__main__":
+    main()
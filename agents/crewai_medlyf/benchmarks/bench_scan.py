@@ -0,0 +1,73 @@
+"""
+run_daily_scan wall-clock as the number of diseases grows, serial and on a
+ScanPool, against a synthetic CSV, stub models and a stub Mongo collection.
+"full" scans forget the scan state first and recompute every disease;
+"unchanged" scans run over the same inputs and skip every disease.
+
+Run: python benchmarks/bench_scan.py [--sizes 8,32,128] [--workers 1,4] [--models stub|prophet]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from bench_support import (configure_forecasting_agent, disease_names, quiet, save_results, write_models,
+                           write_outbreak_csv)
+
+
+def time_scan(fa, collection, repeat, full=True):
+    samples = []
+    collection.ops = 0
+    for _ in range(repeat):
+        fa.DATASET_CACHE.invalidate()
+        if full:
+            fa.SCAN_STATE.invalidate()
+        start = time.perf_counter()
+        with quiet():
+            fa.run_daily_scan()
+        samples.append(time.perf_counter() - start)
+    return min(samples), collection.ops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="8,32,128")
+    parser.add_argument("--workers", default="1,4")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--models", choices=["stub", "prophet"], default="stub")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'diseases':>8} {'workers':>7} {'mode':>9} {'wall_s':>8} {'ms/disease':>10} {'saved':>6}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as workdir:
+            csv_path = write_outbreak_csv(Path(workdir) / "outbreaks.csv", disease_names(n))
+            models_dir = write_models(Path(workdir) / "models", csv_path, kind=args.models)
+            for workers in (int(w) for w in args.workers.split(",")):
+                fa, collection = configure_forecasting_agent(csv_path, models_dir, scan_workers=workers)
+                with quiet():
+                    fa.REGISTRY.warmup()
+                    fa.run_daily_scan()  # warm: pool workers started, models loaded
+                for mode in ("full", "unchanged"):
+                    wall, saved = time_scan(fa, collection, args.repeat, full=mode == "full")
+                    summary = fa.SCAN_POOL.last_summary if fa.SCAN_POOL and mode == "full" else None
+                    rows.append({
+                        "diseases": n,
+                        "workers": workers,
+                        "mode": mode,
+                        "wall_s": round(wall, 4),
+                        "ms_per_disease": round(wall / n * 1000, 3),
+                        "saved_per_scan": saved // args.repeat,
+                        "pool_speedup": summary["speedup"] if summary else None,
+                    })
+                    print(f"{n:>8} {workers:>7} {mode:>9} {wall:>8.3f} {wall / n * 1000:>10.2f} {saved // args.repeat:>6}")
+                if fa.SCAN_POOL:
+                    fa.SCAN_POOL.recycle()
+
+    save_results("scan", {"repeat": args.repeat, "models": args.models}, rows, args.out)
+
+
+if __name__ == "__main__":
+    main()
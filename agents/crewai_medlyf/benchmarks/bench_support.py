@@ -0,0 +1,270 @@
+"""
+Shared pieces of the benchmark suite: synthetic data, local stand-ins for
+Mongo / the jobs server / the models, latency percentiles and JSON results.
+
+Every bench_*.py writes one JSON file (see save_results) carrying the git
+commit, machine and parameters next to the numbers, so two runs can be
+diffed with compare.py.
+"""
+
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+
+from event_dispatcher import percentile  # noqa: E402
+
+RESULTS_DIR = HERE / "results"
+DISEASES = ["COVID-19", "Dengue", "Malaria", "HIV/AIDS", "Measles", "Tuberculosis", "Typhoid", "Viral Flu"]
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+# ---------- synthetic data ----------
+def disease_names(n):
+    """The real disease names first, then numbered variants ("Dengue 2", ...)."""
+    return [DISEASES[i % len(DISEASES)] + ("" if i < len(DISEASES) else f" {i // len(DISEASES) + 1}")
+            for i in range(n)]
+
+
+def monthly_cases(n_months, level, seed):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_months)
+    season = 1 + 0.4 * np.sin(2 * np.pi * t / 12 + rng.uniform(0, 2 * np.pi))
+    return np.maximum(0, level * season * (1 + 0.01 * t) + rng.normal(0, level * 0.1, n_months)).round().astype(int)
+
+
+def write_outbreak_csv(path, diseases, start_year=2020, years=5, seed=0):
+    """Same layout as mumbai_disease_outbreaks_2020_2024.csv (year, month, disease, condition, reported_cases)."""
+    n_months = years * 12
+    rows = []
+    for i, disease in enumerate(diseases):
+        cases = monthly_cases(n_months, level=100 * (1 + i % 7), seed=seed + i)
+        for m, value in enumerate(cases):
+            rows.append((start_year + m // 12, MONTH_NAMES[m % 12], disease, "medium", int(value)))
+    pd.DataFrame(rows, columns=["year", "month", "disease", "condition", "reported_cases"]).to_csv(path, index=False)
+    return path
+
+
+def write_upload_csv(path, days=120, level=70.0, seed=0):
+    """A hospital upload (ds, y daily occupancy) like the ones forecast_agent reads."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(days)
+    y = level + 5 * np.sin(2 * np.pi * t / 7) + 0.05 * t + rng.normal(0, 2, days)
+    pd.DataFrame({"ds": pd.date_range("2024-01-01", periods=days, freq="D").strftime("%Y-%m-%d"),
+                  "y": y.round(2)}).to_csv(path, index=False)
+    return path
+
+
+# ---------- models ----------
+class StubProphet:
+    """
+    Prophet's make_future_dataframe/predict surface in NumPy (linear trend +
+    yearly sine), picklable so scan workers can load it. Keeps benchmark
+    setup fast; use --models prophet for the real thing.
+    """
+
+    def __init__(self, history):
+        self.history = pd.DataFrame({"ds": pd.to_datetime(history["ds"]), "y": history["y"].astype(float)})
+        y = self.history["y"].to_numpy()
+        t = np.arange(len(y))
+        self.slope, self.intercept = np.polyfit(t, y, 1) if len(y) > 1 else (0.0, float(y.mean()))
+        self.amplitude = float(np.std(y - (self.slope * t + self.intercept)))
+
+    def make_future_dataframe(self, periods, freq="MS"):
+        last = self.history["ds"].iloc[-1]
+        future = pd.date_range(last, periods=periods + 1, freq=freq)[1:]
+        return pd.DataFrame({"ds": pd.concat([self.history["ds"], pd.Series(future)], ignore_index=True)})
+
+    def predict(self, future):
+        t = np.arange(len(future))
+        months = pd.to_datetime(future["ds"]).dt.month.to_numpy()
+        yhat = self.slope * t + self.intercept + self.amplitude * np.sin(2 * np.pi * months / 12)
+        return pd.DataFrame({"ds": future["ds"], "yhat": yhat, "yhat_lower": yhat * 0.9, "yhat_upper": yhat * 1.1})
+
+
+def fit_prophet(history):
+    from prophet import Prophet
+    model = Prophet(yearly_seasonality=True, weekly_seasonality=False, daily_seasonality=False)
+    model.fit(history)
+    return model
+
+
+def severity_models(seed=0):
+    """(classifier, label_encoder): a small scikit-learn forest on synthetic features."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import LabelEncoder
+
+    from severity import FEATURE_COLUMNS
+
+    rng = np.random.default_rng(seed)
+    lags = rng.gamma(2.0, 200.0, (2000, 3))
+    X = pd.DataFrame({
+        FEATURE_COLUMNS[0]: lags[:, 0], FEATURE_COLUMNS[1]: lags[:, 1], FEATURE_COLUMNS[2]: lags[:, 2],
+        FEATURE_COLUMNS[3]: lags.mean(axis=1), FEATURE_COLUMNS[4]: lags.std(axis=1, ddof=1),
+        FEATURE_COLUMNS[5]: rng.integers(1, 13, 2000),
+    })
+    labels = np.where(lags[:, 0] > 600, "high", np.where(lags[:, 0] > 250, "medium", "low"))
+    encoder = LabelEncoder().fit(labels)
+    clf = RandomForestClassifier(n_estimators=100, max_depth=8, random_state=seed, n_jobs=1)
+    clf.fit(X, encoder.transform(labels))
+    return clf, encoder
+
+
+def write_models(models_dir, csv_path, kind="stub"):
+    """One prophet_<disease>.pkl per disease of the CSV plus the severity models, as on Hugging Face."""
+    from dataset_cache import load_snapshot
+    from model_registry import LABEL_ENCODER_FILE, RF_FILE
+
+    models_dir = Path(models_dir)
+    models_dir.mkdir(parents=True, exist_ok=True)
+    snapshot = load_snapshot(csv_path)
+    for name in snapshot.diseases:
+        history = snapshot.series(name)
+        model = fit_prophet(history) if kind == "prophet" else StubProphet(history)
+        fname = "prophet_" + name.replace("/", "_").replace(" ", "_") + ".pkl"
+        joblib.dump(model, models_dir / fname)
+    clf, encoder = severity_models()
+    joblib.dump(clf, models_dir / RF_FILE)
+    joblib.dump(encoder, models_dir / LABEL_ENCODER_FILE)
+    return str(models_dir)
+
+
+# ---------- stand-ins for external services ----------
+class StubCollection:
+    """Accepts BatchedWriter's bulk_write and counts the operations."""
+
+    def __init__(self):
+        self.writes = 0
+        self.ops = 0
+
+    def bulk_write(self, ops, ordered=False):
+        self.writes += 1
+        self.ops += len(ops)
+
+
+async def start_jobs_server(latency_s=0.0):
+    """
+    Local aiohttp app with the Node server's /api/jobs and /api/jobs/bulk.
+    Returns (base_url, runner, received); received counts the jobs.
+    """
+    from aiohttp import web
+
+    received = {"jobs": 0, "requests": 0}
+
+    async def create(request):
+        job = await request.json()
+        received["jobs"] += 1
+        received["requests"] += 1
+        await asyncio.sleep(latency_s)
+        return web.json_response({"id": received["jobs"], **job}, status=201)
+
+    async def bulk(request):
+        jobs = (await request.json()).get("jobs", [])
+        received["jobs"] += len(jobs)
+        received["requests"] += 1
+        await asyncio.sleep(latency_s)
+        return web.json_response({"results": [{"status": 201, "job": job} for job in jobs]}, status=201)
+
+    app = web.Application()
+    app.router.add_post("/api/jobs", create)
+    app.router.add_post("/api/jobs/bulk", bulk)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}", runner, received
+
+
+def configure_forecasting_agent(csv_path, models_dir, scan_workers=1):
+    """
+    Imports forecasting_agent and points it at the synthetic CSV / models and
+    a stub Mongo collection. Returns (module, collection).
+    """
+    with quiet():
+        import forecasting_agent as fa
+    from dataset_cache import DatasetCache
+    from forecast_table import ForecastTable
+    from model_registry import ModelRegistry
+    from mongo_store import BatchedWriter
+    from parallel_scan import ScanPool
+    from scan_state import ScanState
+
+    collection = StubCollection()
+    fa.DATASET_CACHE = DatasetCache(str(csv_path))
+    fa.FORECAST_TABLE = ForecastTable()
+    fa.REGISTRY = ModelRegistry(str(models_dir))
+    fa.MONGO_WRITER = BatchedWriter(lambda: collection)
+    fa.SCAN_STATE = ScanState(Path(csv_path).with_name("scan_state.json"))
+    fa.SCAN_STATE.invalidate()
+    if fa.SCAN_POOL is not None:
+        fa.SCAN_POOL.recycle()
+    fa.SCAN_POOL = ScanPool(str(models_dir), workers=scan_workers) if scan_workers > 1 else None
+    return fa, collection
+
+
+# ---------- measurement + results ----------
+def latency_summary(samples):
+    """Milliseconds p50/p95/p99/max/mean for a list of seconds."""
+    if not samples:
+        return {"n": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None, "mean_ms": None}
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, timeout=10)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=HERE,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "") if out.returncode == 0 else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def save_results(name, params, rows, out=None):
+    """Writes {benchmark, meta, params, results} to out (default results/<name>-<commit>.json)."""
+    commit = git_commit()
+    doc = {
+        "benchmark": name,
+        "meta": {
+            "commit": commit,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "params": params,
+        "results": rows,
+    }
+    path = Path(out) if out else RESULTS_DIR / f"{name}-{commit or time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(doc, indent=2, default=str))
+    print(f"results -> {path}")
+    return path
+
+
+def quiet():
+    """Context manager silencing the agents' progress prints."""
+    import contextlib
+    import io
+    return contextlib.redirect_stdout(io.StringIO())
@@ -0,0 +1,93 @@
+"""
+Compares two benchmark result files (from the same bench_*.py) row by row.
+
+Times (*_us, *_ms, *_s) and sizes (bytes) are better lower, throughput
+(*_rps, *_per_s) and *speedup better higher; a change beyond --threshold in the wrong direction is a regression.
+
+Run: python benchmarks/compare.py results/predict-<old>.json results/predict-<new>.json [--threshold 0.1] [--fail]
+"""
+
+import argparse
+import json
+import sys
+
+# Fields identifying a row of each benchmark
+ROW_KEYS = {
+    "predict": ("path", "concurrency"),
+    "scan": ("diseases", "workers", "mode"),
+    "crew_latency": ("hospitals", "transport", "forecaster"),
+    "prophet_fast": ("series", "periods", "intervals"),
+    "event_codec": ("event", "codec"),
+    "patient_store": ("admissions", "hospitals"),
+    "artifact_cache": ("files", "threads"),
+}
+HIGHER_IS_BETTER = {"throughput_rps", "pool_speedup", "speedup", "encode_per_s", "decode_per_s"}
+
+
+def flatten(row, prefix=""):
+    out = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            out.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[prefix + key] = value
+    return out
+
+
+def direction(metric):
+    """+1 if higher is better, -1 if lower is better, 0 if not compared."""
+    name = metric.rsplit(".", 1)[-1]
+    if name in HIGHER_IS_BETTER:
+        return 1
+    if name.endswith(("_us", "_ms", "_s")) or name == "bytes":
+        return -1
+    return 0
+
+
+def compare(old, new, threshold=0.1):
+    """[(row_key, metric, old, new, change, regressed)] for every comparable metric."""
+    if old["benchmark"] != new["benchmark"]:
+        raise SystemExit(f"different benchmarks: {old['benchmark']} vs {new['benchmark']}")
+    keys = ROW_KEYS.get(new["benchmark"], ())
+    old_rows = {tuple(r.get(k) for k in keys): flatten(r) for r in old["results"]}
+    out = []
+    for row in new["results"]:
+        row_key = tuple(row.get(k) for k in keys)
+        before = old_rows.get(row_key)
+        if before is None:
+            continue
+        for metric, value in flatten(row).items():
+            sign = direction(metric)
+            base = before.get(metric)
+            if not sign or base in (None, 0) or value is None or metric in keys:
+                continue
+            change = (value - base) / abs(base)
+            out.append((row_key, metric, base, value, change, sign * change < -threshold))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    parser.add_argument("--fail", action="store_true", help="exit 1 if anything regressed")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows = compare(old, new, args.threshold)
+    print(f"{new['benchmark']}: {old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for row_key, metric, base, value, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"  {'/'.join(map(str, row_key)):<24} {metric:<28} {base:>10} -> {value:>10} ({change:+.1%}){flag}")
+    regressions = sum(r[-1] for r in rows)
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    if args.fail and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
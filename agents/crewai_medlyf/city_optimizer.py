@@ -0,0 +1,243 @@
+"""
+City-wide resource optimizer for the crew.
+
+Instead of looking at one hospital's prediction at a time, the latest
+prediction_ready forecast of every hospital is collected and the whole city
+is planned in one pass:
+
+- peak forecast above capacity -> deficit, below capacity minus a reserve
+  -> surplus that can be moved to other hospitals
+- deficits are covered by transfers from surplus hospitals where that is
+  cheaper than an oxygen tanker, and by tankers otherwise
+
+With hospital coordinates this is a transportation LP (scipy HiGHS) over
+each deficit hospital's k nearest surplus hospitals, so it stays sparse for
+thousands of hospitals. Without coordinates every transfer costs the same and
+the optimum is a cumulative-sum matching, computed without a Python loop.
+
+Every window re-plans the whole city, but a deficit whose plan was already
+dispatched (dispatched()) counts as covered until that hospital's forecast
+changes, and the surplus its donors promised counts as used. So another
+hospital's upload doesn't re-order the same tankers or promise the same
+surplus twice.
+"""
+
+import itertools
+import math
+import os
+import time
+
+import numpy as np
+
+OPT_RESERVE = float(os.getenv("OPT_RESERVE", "0.1"))  # share of capacity a donor keeps free
+OPT_TANKER_CAPACITY = float(os.getenv("OPT_TANKER_CAPACITY", "10"))  # units covered by one tanker
+OPT_TANKER_COST = float(os.getenv("OPT_TANKER_COST", "50"))  # per unit, in km of transfer distance
+OPT_NEIGHBOURS = int(os.getenv("OPT_NEIGHBOURS", "8"))
+OPT_MAX_AGE_S = float(os.getenv("OPT_MAX_AGE_S", str(24 * 3600)))  # forecasts older than this are ignored
+
+
+def balance(peaks, capacity, reserve=OPT_RESERVE):
+    """(deficit, surplus) per hospital from peak forecasts and capacities."""
+    peaks = np.asarray(peaks, dtype=float)
+    capacity = np.broadcast_to(np.asarray(capacity, dtype=float), peaks.shape)
+    deficit = np.maximum(peaks - capacity, 0.0)
+    surplus = np.maximum(capacity * (1.0 - reserve) - peaks, 0.0)
+    return deficit, surplus
+
+
+def match_uniform(deficit, surplus):
+    """
+    Optimal transfers when every transfer costs the same: lay deficits and
+    surpluses on one line (cumulative sums) and cut where either changes.
+    Returns (donor_idx, receiver_idx, amount, unmet).
+    """
+    deficit = np.asarray(deficit, dtype=float)
+    surplus = np.asarray(surplus, dtype=float)
+    d_cum = np.cumsum(deficit)
+    s_cum = np.cumsum(surplus)
+    moved = min(d_cum[-1] if len(d_cum) else 0.0, s_cum[-1] if len(s_cum) else 0.0)
+    if moved <= 0:
+        return np.empty(0, int), np.empty(0, int), np.empty(0), deficit.copy()
+    cuts = np.unique(np.concatenate(([0.0], d_cum, s_cum)))
+    cuts = cuts[cuts <= moved]
+    if cuts[-1] < moved:
+        cuts = np.append(cuts, moved)
+    left, amount = cuts[:-1], np.diff(cuts)
+    keep = amount > 1e-12
+    left, amount = left[keep], amount[keep]
+    donor = np.searchsorted(s_cum, left, side="right")
+    receiver = np.searchsorted(d_cum, left, side="right")
+    unmet = deficit - np.bincount(receiver, weights=amount, minlength=len(deficit))
+    return donor, receiver, amount, np.maximum(unmet, 0.0)
+
+
+def to_km(lat, lng):
+    """Equirectangular projection; accurate enough within one city."""
+    lat = np.asarray(lat, dtype=float)
+    lng = np.asarray(lng, dtype=float)
+    k = math.cos(math.radians(float(np.mean(lat)))) if len(lat) else 1.0
+    return np.column_stack((lng * 111.32 * k, lat * 110.57))
+
+
+def solve_transport(deficit, surplus, xy, neighbours=OPT_NEIGHBOURS, tanker_cost=OPT_TANKER_COST):
+    """
+    Min-cost transfers by distance, with a tanker (cost tanker_cost per unit)
+    as the fallback for every deficit hospital. Only the `neighbours` nearest
+    surplus hospitals are candidate donors.
+    Returns (donor_idx, receiver_idx, amount, unmet).
+    """
+    from scipy import sparse
+    from scipy.optimize import linprog
+    from scipy.spatial import cKDTree
+
+    deficit = np.asarray(deficit, dtype=float)
+    surplus = np.asarray(surplus, dtype=float)
+    receivers = np.flatnonzero(deficit > 0)
+    donors = np.flatnonzero(surplus > 0)
+    if len(receivers) == 0 or len(donors) == 0:
+        return np.empty(0, int), np.empty(0, int), np.empty(0), deficit.copy()
+
+    k = min(neighbours, len(donors))
+    dist, near = cKDTree(xy[donors]).query(xy[receivers], k=k)
+    dist, near = dist.reshape(len(receivers), k), near.reshape(len(receivers), k)
+    n_r, n_arcs = len(receivers), len(receivers) * k
+
+    # Variables: one per (receiver, candidate donor) arc, then one tanker slack per receiver
+    cost = np.concatenate((dist.ravel(), np.full(n_r, tanker_cost)))
+    arc_cols = np.arange(n_arcs)
+    a_eq = sparse.hstack((
+        sparse.csr_matrix((np.ones(n_arcs), (np.repeat(np.arange(n_r), k), arc_cols)), shape=(n_r, n_arcs)),
+        sparse.identity(n_r, format="csr"),
+    )).tocsr()
+    a_ub = sparse.csr_matrix((np.ones(n_arcs), (near.ravel(), arc_cols)), shape=(len(donors), n_arcs + n_r))
+    res = linprog(cost, A_ub=a_ub, b_ub=surplus[donors], A_eq=a_eq, b_eq=deficit[receivers],
+                  bounds=(0, None), method="highs")
+    if res.status != 0:
+        raise RuntimeError(f"transport LP failed: {res.message}")
+
+    flows = res.x[:n_arcs]
+    used = flows > 1e-9
+    unmet = np.zeros_like(deficit)
+    unmet[receivers] = res.x[n_arcs:]
+    return donors[near.ravel()[used]], np.repeat(receivers, k)[used], flows[used], np.maximum(unmet, 0.0)
+
+
+def plan_city(hospital_ids, peaks, capacity, coords=None, reserve=OPT_RESERVE, tanker_capacity=OPT_TANKER_CAPACITY,
+              tanker_cost=OPT_TANKER_COST, neighbours=OPT_NEIGHBOURS):
+    """
+    Returns (actions, summary). actions are transfer / request_tanker dicts,
+    each naming the hospital(s) it concerns.
+    """
+    start = time.perf_counter()
+    ids = list(hospital_ids)
+    deficit, surplus = balance(peaks, capacity, reserve)
+    if coords is not None:
+        donor, receiver, amount, unmet = solve_transport(deficit, surplus, coords, neighbours, tanker_cost)
+        method = "lp"
+    else:
+        donor, receiver, amount, unmet = match_uniform(deficit, surplus)
+        method = "uniform"
+
+    actions = [
+        {"action": "transfer", "from": ids[i], "to": ids[j], "hospital_id": ids[j], "amount": round(float(a), 2),
+         "reason": f"surplus at {ids[i]} covers deficit at {ids[j]}"}
+        for i, j, a in zip(donor.tolist(), receiver.tolist(), amount.tolist())
+    ]
+    tankers = np.ceil(np.round(unmet, 9) / tanker_capacity).astype(int)
+    for j in np.flatnonzero(tankers > 0).tolist():
+        actions.append({
+            "action": "request_tanker", "hospital_id": ids[j], "quantity": int(tankers[j]),
+            "reason": f"unmet predicted demand {unmet[j]:.1f} above capacity after transfers",
+        })
+    summary = {
+        "hospitals": len(ids),
+        "deficit_hospitals": int(np.count_nonzero(deficit)),
+        "surplus_hospitals": int(np.count_nonzero(surplus)),
+        "deficit": round(float(deficit.sum()), 2),
+        "transferred": round(float(amount.sum()), 2),
+        "unmet": round(float(unmet.sum()), 2),
+        "tankers": int(tankers.sum()),
+        "method": method,
+        "solve_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+    return actions, summary
+
+
+class CityOptimizer:
+    """Keeps the latest forecast per hospital; plan() solves for all of them."""
+
+    def __init__(self, capacity=80.0, max_age_s=OPT_MAX_AGE_S, clock=time.time, **plan_kwargs):
+        self.capacity = capacity
+        self.max_age_s = max_age_s
+        self.clock = clock
+        self.plan_kwargs = plan_kwargs
+        self._latest = {}
+        self._versions = itertools.count(1)
+        self._planned = {}
+        self._covered = {}
+        self.plans = 0
+
+    def observe(self, hospital_id, predictions, capacity=None, location=None):
+        yhat = [p.get("yhat") for p in predictions or [] if p.get("yhat") is not None]
+        if not hospital_id or not yhat:
+            return
+        entry = {
+            "peak": float(max(yhat)),
+            "capacity": float(capacity) if capacity is not None else self.capacity,
+            "location": location,
+            "seen_at": self.clock(),
+        }
+        previous = self._latest.get(hospital_id)
+        # A re-upload of the same forecast keeps its version (nothing to re-dispatch)
+        same = previous is not None and all(previous[k] == entry[k] for k in ("peak", "capacity", "location"))
+        entry["version"] = previous["version"] if same else next(self._versions)
+        self._latest[hospital_id] = entry
+
+    def __len__(self):
+        return len(self._latest)
+
+    def snapshot(self):
+        """(ids, peaks, capacity, coords) of every hospital with a fresh forecast."""
+        cutoff = self.clock() - self.max_age_s
+        for hid in [h for h, v in self._latest.items() if v["seen_at"] < cutoff]:
+            del self._latest[hid]
+        items = list(self._latest.items())
+        # dispatched() records the plan against the forecasts it was solved from
+        self._planned = {hid: v["version"] for hid, v in items}
+        # A covered deficit stays covered until the hospital's forecast changes
+        self._covered = {hid: c for hid, c in self._covered.items() if c["version"] == self._planned.get(hid)}
+        committed = {}
+        for c in self._covered.values():
+            for donor, amount in c["transfers"].items():
+                committed[donor] = committed.get(donor, 0.0) + amount
+        ids = [hid for hid, _ in items]
+        capacity = np.fromiter((v["capacity"] for _, v in items), float, len(items))
+        peaks = np.fromiter((
+            min(v["peak"], v["capacity"]) if hid in self._covered else v["peak"] + committed.get(hid, 0.0)
+            for hid, v in items), float, len(items))
+        coords = None
+        locations = [v["location"] for _, v in items]
+        # Distances only if every hospital has a location, else uniform costs
+        if items and all(loc and loc.get("lat") is not None and loc.get("lng") is not None for loc in locations):
+            coords = to_km([loc["lat"] for loc in locations], [loc["lng"] for loc in locations])
+        return ids, peaks, capacity, coords
+
+    def solve(self, snapshot):
+        """(actions, summary) for a snapshot(); safe to run in a worker thread."""
+        self.plans += 1
+        actions, summary = plan_city(*snapshot, **self.plan_kwargs)
+        summary["already_covered"] = len(self._covered)
+        return actions, summary
+
+    def dispatched(self, actions):
+        """Marks the deficits these actions cover as handled for the snapshot's forecasts."""
+        for action in actions:
+            hid = action.get("hospital_id")
+            if action["action"] not in ("transfer", "request_tanker") or hid not in self._planned:
+                continue
+            covered = self._covered.setdefault(hid, {"version": self._planned[hid], "transfers": {}})
+            if action["action"] == "transfer":
+                covered["transfers"][action["from"]] = covered["transfers"].get(action["from"], 0.0) + action["amount"]
+
+    def plan(self):
+        return self.solve(self.snapshot())
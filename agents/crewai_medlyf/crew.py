@@ -3,19 +3,29 @@
 CrewAI-style crew for MedLyf:
 Agents: Ingestion watcher (optional), Forecasting, Optimization, Alerting, Logistics.
 
-This crew uses Redis pub/sub for event transport and CrewAI classes for semantics.
+This crew uses Redis pub/sub (or Redis Streams with CREW_TRANSPORT=streams) for
+event transport and CrewAI classes for semantics.
 Run: python crew.py
 """
 
 import os
 import asyncio
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 import joblib
 import pandas as pd
-import aiohttp
 import redis.asyncio as aioredis
+from alert_engine import AlertEngine, digest
+from city_optimizer import CityOptimizer
+from event_codec import EVENT_CODEC, EventError, decode, encode
+from event_dispatcher import EventDispatcher
+from event_transport import PubSubTransport, StreamTransport
+from http_client import JobBatcher, ServerClient
+from incremental_forecast import IncrementalForecaster
+from ingestion import IngestCache, IngestError
+from metrics import CONTENT_TYPE, METRICS, PROFILES, propagate, timed
 
 # Try to import CrewAI primitives for semantics (not strictly required for functionality)
 try:
@@ -27,13 +37,51 @@ except Exception:
 # Config
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 CHANNEL = os.getenv("REDIS_CHANNEL", "medlyf_events")
+TRANSPORT = os.getenv("CREW_TRANSPORT", "pubsub")  # "pubsub" or "streams"
+STREAM_KEY = os.getenv("REDIS_STREAM", CHANNEL)
+STREAM_GROUP = os.getenv("REDIS_STREAM_GROUP", "medlyf_crew")
+STREAM_MAXLEN = int(os.getenv("REDIS_STREAM_MAXLEN", "100000"))
+STREAM_CONSUMER = os.getenv("REDIS_STREAM_CONSUMER")  # default: hostname-pid
 SERVER_URL = os.getenv("SERVER_URL", "http://host.docker.internal:5001")  # update for Docker / local
 MODEL_DIR = Path.cwd() / "models"
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 THRESHOLD = float(os.getenv("ALERT_THRESHOLD", "80"))  # occupancy threshold for alerting
+DISPATCH_LANES = int(os.getenv("DISPATCH_LANES", "4"))  # concurrent handlers per event type
+DISPATCH_QUEUE_SIZE = int(os.getenv("DISPATCH_QUEUE_SIZE", "100"))  # per lane, then backpressure
+STATS_INTERVAL_S = float(os.getenv("CREW_STATS_INTERVAL_S", "60"))
+JOB_COALESCE_WINDOW_S = float(os.getenv("JOB_COALESCE_WINDOW_MS", "50")) / 1000  # 0 = one POST per job
+OPTIMIZER_MODE = os.getenv("CREW_OPTIMIZER", "city")  # "city" (one plan for all hospitals) or "per_hospital"
+OPT_WINDOW_S = float(os.getenv("OPT_WINDOW_S", "5"))  # how long forecasts are collected before a city plan
+FORECAST_MODE = os.getenv("CREW_FORECAST_MODE", "incremental")  # "incremental" or "full" (refit every upload)
+METRICS_HOST = os.getenv("CREW_METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("CREW_METRICS_PORT", "9102"))  # GET /metrics, /profile; 0 = off
 
-# Redis client
-r = aioredis.from_url(REDIS_URL, decode_responses=True)
+# CSV parsing + Prophet fits run here so they don't stall the event loop
+CPU_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("CREW_CPU_WORKERS", "2")))
+
+# Redis client (raw bytes: events may be msgpack, see event_codec)
+r = aioredis.from_url(REDIS_URL, decode_responses=False)
+
+_transport = None
+
+def get_transport():
+    """Pub/sub (default) or a Redis Stream consumer group, per CREW_TRANSPORT."""
+    global _transport
+    if _transport is None:
+        if TRANSPORT == "streams":
+            _transport = StreamTransport(r, STREAM_KEY, STREAM_GROUP, consumer=STREAM_CONSUMER, maxlen=STREAM_MAXLEN,
+                                         encode=encode)
+        else:
+            _transport = PubSubTransport(r, CHANNEL, encode=encode)
+    return _transport
+
+PUBLISHED = METRICS.counter("medlyf_events_published_total", "Events published by the crew.", ("event_type",))
+REJECTED = METRICS.counter("medlyf_events_rejected_total", "Received events dropped as undecodable or invalid.")
+
+async def publish_event(event: dict):
+    with timed("redis_publish"):
+        await get_transport().publish(event)
+    PUBLISHED.inc(event_type=event.get("event_type", ""))
 
 # ------------------------------------------------------------
 # Utility functions
@@ -41,15 +89,12 @@ r = aioredis.from_url(REDIS_URL, decode_responses=True)
 def now():
     return datetime.utcnow().isoformat() + "Z"
 
+# One pooled keep-alive session for every call to the server
+HTTP = ServerClient(SERVER_URL)
+JOBS = JobBatcher(HTTP, window_s=JOB_COALESCE_WINDOW_S)
+
 async def post_to_server(path: str, json_payload: dict):
-    url = SERVER_URL.rstrip("/") + "/" + path.lstrip("/")
-    async with aiohttp.ClientSession() as sess:
-        try:
-            async with sess.post(url, json=json_payload, timeout=20) as resp:
-                text = await resp.text()
-                return resp.status, text
-        except Exception as e:
-            return 500, str(e)
+    return await HTTP.post(path, json_payload)
 
 # ------------------------------------------------------------
 # Forecasting agent
@@ -64,6 +109,31 @@ async def simple_moving_average_forecast(df: pd.DataFrame, periods=5):
         preds.append({"ds": ds, "yhat": float(last_mean), "yhat_lower": float(last_mean*0.95), "yhat_upper": float(last_mean*1.05)})
     return preds
 
+# Uploads are parsed in chunks once; unchanged uploads are memory-mapped from models/ingest
+INGEST = IngestCache(MODEL_DIR / "ingest")
+
+# Reuses / warm-starts each hospital's saved model instead of refitting on every upload
+FORECASTER = IncrementalForecaster(MODEL_DIR, periods=5)
+
+def fit_prophet_forecast(df: pd.DataFrame, hospital_id: str):
+    """Blocking Prophet fit + 5-day forecast; returns (preds, model_meta) or (None, {})."""
+    try:
+        if FORECAST_MODE == "incremental":
+            return FORECASTER.forecast(hospital_id, df)
+        from prophet import Prophet
+        m = Prophet(daily_seasonality=True, weekly_seasonality=True)
+        # Prophet expects columns ds,y
+        m.fit(df[['ds', 'y']].rename(columns={'ds':'ds','y':'y'}))
+        future = m.make_future_dataframe(periods=5)
+        forecast = m.predict(future).tail(5)[['ds','yhat','yhat_lower','yhat_upper']]
+        forecast['ds'] = forecast['ds'].dt.strftime("%Y-%m-%d")
+        preds = forecast.to_dict(orient='records')
+        joblib.dump(m, MODEL_DIR / f"{hospital_id}_prophet.joblib")
+        return preds, {"model":"prophet", "trained_rows": len(df)}
+    except Exception as e:
+        print("Prophet failed or not installed, falling back. Error:", e)
+        return None, {}
+
 async def forecast_agent(payload: dict):
     """
     payload: { hospital_id, file_path }
@@ -74,32 +144,24 @@ async def forecast_agent(payload: dict):
     if not hospital_id or not file_path:
         print("forecast_agent missing payload fields")
         return
+    loop = asyncio.get_running_loop()
     try:
-        df = pd.read_csv(file_path, parse_dates=['ds'])
-    except Exception as e:
-        print("forecast_agent: could not read CSV", e)
+        ingested = await loop.run_in_executor(CPU_EXECUTOR, propagate(INGEST.load), hospital_id, file_path)
+    except (IngestError, OSError) as e:
+        print(f"forecast_agent: rejected upload for {hospital_id}: {e}")
         return
+    df = ingested.frame
 
     preds = None
     model_meta = {}
     # Try Prophet if available and enough data
     if len(df) >= 10:
-        try:
-            from prophet import Prophet
-            m = Prophet(daily_seasonality=True, weekly_seasonality=True)
-            # Prophet expects columns ds,y
-            m.fit(df[['ds', 'y']].rename(columns={'ds':'ds','y':'y'}))
-            future = m.make_future_dataframe(periods=5)
-            forecast = m.predict(future).tail(5)[['ds','yhat','yhat_lower','yhat_upper']]
-            preds = forecast.to_dict(orient='records')
-            joblib.dump(m, MODEL_DIR / f"{hospital_id}_prophet.joblib")
-            model_meta = {"model":"prophet", "trained_rows": len(df)}
-        except Exception as e:
-            print("Prophet failed or not installed, falling back. Error:", e)
+        preds, model_meta = await loop.run_in_executor(CPU_EXECUTOR, propagate(fit_prophet_forecast), df, hospital_id)
 
     if preds is None:
         preds = await simple_moving_average_forecast(df, periods=5)
         model_meta = {"model":"moving_average", "trained_rows": len(df)}
+    model_meta["ingest"] = ingested.stats
 
     event = {
         "event_type": "prediction_ready",
@@ -108,13 +170,13 @@ async def forecast_agent(payload: dict):
         "predictions": preds,
         "model_meta": model_meta
     }
-    await r.publish(CHANNEL, json.dumps(event))
+    await publish_event(event)
     print(f"[ForecastAgent] published prediction_ready for {hospital_id}")
 
 # ------------------------------------------------------------
 # Optimization agent (resource redistribution)
 # ------------------------------------------------------------
-async def optimization_agent(payload: dict):
+async def hospital_optimization_agent(payload: dict):
     """
     Simple heuristic optimizer: given predictions, decide allocations.
     Input payload: prediction_ready event (hospital_id + predictions)
@@ -146,24 +208,79 @@ async def optimization_agent(payload: dict):
         "hospital_id": hospital_id,
         "plan": plan
     }
-    await r.publish(CHANNEL, json.dumps(event))
+    await publish_event(event)
     print(f"[OptimizationAgent] published optimized_plan for {hospital_id}, plan: {plan}")
 
+# Latest forecast per hospital; solved together into one city-wide plan
+CITY = CityOptimizer(capacity=THRESHOLD)
+_city_flush = None
+
+async def publish_city_plan():
+    await asyncio.sleep(OPT_WINDOW_S)  # let the other hospitals' forecasts arrive first
+    snapshot = CITY.snapshot()
+    loop = asyncio.get_running_loop()
+    try:
+        with timed("city_optimize"):
+            plan, summary = await loop.run_in_executor(CPU_EXECUTOR, CITY.solve, snapshot)
+    except Exception as e:
+        print("[OptimizationAgent] city plan failed:", e)
+        return
+    if plan:
+        # Later windows treat these deficits as covered (no duplicate tanker jobs)
+        CITY.dispatched(plan)
+    elif summary["already_covered"]:
+        print(f"[OptimizationAgent] nothing new to dispatch: {json.dumps(summary)}")
+        return
+    else:
+        plan = [{"action": "no_action", "reason": "predicted demand within capacity city-wide"}]
+    event = {
+        "event_type": "optimized_plan",
+        "ts": now(),
+        "hospital_id": "city",
+        "plan": plan,
+        "summary": summary
+    }
+    await publish_event(event)
+    print(f"[OptimizationAgent] published city optimized_plan: {json.dumps(summary)}")
+
+async def optimization_agent(payload: dict):
+    """
+    Records the hospital's forecast; the first one in a window schedules a
+    city-wide plan over all hospitals' latest forecasts.
+    """
+    if OPTIMIZER_MODE != "city":
+        return await hospital_optimization_agent(payload)
+    global _city_flush
+    CITY.observe(payload.get("hospital_id"), payload.get("predictions", []),
+                 capacity=payload.get("capacity"), location=payload.get("location"))
+    if _city_flush is None or _city_flush.done():
+        _city_flush = asyncio.create_task(publish_city_plan())
+
 # ------------------------------------------------------------
 # Alerting agent
 # ------------------------------------------------------------
-async def send_alert_notification(hospital_id: str, message: str, recipients=None, severity="high"):
+async def publish_alert(recipient: str, alerts: list):
+    """One alert_sent per recipient and digest window (see alert_engine)."""
     # For hackathon: console print + publish alert_sent
+    hospital_id, message, severity = digest(alerts)
     alert = {
         "event_type": "alert_sent",
         "ts": now(),
         "hospital_id": hospital_id,
         "message": message,
         "severity": severity,
-        "recipients": recipients or []
+        "recipients": [recipient],
     }
-    await r.publish(CHANNEL, json.dumps(alert))
-    print(f"[AlertingAgent] ALERT for {hospital_id}: {message}")
+    if len(alerts) > 1:
+        alert["alerts"] = [{k: a[k] for k in ("hospital_id", "kind", "severity")} for a in alerts]
+    await publish_event(alert)
+    print(f"[AlertingAgent] ALERT to {recipient} for {hospital_id}: {message}")
+
+# Dedups repeats per (hospital, kind), groups alerts into digests and rate-limits each recipient
+ALERTS = AlertEngine(publish_alert)
+
+async def send_alert_notification(hospital_id: str, message: str, recipients=None, severity="high", kind="alert"):
+    ALERTS.submit(hospital_id, kind, message, recipients or [], severity)
 
 async def alerting_agent(payload: dict):
     """
@@ -177,89 +294,164 @@ async def alerting_agent(payload: dict):
         for p in preds:
             yhat = p.get("yhat", 0)
             if yhat >= THRESHOLD:
-                await send_alert_notification(hospital_id, f"Predicted occupancy {yhat} >= {THRESHOLD} on {p.get('ds')}", recipients=["admin@example.com"])
+                await send_alert_notification(hospital_id, f"Predicted occupancy {yhat} >= {THRESHOLD} on {p.get('ds')}", recipients=["admin@example.com"], kind="occupancy")
                 return
     elif etype == "optimized_plan":
-        plan = payload.get("plan", [])
-        for action in plan:
+        # One alert per hospital the plan touches (a city plan covers many)
+        by_hospital = {}
+        for action in payload.get("plan", []):
             if action["action"] != "no_action":
-                await send_alert_notification(hospital_id, f"Optimization recommends: {action}", recipients=["logistics@example.com"])
-                return
+                by_hospital.setdefault(action.get("hospital_id", hospital_id), []).append(action)
+        await asyncio.gather(*(
+            send_alert_notification(hid, f"Optimization recommends: {actions}", recipients=["logistics@example.com"], kind="plan")
+            for hid, actions in by_hospital.items()
+        ))
 
 # ------------------------------------------------------------
 # Logistics agent — create a job in your server
 # ------------------------------------------------------------
 async def logistics_agent(payload: dict):
     """
-    Create a job on your server when optimized_plan says request_tanker.
+    Create a job on your server for every request_tanker in an optimized_plan.
     """
     if payload.get("event_type") != "optimized_plan":
         return
     hospital_id = payload.get("hospital_id")
-    plan = payload.get("plan", [])
-    for action in plan:
-        if action.get("action") == "request_tanker":
-            qty = action.get("quantity", 1)
-            job_payload = {
-                "type": "oxygen_delivery",
-                "hospitalId": hospital_id,
-                "quantity": qty,
-                "priority": "high",
-                "notes": action.get("reason", "")
-            }
-            status, text = await post_to_server("/api/jobs", job_payload)
-            print(f"[LogisticsAgent] created job for {hospital_id}: status {status}, resp {text}")
-            # publish job_created event for audit
-            evt = {
-                "event_type": "job_created",
-                "ts": now(),
-                "hospital_id": hospital_id,
-                "job_payload": job_payload,
-                "server_status": status
-            }
-            await r.publish(CHANNEL, json.dumps(evt))
-            return
+    tankers = [a for a in payload.get("plan", []) if a.get("action") == "request_tanker"]
+    # A city plan can request tankers for many hospitals; their jobs go out together
+    await asyncio.gather(*(create_tanker_job(a.get("hospital_id", hospital_id), a) for a in tankers))
+
+async def create_tanker_job(hospital_id: str, action: dict):
+    qty = action.get("quantity", 1)
+    job_payload = {
+        "type": "oxygen_delivery",
+        "hospitalId": hospital_id,
+        "quantity": qty,
+        "priority": "high",
+        "notes": action.get("reason", "")
+    }
+    # Coalesced with other hospitals' jobs into one /api/jobs/bulk call
+    status, text = await JOBS.submit(job_payload)
+    print(f"[LogisticsAgent] created job for {hospital_id}: status {status}, resp {text}")
+    # publish job_created event for audit
+    evt = {
+        "event_type": "job_created",
+        "ts": now(),
+        "hospital_id": hospital_id,
+        "job_payload": job_payload,
+        "server_status": status
+    }
+    await publish_event(evt)
 
 # ------------------------------------------------------------
 # Main subscriber: route events to agents
 # ------------------------------------------------------------
-async def handle_incoming_event(message_str: str):
+ROUTES = {
+    "data_uploaded": [forecast_agent],                        # Run forecasting
+    "prediction_ready": [optimization_agent, alerting_agent], # Optimization & alerting
+    "optimized_plan": [logistics_agent, alerting_agent],
+}
+
+async def unhandled_event(payload: dict):
+    # you can also handle alert_sent or job_created etc.
+    print("Unhandled event type:", payload.get("event_type", ""))
+
+def decode_event(message):
+    """Event dict from a v1 (JSON) or v2 (msgpack / JSON) message, or None if invalid."""
     try:
-        payload = json.loads(message_str)
-    except Exception as e:
-        print("Invalid JSON payload", e)
+        return decode(message)
+    except EventError as e:
+        REJECTED.inc()
+        print("Invalid event payload:", e)
+        return None
+
+async def handle_incoming_event(message_str):
+    """Handles one event inline (no queueing); used for one-off replays."""
+    payload = decode_event(message_str)
+    if payload is None:
         return
-    etype = payload.get("event_type", "")
-    # route:
-    if etype == "data_uploaded":
-        # Run forecasting
-        await forecast_agent(payload)
-    elif etype == "prediction_ready":
-        # Optimization & alerting
-        await optimization_agent(payload)
-        await alerting_agent(payload)
-    elif etype == "optimized_plan":
-        await logistics_agent(payload)
-        await alerting_agent(payload)
-    else:
-        # you can also handle alert_sent or job_created etc.
-        print("Unhandled event type:", etype)
+    for handler in ROUTES.get(payload.get("event_type", ""), [unhandled_event]):
+        await handler(payload)
+
+async def report_stats(dispatcher: EventDispatcher, transport):
+    while True:
+        await asyncio.sleep(STATS_INTERVAL_S)
+        print(f"[Dispatcher] {json.dumps(dispatcher.stats())} {json.dumps(transport.stats())}")
+        print(f"[ForecastAgent] {json.dumps(FORECASTER.stats())} ingest {json.dumps(INGEST.stats())}")
+        print(f"[HTTP] {json.dumps(HTTP.stats())} jobs {json.dumps(JOBS.stats())}")
+        print(f"[AlertingAgent] {json.dumps(ALERTS.stats())}")
+
+def register_metrics(dispatcher: EventDispatcher):
+    """Scrape-time views of the stats the crew's components already keep."""
+    METRICS.callback("medlyf_event_queue_depth", "Events waiting in the dispatcher lanes.",
+                     lambda: {e: s["queue_depth"] for e, s in dispatcher.stats()["event_types"].items()},
+                     ("event_type",))
+    METRICS.callback("medlyf_blocked_dispatches_total", "Dispatches that waited on a full lane.",
+                     lambda: dispatcher.blocked, kind="counter")
+    METRICS.callback("medlyf_ingest_loads_total", "Upload loads by result.",
+                     lambda: {k: INGEST.stats()[k] for k in ("hits", "misses", "rejected")}, ("result",), kind="counter")
+    METRICS.callback("medlyf_forecasts_total", "Hospital forecasts by mode.",
+                     lambda: dict(FORECASTER.stats()["counts"]), ("mode",), kind="counter")
+    METRICS.callback("medlyf_server_requests_total", "Requests to the server by path.",
+                     lambda: {p: s["requests"] for p, s in HTTP.stats().items()}, ("path",), kind="counter")
+    METRICS.callback("medlyf_server_errors_total", "Failed requests to the server by path.",
+                     lambda: {p: s["errors"] for p, s in HTTP.stats().items()}, ("path",), kind="counter")
+
+async def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """
+    GET /metrics (Prometheus text); POST /profile?target=event:<type>[&count=1]
+    samples the next handling of that event type, GET /profile lists profiles.
+    Returns the aiohttp runner (cleanup() to stop).
+    """
+    from aiohttp import web
+
+    async def metrics(request):
+        return web.Response(body=METRICS.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    async def profile(request):
+        if request.method == "POST":
+            target = request.query.get("target", "")
+            if not target.startswith("event:"):
+                return web.json_response({"error": "target must be event:<event_type>"}, status=400)
+            try:
+                PROFILES.arm(target, int(request.query.get("count", "1")))
+            except ValueError:
+                return web.json_response({"error": "count must be an integer"}, status=400)
+        return web.json_response(PROFILES.status())
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/profile", profile)
+    app.router.add_post("/profile", profile)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Crew metrics on http://{host}:{port}/metrics")
+    return runner
 
 async def subscriber_loop():
-    sub = r.pubsub()
-    await sub.subscribe(CHANNEL)
-    print(f"Crew subscriber listening on {CHANNEL} (REDIS_URL={REDIS_URL})")
+    transport = get_transport()
+    dispatcher = EventDispatcher(ROUTES, lanes=DISPATCH_LANES, queue_size=DISPATCH_QUEUE_SIZE, fallback=unhandled_event)
+    register_metrics(dispatcher)
+    reporter = asyncio.create_task(report_stats(dispatcher, transport))
+    metrics_runner = None
+    if METRICS_PORT:
+        try:
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            print(f"Crew metrics endpoint not started: {e}")
+    print(f"Crew subscriber listening on {CHANNEL} via {TRANSPORT}, publishing {EVENT_CODEC} (REDIS_URL={REDIS_URL})")
     try:
-        while True:
-            msg = await sub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-            if msg and msg.get("data"):
-                # message['data'] is the published string
-                await handle_incoming_event(msg['data'])
-            await asyncio.sleep(0.05)
+        await transport.consume(dispatcher.dispatch, decode_event)
     except asyncio.CancelledError:
         print("Subscriber cancelled")
     finally:
-        await sub.unsubscribe(CHANNEL)
+        reporter.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await dispatcher.close()
+        await ALERTS.drain()
+        await HTTP.close()
 
 if __name__ == "__main__":
     # run as long lived crew process
@@ -0,0 +1,123 @@
+"""
+In-memory cache for the outbreak CSV used by forecasting_agent.py.
+
+The CSV is parsed once, columns and disease names are normalized, `ds` is
+built from year/month and every disease's monthly ds/y series comes out of
+one vectorized pass (series_prep.MonthlyPanel). The file is only re-read
+when its mtime or size changes; readers always get a complete snapshot that
+is swapped in atomically.
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+
+import pandas as pd
+
+from metrics import timed
+from series_prep import MonthlyPanel, build_ds, normalize_disease_name, normalize_names
+
+TARGET_COLUMNS = ['reported_cases', 'cases', 'count', 'y']
+
+
+@dataclass(frozen=True)
+class DatasetSnapshot:
+    """One parsed version of the CSV. Treat the frames as read-only."""
+    frame: pd.DataFrame
+    partitions: dict          # normalized disease name -> monthly ds/y frame
+    diseases: list            # display names in CSV order
+    panel: MonthlyPanel       # month x disease matrix behind `partitions`
+    mtime_ns: int
+    size: int
+    loaded_at: datetime
+
+    def series(self, disease_name):
+        return self.partitions.get(normalize_disease_name(disease_name))
+
+    def matches(self, st):
+        return self.mtime_ns == st.st_mtime_ns and self.size == st.st_size
+
+
+def load_snapshot(path, st=None):
+    """Parses the CSV at `path` into a DatasetSnapshot."""
+    st = st or os.stat(path)
+    with timed("csv_load"):
+        df = pd.read_csv(path)
+    df.columns = [c.lower().strip() for c in df.columns]
+
+    diseases = []
+    target_col = next((c for c in TARGET_COLUMNS if c in df.columns), None)
+
+    if 'disease' in df.columns:
+        diseases = df['disease'].unique().tolist()
+        df['disease_clean'] = normalize_names(df['disease'])
+
+    panel = MonthlyPanel.build([], [], [])
+    if 'disease' in df.columns and target_col:
+        with timed("series_prep"):
+            ds = build_ds(df)
+            if ds is not None:
+                df['ds'] = ds
+                panel = MonthlyPanel.build(df['disease_clean'], ds, df[target_col])
+
+    return DatasetSnapshot(
+        frame=df,
+        partitions=panel.partitions(),
+        diseases=diseases,
+        panel=panel,
+        mtime_ns=st.st_mtime_ns,
+        size=st.st_size,
+        loaded_at=datetime.now(),
+    )
+
+
+class DatasetCache:
+    """Thread-safe, stat-validated cache around load_snapshot()."""
+
+    def __init__(self, path):
+        self.path = path
+        self._snapshot = None
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _count(self, attr):
+        with self._stats_lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def get(self):
+        """Returns the current snapshot, re-reading the CSV only if it changed."""
+        st = os.stat(self.path)
+        snap = self._snapshot
+        if snap is not None and snap.matches(st):
+            self._count('hits')
+            return snap
+
+        with self._load_lock:
+            # Another thread may have reloaded while we waited for the lock
+            snap = self._snapshot
+            if snap is not None and snap.matches(st):
+                self._count('hits')
+                return snap
+
+            self._count('misses')
+            fresh = load_snapshot(self.path, st)
+            if snap is not None:
+                self._count('reloads')
+            self._snapshot = fresh
+            return fresh
+
+    def invalidate(self):
+        with self._load_lock:
+            self._snapshot = None
+
+    def stats(self):
+        snap = self._snapshot
+        with self._stats_lock:
+            out = {"hits": self.hits, "misses": self.misses, "reloads": self.reloads}
+        out["loaded_at"] = snap.loaded_at.isoformat() if snap else None
+        out["diseases"] = len(snap.partitions) if snap else 0
+        return out
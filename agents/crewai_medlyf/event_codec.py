@@ -0,0 +1,182 @@
+"""
+Versioned wire format for crew events.
+
+v1 is the original format: the event dict as JSON text, predictions as a
+list of row dicts. v2 events carry "v": 2 and store predictions column-wise
+({"ds": [epoch seconds], "yhat": [...], ...}, no per-row keys); they are
+msgpack-encoded, or JSON-encoded when msgpack is not installed or
+EVENT_CODEC=json.
+
+decode() tells the formats apart by the first byte and the "v" field, so a
+consumer reads both versions; events from a newer version are rejected
+rather than misread. Producers send v1 unless EVENT_CODEC says otherwise:
+roll out by upgrading every consumer first, then switch producers to
+EVENT_CODEC=msgpack (or json). Every event is
+checked against SCHEMAS on both ends, and decode() always returns the
+in-process shape the handlers use: predictions as row dicts with ISO ds
+strings.
+"""
+
+import json
+import os
+from functools import lru_cache
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+try:
+    import msgpack
+except ImportError:  # v2 events go out as JSON
+    msgpack = None
+
+# "v1" (original JSON rows), "msgpack" (v2) or "json" (v2 as JSON text);
+# v2 only once no consumer older than this module is left
+EVENT_CODEC = os.getenv("EVENT_CODEC", "v1")
+
+SCHEMA_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+
+_ID = (str, int)
+
+# Required fields (and their types) per event type; other fields are free-form
+SCHEMAS = {
+    "data_uploaded": {"hospital_id": _ID, "file_path": str},
+    "prediction_ready": {"hospital_id": _ID, "predictions": list},
+    "optimized_plan": {"hospital_id": _ID, "plan": list},
+    "alert_sent": {"hospital_id": _ID, "message": str},
+    "job_created": {"hospital_id": _ID, "job_payload": dict},
+}
+
+_DAY_S = 24 * 3600
+
+
+class EventError(ValueError):
+    """An event that can't be decoded or doesn't match its schema."""
+
+
+def validate(event):
+    """Raises EventError unless `event` has an event_type and its schema's fields."""
+    if not isinstance(event, dict):
+        raise EventError("event is not an object")
+    etype = event.get("event_type")
+    if not isinstance(etype, str) or not etype:
+        raise EventError("missing event_type")
+    for field, types in SCHEMAS.get(etype, {}).items():
+        if not isinstance(event.get(field), types):
+            raise EventError(f"{etype}: missing or malformed {field!r}")
+    return event
+
+
+def _plain(obj):
+    """Serializer fallback for the pandas / NumPy values handlers put in events."""
+    if isinstance(obj, (pd.Timestamp, datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} is not serializable in an event")
+
+
+# ---------- predictions: rows <-> columns ----------
+def _epoch_seconds(values):
+    try:
+        # NumPy parses ISO strings / dates ~100x faster than pd.to_datetime
+        stamps = np.array(values, dtype="datetime64[s]")
+    except (TypeError, ValueError):
+        stamps = pd.DatetimeIndex(pd.to_datetime(values)).as_unit("s").to_numpy()
+    if np.isnat(stamps).any():
+        raise ValueError("missing ds")
+    return stamps.astype(np.int64).tolist()
+
+
+def _numeric(values):
+    return all(v is None or (isinstance(v, (int, float, np.number)) and not isinstance(v, (bool, np.bool_)))
+               for v in values)
+
+
+def to_columns(rows):
+    """
+    [{"ds", "yhat", ...}] -> {"ds": [epoch s], "yhat": [...], ...}. Keys are
+    taken from every row (None where a row lacks one); numeric columns are
+    sent as floats, any other column as-is.
+    """
+    if not rows:
+        return {}
+    try:
+        keys = list(dict.fromkeys(k for r in rows for k in r))
+        cols = {}
+        for k in keys:
+            values = [r.get(k) for r in rows]
+            if k == "ds":
+                cols[k] = _epoch_seconds(values)
+            elif _numeric(values):
+                cols[k] = [None if v is None else float(v) for v in values]
+            else:
+                cols[k] = values
+    except (TypeError, ValueError, AttributeError) as e:
+        raise EventError(f"predictions: {e}") from None
+    return {"ds": cols.pop("ds"), **cols} if "ds" in cols else cols
+
+
+# Forecast dates repeat across events (same window for every hospital)
+@lru_cache(maxsize=4096)
+def _iso(seconds):
+    ts = datetime.fromtimestamp(seconds, tz=timezone.utc)
+    return ts.date().isoformat() if seconds % _DAY_S == 0 else ts.replace(tzinfo=None).isoformat()
+
+
+def from_columns(cols):
+    """Inverse of to_columns: row dicts with "YYYY-MM-DD" (or ISO datetime) ds strings."""
+    if not isinstance(cols, dict) or not all(isinstance(v, list) for v in cols.values()):
+        raise EventError("predictions: expected a dict of columns")
+    lengths = {len(v) for v in cols.values()}
+    if len(lengths) > 1:
+        raise EventError("predictions: columns have different lengths")
+    if "ds" in cols:
+        try:
+            cols = dict(cols, ds=[_iso(s) for s in cols["ds"]])
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise EventError("predictions: ds must be epoch seconds") from None
+    keys = list(cols)
+    return [dict(zip(keys, values)) for values in zip(*cols.values())]
+
+
+# ---------- encode / decode ----------
+def encode(event, codec=None):
+    """Wire form of `event` (bytes for msgpack, str for JSON); raises EventError if invalid."""
+    codec = codec or EVENT_CODEC
+    validate(event)
+    if codec == "v1":
+        return json.dumps(event, default=_plain)
+    wire = dict(event, v=SCHEMA_VERSION)
+    if "predictions" in wire:
+        wire["predictions"] = to_columns(wire["predictions"])
+    if codec == "msgpack" and msgpack is not None:
+        return msgpack.packb(wire, default=_plain)
+    return json.dumps(wire, default=_plain, separators=(",", ":"))
+
+
+def decode(data):
+    """Event dict from any supported version / encoding; raises EventError."""
+    if isinstance(data, (bytes, bytearray)) and data[:1] != b"{":
+        if msgpack is None:
+            raise EventError("msgpack event but msgpack is not installed")
+        try:
+            event = msgpack.unpackb(data)
+        except Exception as e:
+            raise EventError(f"invalid msgpack: {e}") from None
+    else:
+        try:
+            event = json.loads(data)
+        except (TypeError, ValueError) as e:
+            raise EventError(f"invalid JSON: {e}") from None
+    if not isinstance(event, dict):
+        raise EventError("event is not an object")
+    version = event.pop("v", 1)
+    if version not in SUPPORTED_VERSIONS:
+        raise EventError(f"unsupported event version {version!r}")
+    if version >= 2 and "predictions" in event:
+        event["predictions"] = from_columns(event["predictions"])
+    return validate(event)
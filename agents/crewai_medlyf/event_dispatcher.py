@@ -0,0 +1,166 @@
+"""
+Concurrent event dispatcher for the crew.
+
+Every event type gets a fixed number of lanes; a lane is a bounded queue
+drained by one worker task. Events for the same hospital always hash to the
+same lane, so they are handled in publish order, while different hospitals
+run concurrently (up to `lanes` handlers per event type). When a lane's
+queue is full, dispatch() waits, which stops the reader pulling more events
+off Redis (backpressure).
+"""
+
+import asyncio
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+
+from metrics import METRICS, profiled
+
+EVENTS = METRICS.counter("medlyf_events_total", "Events handled, by outcome (ok / failed).", ("event_type", "outcome"))
+HANDLE_SECONDS = METRICS.histogram("medlyf_event_handle_seconds", "Time running an event's handlers.", ("event_type",))
+QUEUE_WAIT_SECONDS = METRICS.histogram("medlyf_event_queue_wait_seconds", "Time an event waited in its lane.",
+                                       ("event_type",))
+EVENT_AGE_SECONDS = METRICS.histogram("medlyf_event_age_seconds", "Publish (event ts) to handled.", ("event_type",))
+
+
+def event_age_s(payload, now=None):
+    """Seconds since the event's "ts" (ISO-8601, as written by crew.now())."""
+    ts = payload.get("ts")
+    if not ts:
+        return None
+    try:
+        sent = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if sent.tzinfo is None:
+        sent = sent.replace(tzinfo=timezone.utc)
+    return ((now or datetime.now(timezone.utc)) - sent).total_seconds()
+
+
+def cancel_requested():
+    """
+    True if the current task has been cancelled. A cancel that lands while a
+    Redis command is in flight can be swallowed by the client, so long-lived
+    loops check this between units of work.
+    """
+    task = asyncio.current_task()
+    cancelling = getattr(task, "cancelling", None)  # Python 3.11+
+    return bool(cancelling and cancelling())
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class EventDispatcher:
+    """
+    routes: {event_type: [async handler(payload), ...]}; handlers for one
+    event run in order. Unrouted types go to `fallback` if given.
+    """
+
+    def __init__(self, routes, lanes=4, queue_size=100, fallback=None, sample_size=1000):
+        self.routes = routes
+        self.lanes = lanes
+        self.queue_size = queue_size
+        self.fallback = fallback
+        self._queues = {}
+        self._workers = []
+        self._latency = {}
+        self._queue_wait = {}
+        self._sample_size = sample_size
+        self.handled = {}
+        self.failed = {}
+        self.blocked = 0
+
+    def _lane(self, etype, hospital_id):
+        queues = self._queues.get(etype)
+        if queues is None:
+            queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.lanes)]
+            self._queues[etype] = queues
+            self._workers += [asyncio.create_task(self._worker(etype, q)) for q in queues]
+        return queues[zlib.crc32(str(hospital_id).encode()) % self.lanes]
+
+    async def dispatch(self, payload, on_done=None):
+        """
+        Queues one decoded event; waits while its lane is full.
+        on_done(ok) is awaited after the handlers ran (e.g. to ack a stream entry).
+        """
+        etype = payload.get("event_type", "")
+        if etype not in self.routes and self.fallback is None:
+            if on_done is not None:
+                await on_done(True)
+            return
+        queue = self._lane(etype, payload.get("hospital_id"))
+        if queue.full():
+            self.blocked += 1
+        await queue.put((payload, time.perf_counter(), on_done))
+
+    async def _worker(self, etype, queue):
+        handlers = self.routes.get(etype) or [self.fallback]
+        while True:
+            payload, queued_at, on_done = await queue.get()
+            started = time.perf_counter()
+            ok = False
+            try:
+                # POST /profile?target=event:<type> on the crew's metrics port arms this
+                with profiled(f"event:{etype}"):
+                    for handler in handlers:
+                        await handler(payload)
+                ok = True
+                self.handled[etype] = self.handled.get(etype, 0) + 1
+            except Exception as e:
+                self.failed[etype] = self.failed.get(etype, 0) + 1
+                print(f"[Dispatcher] {etype} handler failed for {payload.get('hospital_id')}: {e}")
+            finally:
+                if on_done is not None:
+                    try:
+                        await on_done(ok)
+                    except Exception as e:
+                        print(f"[Dispatcher] completion callback failed: {e}")
+                queue.task_done()
+            EVENTS.inc(event_type=etype, outcome="ok" if ok else "failed")
+            HANDLE_SECONDS.observe(time.perf_counter() - started, event_type=etype)
+            QUEUE_WAIT_SECONDS.observe(started - queued_at, event_type=etype)
+            self._record(self._queue_wait, etype, started - queued_at)
+            age = event_age_s(payload)
+            if age is not None:
+                EVENT_AGE_SECONDS.observe(age, event_type=etype)
+                self._record(self._latency, etype, age)
+            if cancel_requested():
+                raise asyncio.CancelledError
+
+    def _record(self, store, etype, value):
+        store.setdefault(etype, deque(maxlen=self._sample_size)).append(value)
+
+    async def join(self):
+        """Waits until every queued event has been handled."""
+        for queues in list(self._queues.values()):
+            for queue in queues:
+                await queue.join()
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues = {}
+
+    def stats(self):
+        out = {"blocked_dispatches": self.blocked, "event_types": {}}
+        for etype, queues in self._queues.items():
+            lat = list(self._latency.get(etype, ()))
+            wait = list(self._queue_wait.get(etype, ()))
+            out["event_types"][etype] = {
+                "queue_depth": sum(q.qsize() for q in queues),
+                "max_lane_depth": max(q.qsize() for q in queues),
+                "handled": self.handled.get(etype, 0),
+                "failed": self.failed.get(etype, 0),
+                "latency_p50_ms": round(percentile(lat, 0.5) * 1000, 1) if lat else None,
+                "latency_p99_ms": round(percentile(lat, 0.99) * 1000, 1) if lat else None,
+                "queue_wait_p99_ms": round(percentile(wait, 0.99) * 1000, 1) if wait else None,
+            }
+        return out
@@ -0,0 +1,184 @@
+"""
+Event transports for the crew.
+
+PubSubTransport is the original fire-and-forget Redis pub/sub channel.
+StreamTransport keeps events in a capped Redis Stream read through a consumer
+group: an entry is acked only after its handlers succeeded, entries left
+pending by a dead replica are reclaimed (XPENDING + XCLAIM) by a live one, and
+entries that keep failing are moved to a dead-letter stream. Any number of
+crew replicas can join the same group to share the load; per-hospital
+ordering then only holds within a single replica.
+
+Both take the event encoder (event_codec.encode in the crew) and hand the
+raw message to the consumer's decode function, so they work with str or
+bytes payloads (a Redis client without decode_responses for msgpack).
+"""
+
+import asyncio
+import json
+import os
+import socket
+
+from event_dispatcher import cancel_requested
+
+
+class PubSubTransport:
+    def __init__(self, redis, channel, encode=json.dumps):
+        self.redis = redis
+        self.channel = channel
+        self.encode = encode
+
+    async def publish(self, event: dict):
+        await self.redis.publish(self.channel, self.encode(event))
+
+    async def consume(self, dispatch, decode):
+        """Feeds every message to dispatch(payload) until cancelled."""
+        sub = self.redis.pubsub()
+        await sub.subscribe(self.channel)
+        try:
+            # listen() blocks until Redis pushes a message: no polling, no sleep
+            async for msg in sub.listen():
+                if msg.get("type") != "message" or not msg.get("data"):
+                    continue
+                payload = decode(msg["data"])
+                if payload is not None:
+                    # Waits if this hospital's lane is full (backpressure)
+                    await dispatch(payload)
+        finally:
+            await sub.unsubscribe(self.channel)
+
+    def stats(self):
+        return {"transport": "pubsub", "channel": self.channel}
+
+
+class StreamTransport:
+    def __init__(self, redis, stream, group, consumer=None, maxlen=100_000, batch=50,
+                 block_ms=5000, reclaim_idle_ms=60_000, reclaim_interval_s=15.0, max_deliveries=5,
+                 encode=json.dumps):
+        self.redis = redis
+        self.encode = encode
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.maxlen = maxlen
+        self.batch = batch
+        self.block_ms = block_ms
+        self.reclaim_idle_ms = reclaim_idle_ms
+        self.reclaim_interval_s = reclaim_interval_s
+        self.max_deliveries = max_deliveries
+        self.dead_letter = f"{stream}:dead"
+        self.acked = 0
+        self.nacked = 0
+        self.reclaimed = 0
+        self.dead_lettered = 0
+        self._in_flight = set()
+
+    async def publish(self, event: dict):
+        # Approximate trimming (~) keeps XADD O(1)
+        await self.redis.xadd(self.stream, {"data": self.encode(event)}, maxlen=self.maxlen, approximate=True)
+
+    async def ensure_group(self):
+        try:
+            # "0": a brand-new group also picks up entries published before it existed
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _ack(self, entry_id, ok):
+        self._in_flight.discard(entry_id)
+        if ok:
+            await self.redis.xack(self.stream, self.group, entry_id)
+            self.acked += 1
+        else:
+            # Left pending: reclaimed and retried once it has been idle long enough
+            self.nacked += 1
+
+    async def _handle_entries(self, entries, dispatch, decode):
+        for entry_id, fields in entries:
+            payload = decode(fields.get("data", fields.get(b"data"))) if fields else None
+            if payload is None:
+                # Undecodable (or already trimmed) entries can never succeed
+                await self.redis.xack(self.stream, self.group, entry_id)
+                continue
+            self._in_flight.add(entry_id)
+            await dispatch(payload, on_done=lambda ok, i=entry_id: self._ack(i, ok))
+
+    async def reclaim_once(self, dispatch, decode):
+        """Takes over entries idle longer than reclaim_idle_ms from any consumer."""
+        start = "-"
+        while True:
+            # Listed first and claimed by id: claiming bumps the delivery count, and
+            # entries still queued in our own dispatcher aren't abandoned, so they
+            # must not be claimed (a later nack would dead-letter them too early)
+            pending = await self.redis.xpending_range(self.stream, self.group, min=start, max="+", count=self.batch,
+                                                      idle=self.reclaim_idle_ms or None)
+            deliveries = {p["message_id"]: p["times_delivered"] for p in pending
+                          if p["message_id"] not in self._in_flight}
+            claimed = []
+            if deliveries:
+                claimed = await self.redis.xclaim(self.stream, self.group, self.consumer,
+                                                  min_idle_time=self.reclaim_idle_ms, message_ids=list(deliveries))
+            live = []
+            for entry_id, fields in claimed:
+                if deliveries.get(entry_id, 0) + 1 > self.max_deliveries:
+                    await self.redis.xadd(self.dead_letter, dict(fields or {}, source_id=entry_id), maxlen=self.maxlen, approximate=True)
+                    await self.redis.xack(self.stream, self.group, entry_id)
+                    self.dead_lettered += 1
+                else:
+                    live.append((entry_id, fields))
+            self.reclaimed += len(live)
+            await self._handle_entries(live, dispatch, decode)
+            if len(pending) < self.batch:
+                return
+            last = pending[-1]["message_id"]
+            start = "(" + (last.decode() if isinstance(last, bytes) else last)
+
+    async def _reclaim_loop(self, dispatch, decode):
+        while True:
+            await asyncio.sleep(self.reclaim_interval_s)
+            try:
+                await self.reclaim_once(dispatch, decode)
+            except Exception as e:
+                print(f"[StreamTransport] reclaim failed: {e}")
+
+    async def consume(self, dispatch, decode):
+        """Reads the group until cancelled; dispatch(payload, on_done=...) acks."""
+        await self.ensure_group()
+        reclaimer = asyncio.create_task(self._reclaim_loop(dispatch, decode))
+        try:
+            # Entries this consumer name received before a restart but never acked
+            last_id = "0"
+            while True:
+                pending = await self.redis.xreadgroup(self.group, self.consumer, {self.stream: last_id}, count=self.batch)
+                entries = [e for _, batch in pending or [] for e in batch]
+                if not entries:
+                    break
+                await self._handle_entries(entries, dispatch, decode)
+                last_id = entries[-1][0]
+            while True:
+                res = await self.redis.xreadgroup(self.group, self.consumer, {self.stream: ">"},
+                                                  count=self.batch, block=self.block_ms)
+                entries = [e for _, batch in res or [] for e in batch]
+                if cancel_requested():
+                    raise asyncio.CancelledError
+                if not entries:
+                    # Clients that answer an empty BLOCK read instantly (or with
+                    # an empty batch) must not starve the loop
+                    await asyncio.sleep(0)
+                    continue
+                await self._handle_entries(entries, dispatch, decode)
+        finally:
+            reclaimer.cancel()
+
+    def stats(self):
+        return {
+            "transport": "streams",
+            "stream": self.stream,
+            "group": self.group,
+            "consumer": self.consumer,
+            "acked": self.acked,
+            "nacked": self.nacked,
+            "reclaimed": self.reclaimed,
+            "dead_lettered": self.dead_lettered,
+        }
@@ -0,0 +1,108 @@
+"""
+Materialized forecast table for forecasting_agent.py.
+
+Every disease is run through Prophet + the severity model ahead of time
+(at startup and after each daily scan) and the results are stored here,
+keyed by (normalized disease name, horizon). /predict becomes a dict lookup;
+anything not in the table falls back to live compute in the caller.
+
+Each server worker holds its own table and only the scheduling worker
+scans, so the other workers rebuild theirs (refresh_if_stale) when a
+request sees that the CSV changed since the table was built.
+"""
+
+import threading
+from datetime import datetime
+
+from dataset_cache import normalize_disease_name
+
+
+class ForecastTable:
+    """Immutable-per-version table; materialize() swaps in a whole new one."""
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+        self.materialized_at = None
+        self.dataset_version = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._refreshing = threading.Lock()
+
+    def replace(self, rows, dataset_version=None):
+        """Atomically publishes a new {(key, horizon): result} mapping."""
+        rows = {(normalize_disease_name(k), int(h)): v for (k, h), v in rows.items()}
+        with self._lock:
+            self._rows = rows
+            self.materialized_at = datetime.now()
+            self.dataset_version = dataset_version
+
+    def lookup(self, disease_name, horizon=1, dataset_version=None):
+        """Returns (result, materialized_at) or None on a miss / stale table."""
+        with self._lock:
+            rows, ts, version = self._rows, self.materialized_at, self.dataset_version
+        hit = None
+        if dataset_version is None or dataset_version == version:
+            hit = rows.get((normalize_disease_name(disease_name), int(horizon)))
+        with self._lock:
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return (hit, ts) if hit is not None else None
+
+    def refresh_if_stale(self, dataset_version, rebuild):
+        """
+        Starts rebuild() in a background thread when the table was built from
+        another dataset version. At most one rebuild runs at a time; an empty
+        table is left to whoever fills it first (startup or the scan).
+        Returns the thread, or None.
+        """
+        if self.dataset_version in (None, dataset_version) or not self._refreshing.acquire(blocking=False):
+            return None
+
+        def run():
+            try:
+                rebuild()
+            except Exception as e:
+                print(f"   ⚠️ Could not refresh the forecast table: {e}")
+            finally:
+                self._refreshing.release()
+
+        with self._lock:
+            self.refreshes += 1
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def horizons(self):
+        return sorted({h for _, h in self._rows})
+
+    def __len__(self):
+        return len(self._rows)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": len(self._rows),
+                "materialized_at": self.materialized_at.isoformat() if self.materialized_at else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+            }
+
+
+def materialize(diseases, compute_fn, horizons):
+    """
+    Runs compute_fn(diseases, horizons) -> {disease: {horizon: result}} once
+    for the whole batch. Results carrying an "error" key are left out of the
+    table. Returns ({(disease, horizon): result}, {disease: {horizon: result}}).
+    """
+    by_disease = compute_fn(list(diseases), horizons) or {}
+    rows = {}
+    for disease, results in by_disease.items():
+        for horizon, result in (results or {}).items():
+            if result and "error" not in result:
+                rows[(disease, horizon)] = result
+    return rows, by_disease
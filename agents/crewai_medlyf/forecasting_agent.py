@@ -1,15 +1,23 @@
 import os
 import time
 import schedule
-import pandas as pd
-import joblib
+import numpy as np
 import certifi
 import threading  # <--- NEW: Needed to run scheduler + API together
-from flask import Flask, jsonify, request # <--- NEW: Flask imports
+from flask import Flask, Response, g, jsonify, request # <--- NEW: Flask imports
 from datetime import datetime
-from pymongo import MongoClient
-from huggingface_hub import snapshot_download
-from prophet import Prophet
+from dataset_cache import DatasetCache, normalize_disease_name
+from forecast_table import ForecastTable, materialize
+from severity import horizon_tails, score_tails
+from model_registry import ModelRegistry
+from parallel_scan import SCAN_WORKERS, ScanPool
+from prophet_fast import forecast_rows, stats as fast_prophet_stats
+from metrics import (CONTENT_TYPE, METRICS, PROFILES, STAGE_ERRORS, STAGE_SECONDS, SamplingProfiler, profiled,
+                     timed)
+from mongo_store import BatchedWriter, get_client
+from scan_state import ScanState, disease_digests
+from serving import (SHED_RETRY_AFTER_S, LoadShedder, PredictionPool, PredictionTimeout, ProcessLock, ScanQueue,
+                     lock_path)
 
 # ============================================
 # 1. FLASK SETUP
@@ -27,180 +35,364 @@ CSV_FILE = "mumbai_disease_outbreaks_2020_2024.csv"
 REPO_ID = "manubhavsar/mumbai-forecast-models"
 LOCAL_MODELS = "./models"
 
+# Months ahead precomputed for /predict (other horizons are computed live)
+FORECAST_HORIZONS = [1, 2, 3]
+
+# Minutes between scheduled scans
+SCAN_INTERVAL_MIN = float(os.getenv("SCAN_INTERVAL_MIN", "24"))
+
+# Per-disease input hashes + last results; scans recompute only what changed
+SCAN_STATE_FILE = os.getenv("SCAN_STATE_FILE", "scan_state.json")
+
+# Seconds between attempts of a non-scheduler worker to take over scheduling
+SCHEDULER_ELECTION_S = float(os.getenv("SCHEDULER_ELECTION_S", "30"))
+
 # ============================================
 # 3. MODEL LOADER
 # ============================================
-def load_models():
-    """Downloads and loads models into memory once."""
-    print("📥 Checking models...")
-    os.makedirs(LOCAL_MODELS, exist_ok=True)
-    
-    # Only download if folder is empty
-    if not os.listdir(LOCAL_MODELS):
-        print("   Downloading from Hugging Face...")
-        snapshot_download(repo_id=REPO_ID, repo_type="model", local_dir=LOCAL_MODELS)
-    
-    print("   Loading Random Forest & Prophet models...")
-    clf = joblib.load(os.path.join(LOCAL_MODELS, "severity_rf.joblib"))
-    le = joblib.load(os.path.join(LOCAL_MODELS, "label_encoder.joblib"))
-    
-    prophet_models = {}
-    for fname in os.listdir(LOCAL_MODELS):
-        if fname.startswith("prophet_") and fname.endswith(".pkl"):
-            key = fname.replace("prophet_", "").replace(".pkl", "").replace("_", " ").replace("-", " ").lower()
-            prophet_models[key] = joblib.load(os.path.join(LOCAL_MODELS, fname))
-            
-    return clf, le, prophet_models
-
-# Load Global Models Once
+# Models are listed now and unpickled on first use (or by warmup below)
+STARTED_AT = time.perf_counter()
 print("🚀 Initializing MedLyf Engine...")
-RF_MODEL, LABEL_ENCODER, PROPHET_MODELS = load_models()
-print(f"   ✅ Models Loaded: {list(PROPHET_MODELS.keys())}")
+REGISTRY = ModelRegistry(LOCAL_MODELS, repo_id=REPO_ID)
+
+# "background" (default), "blocking" or "lazy"
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "background")
+
+# Seconds between checks of LOCAL_MODELS for new files (0 = admin endpoint only)
+MODEL_WATCH_INTERVAL_S = float(os.getenv("MODEL_WATCH_INTERVAL_S", "60"))
+
+# Required in X-Admin-Token for /admin/* when set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def warmup_models():
+    """Loads every model in parallel so the first requests don't pay for it."""
+    print("📥 Warming up models...")
+    try:
+        seconds = REGISTRY.warmup()
+        print(f"   ✅ Models Loaded in {seconds}s: {list(REGISTRY.prophet.keys())}")
+    except Exception as e:
+        print(f"   ❌ Model warmup failed: {e}")
+
+# Parsed + partitioned CSV, re-read only when the file changes
+DATASET_CACHE = DatasetCache(CSV_FILE)
+
+# Precomputed (disease, horizon) -> result, refreshed after each scan
+FORECAST_TABLE = ForecastTable()
+
+# Process pool for the scan's Prophet step (SCAN_WORKERS=1 keeps it serial)
+SCAN_POOL = ScanPool(LOCAL_MODELS) if SCAN_WORKERS > 1 else None
+
+def on_models_swapped(models):
+    """New model version: refresh the forecast table without blocking requests."""
+    print(f"   🔁 Serving model version {models.version}")
+    threading.Thread(target=materialize_forecasts, daemon=True).start()
+
+REGISTRY.on_swap.append(on_models_swapped)
 
 # ============================================
 # 4. ANALYSIS LOGIC
 # ============================================
-def analyze_disease(disease_name, df):
-    """Runs forecast & severity check for a single disease."""
-    
-    # --- Filter Data ---
-    clean_name = disease_name.lower().replace("/", " ").replace("-", " ")
+def forecast_disease(disease_name, dataset, horizons=(1,), models=None):
+    """
+    Prophet step for one disease: one predict call covers every horizon.
+    Returns (history_df, {h: fcst_row for h in 1..max(horizons)}),
+    (None, error_dict) or
+    (None, None) if the disease is not in the dataset.
+    """
     
-    if 'disease' in df.columns:
-        df['disease_clean'] = df['disease'].astype(str).str.lower().str.replace("/", " ").str.replace("-", " ")
-        disease_df = df[df['disease_clean'] == clean_name].copy()
-    else:
-        return None
+    # --- Cached, pre-aggregated monthly series ---
+    clean_name = normalize_disease_name(disease_name)
+    disease_df = dataset.series(clean_name)
 
-    if disease_df.empty: return None
-
-    # --- Prepare Time Series ---
-    try:
-        if 'year' in disease_df.columns and 'month' in disease_df.columns:
-            try:
-                disease_df['ds'] = pd.to_datetime(disease_df['year'].astype(str) + '-' + disease_df['month'], format='%Y-%b')
-            except:
-                disease_df['ds'] = pd.to_datetime(disease_df['year'].astype(str) + '-' + disease_df['month'], format='%Y-%B')
-        elif 'date' in disease_df.columns:
-            disease_df['ds'] = pd.to_datetime(disease_df['date'])
-        
-        target_col = next((c for c in ['reported_cases', 'cases', 'count', 'y'] if c in disease_df.columns), None)
-        if not target_col: return None
-        
-        disease_df = disease_df.rename(columns={target_col: 'y'})
-        disease_df = disease_df.groupby(pd.Grouper(key='ds', freq='MS')).sum().reset_index()
-    except:
-        return None
+    if disease_df is None or disease_df.empty: return None, None
 
     # --- Prophet Forecast ---
-    model = PROPHET_MODELS.get(clean_name)
-    if not model:
-        # Fuzzy match attempt
-        model = next((v for k, v in PROPHET_MODELS.items() if k in clean_name), None)
-    
+    model = (models or REGISTRY.active()).find_prophet(clean_name)
     if not model: 
-        return {"error": f"No AI model for {disease_name}"}
+        return None, {"error": f"No AI model for {disease_name}"}
 
     try:
-        future = model.make_future_dataframe(periods=1, freq="MS")
-        fcst = model.predict(future)
-        next_row = fcst.iloc[-1]
+        # NumPy evaluation of the fitted model for just these months (see prophet_fast)
+        with timed("prophet_predict"):
+            next_rows = forecast_rows(model, max(horizons), freq="MS")
+    except Exception as e:
+        print(f"   ⚠️ Forecast failed for {disease_name}: {e!r}")
+        return None, {"error": "Forecast math failed", "detail": repr(e)}
+
+    return disease_df, next_rows
+
+def forecast_diseases(disease_names, dataset, horizons=(1,), scan_pool=None, models=None):
+    """
+    Prophet step for many diseases, serially or on a ScanPool.
+    Returns ({disease: (history_df, next_rows)}, pool summary or None).
+    """
+    models = models or REGISTRY.active()
+    if scan_pool is None:
+        return {d: forecast_disease(d, dataset, horizons, models) for d in disease_names}, None
+
+    out = {}
+    scan_pool.use_models(models.path)
+    results, summary = scan_pool.forecast(disease_names, max(horizons))
+    # Timed inside the workers; recorded here, in the process serving /metrics
+    for seconds in summary["durations_s"].values():
+        if seconds is not None:
+            STAGE_SECONDS.observe(seconds, stage="prophet_predict")
+    for disease_name, rows in results:
+        if "detail" in rows:
+            STAGE_ERRORS.inc(stage="prophet_predict")
+        disease_df = dataset.series(disease_name)
+        if disease_df is None or disease_df.empty:
+            out[disease_name] = (None, None)
+        elif "error" in rows:
+            out[disease_name] = (None, rows)
+        else:
+            out[disease_name] = (disease_df, rows)
+    return out, summary
+
+def analyze_diseases(disease_names, dataset, horizons=(1,), scan_pool=None, models=None):
+    """
+    Runs forecast & severity check for many diseases at several horizons
+    (months ahead). Severity for every (disease, horizon) is scored with a
+    single RandomForest call.
+    Returns {disease: {horizon: result}}; every horizon maps to the same
+    error dict on failure and the inner dict is empty if the disease is not
+    in the dataset. Pass a ScanPool to run the Prophet step in parallel.
+    """
+    horizons = sorted(set(horizons))
+    models = models or REGISTRY.active()  # one model version for the whole batch
+    out = {}
+    forecasted = []     # (disease, next_rows) with a forecast for months 1..max(horizons)
+
+    # --- Prophet Forecast (per disease) ---
+    forecasts, _ = forecast_diseases(disease_names, dataset, horizons, scan_pool, models)
+    for disease_name in disease_names:
+        disease_df, next_rows = forecasts[disease_name]
+        if disease_df is None:
+            out[disease_name] = {h: next_rows for h in horizons} if next_rows else {}
+            continue
+        out[disease_name] = {}
+        forecasted.append((disease_name, next_rows))
+    if not forecasted:
+        return out
+
+    # --- Random Forest Severity (one batch) ---
+    # Last three real months of every disease in one gather; horizon h sees
+    # them followed by the forecasts for months 1..h-1
+    panel = dataset.panel
+    column = {key: i for i, key in enumerate(panel.keys)}
+    rows = [column[normalize_disease_name(d)] for d, _ in forecasted]
+    n_months = max(horizons)
+    yhat = np.array([[next_rows[m]["yhat"] for m in range(1, n_months + 1)] for _, next_rows in forecasted],
+                    dtype=float).reshape(len(forecasted), n_months)
+    windows = horizon_tails(panel.tails()[rows], yhat)
+    cols = np.asarray(horizons) - 1
+    pending = [(d, h, next_rows[h]) for d, next_rows in forecasted for h in horizons]
+    scores = score_tails(models.rf, models.label_encoder, windows[:, cols].reshape(-1, 3),
+                         [next_row["ds"].month for _, _, next_row in pending])
+
+    # --- Result Package ---
+    for (disease_name, h, next_row), (severity, confidence) in zip(pending, scores):
         predicted_cases = int(next_row["yhat"])
         pred_date = next_row["ds"].strftime("%Y-%m-%d")
-    except:
-        return {"error": "Forecast math failed"}
+        out[disease_name][h] = {
+            "disease": disease_name,
+            "horizon": h,
+            "predicted_date": pred_date,
+            "predicted_cases": predicted_cases,
+            "severity": severity,
+            "confidence": round(confidence, 3),
+            "ai_analysis": f"Forecast: {predicted_cases} cases expected by {pred_date}. Risk: {severity}."
+        }
+    return out
 
-    # --- Random Forest Severity ---
-    try:
-        last_real = disease_df.sort_values("ds").iloc[-1]
-        features = pd.DataFrame([[
-            last_real["y"], last_real["y"], last_real["y"], 
-            last_real["y"], 0, next_row['ds'].month
-        ]], columns=['lag_1','lag_2','lag_3','roll_mean_3','roll_std_3','month_num'])
-        
-        severity_code = RF_MODEL.predict(features)[0]
-        severity = LABEL_ENCODER.inverse_transform([severity_code])[0]
-        confidence = float(RF_MODEL.predict_proba(features)[0].max())
-    except:
-        severity = "Unknown"
-        confidence = 0.0
+def analyze_disease_horizons(disease_name, dataset, horizons=(1,)):
+    """Runs forecast & severity check for a single disease at several horizons."""
+    return analyze_diseases([disease_name], dataset, horizons)[disease_name]
 
-    # --- Result Package ---
-    return {
-        "disease": disease_name,
-        "predicted_date": pred_date,
-        "predicted_cases": predicted_cases,
-        "severity": severity,
-        "confidence": round(confidence, 3),
-        "ai_analysis": f"Forecast: {predicted_cases} cases expected by {pred_date}. Risk: {severity}."
-    }
+def analyze_disease(disease_name, dataset, horizon=1):
+    """Runs forecast & severity check for a single disease."""
+    return analyze_disease_horizons(disease_name, dataset, (horizon,)).get(horizon)
+
+def dataset_version(dataset):
+    return (dataset.mtime_ns, dataset.size)
+
+def materialize_forecasts(dataset=None, scan_pool=None, reuse=None, models=None):
+    """
+    Precomputes every disease x FORECAST_HORIZONS into FORECAST_TABLE.
+    Diseases in `reuse` ({disease: {horizon: result}}) keep those results
+    and are not recomputed.
+    """
+    dataset = dataset or DATASET_CACHE.get()
+    reuse = reuse or {}
+    rows, by_disease = materialize(
+        [d for d in dataset.diseases if d not in reuse],
+        lambda ds, hs: analyze_diseases(ds, dataset, hs, scan_pool, models),
+        FORECAST_HORIZONS,
+    )
+    for disease, results in reuse.items():
+        by_disease[disease] = results
+        rows.update(((disease, h), result) for h, result in results.items())
+    FORECAST_TABLE.replace(rows, dataset_version=dataset_version(dataset))
+    print(f"   📋 Materialized {len(rows)} forecasts for horizons {FORECAST_HORIZONS}"
+          + (f" ({len(reuse)} diseases unchanged)" if reuse else ""))
+    return by_disease
 
 # ============================================
 # 5. DATABASE SAVER
 # ============================================
+def get_collection():
+    client = get_client(MONGO_URI, tlsCAFile=certifi.where())
+    return client[DB_NAME][COLLECTION]
+
+# Upserts keyed by (disease, predicted_date) so re-running a scan is idempotent
+MONGO_WRITER = BatchedWriter(get_collection)
+
 def save_to_mongo(data):
-    try:
-        client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
-        db = client[DB_NAME]
-        col = db[COLLECTION]
-        data['created_at'] = datetime.now()
-        col.insert_one(data)
-        print(f"   💾 Saved {data['disease']} to MongoDB.")
-    except Exception as e:
-        print(f"   ❌ MongoDB Error: {e}")
+    """Queues a result; MONGO_WRITER.flush() writes the batch."""
+    MONGO_WRITER.add(data)
 
 # ============================================
 # 6. DAILY JOB
 # ============================================
-def run_daily_scan():
+# Which diseases' inputs changed since the last scan (shared by the workers
+# of a host through the file; scans are serialized by the scan lock)
+SCAN_STATE = ScanState(SCAN_STATE_FILE)
+
+# One scan at a time per host: requests merge into a queued scan and are
+# rejected while another worker process is scanning
+SCAN_QUEUE = ScanQueue(lambda full: run_daily_scan(full), lock=ProcessLock(lock_path("scan")))
+
+def run_daily_scan(full=False):
+    """One timed scan; sampled when armed via /trigger-scan?profile=1 or /admin/profile."""
+    with profiled("scan"), timed("scan"):
+        daily_scan(full)
+
+def daily_scan(full=False):
     print(f"\n⏰ Starting Daily Analysis: {datetime.now()}")
     
     try:
-        df = pd.read_csv(CSV_FILE)
-        df.columns = [c.lower().strip() for c in df.columns]
-        diseases = df['disease'].unique().tolist()
+        dataset = DATASET_CACHE.get()
+        diseases = dataset.diseases
     except Exception as e:
         print(f"❌ Could not read CSV: {e}")
         return
 
-    print(f"🔍 Analyzing {len(diseases)} diseases...")
-    
-    for disease in diseases:
-        result = analyze_disease(disease, df)
-        
+    # Only diseases whose series, Prophet file or severity models changed
+    # (or that failed last time) are recomputed and written
+    models = REGISTRY.active()
+    digests = disease_digests(dataset, models, FORECAST_HORIZONS)
+    if full:
+        # Under the scan lock, so no other worker's scan can write the state back
+        SCAN_STATE.invalidate()
+    SCAN_STATE.load()
+    dirty, clean = SCAN_STATE.partition(digests)
+    SCAN_STATE.begin(digests)
+    print(f"🔍 Analyzing {len(dirty)} of {len(diseases)} diseases ({len(clean)} unchanged)...")
+
+    # One pass fills the forecast table; the 1-month horizon is persisted
+    reuse = {disease: SCAN_STATE.results(disease) for disease in clean}
+    by_disease = materialize_forecasts(dataset, SCAN_POOL, reuse=reuse, models=models)
+    for disease in clean:
+        SCAN_STATE.skip(disease)
+    for disease in dirty:
+        results = by_disease.get(disease, {})
+        result = results.get(1)
+
         if result and "error" not in result:
             print(f"   ✅ {disease}: {result['predicted_cases']} cases ({result['severity']})")
-            save_to_mongo(result)
-        elif result and "error" in result:
-            print(f"   ⚠️ {disease}: {result['error']}")
+            save_to_mongo(dict(result))
+            SCAN_STATE.record(disease, digests[disease], results=results)
+        else:
+            error = result["error"] if result else "Not enough data"
+            if result:
+                print(f"   ⚠️ {disease}: {error}")
+            SCAN_STATE.record(disease, digests[disease], error=error)
+
+    written = MONGO_WRITER.flush()
+    if written:
+        stats = MONGO_WRITER.stats()
+        print(f"   💾 Saved {written} predictions to MongoDB in {stats['last_flush_ms']} ms.")
+    summary = SCAN_STATE.finish()
+    print(f"   🧮 Skipped {len(summary['skipped'])}, recomputed {len(summary['recomputed'])}, "
+          f"failed {len(summary['failed'])}.")
+
+    if SCAN_POOL and SCAN_POOL.last_summary:
+        summary = SCAN_POOL.last_summary
+        print(f"   ⚡ Parallel scan: {summary['wall_s']}s on {summary['workers']} workers "
+              f"(serial ≈ {summary['serial_estimate_s']}s, speedup x{summary['speedup']}, timeouts {summary['timeouts']})")
 
     print("✅ Daily Scan Complete.\n")
 
+def refresh_forecasts(dataset):
+    """
+    Rebuilds this worker's forecast table for a new CSV. Diseases the last
+    scan (of any worker) stored with the same inputs reuse those results.
+    """
+    models = REGISTRY.active()
+    state = ScanState(SCAN_STATE_FILE).load()
+    _, clean = state.partition(disease_digests(dataset, models, FORECAST_HORIZONS))
+    materialize_forecasts(dataset, reuse={d: state.results(d) for d in clean}, models=models)
+
+def refresh_if_stale(dataset):
+    FORECAST_TABLE.refresh_if_stale(dataset_version(dataset), lambda: refresh_forecasts(dataset))
+
 # ============================================
 # 7. FLASK API ENDPOINTS (NEW!)
 # ============================================
 
 @app.route('/', methods=['GET'])
 def health_check():
-    return jsonify({"status": "MedLyf API Online", "models_loaded": len(PROPHET_MODELS)})
+    return jsonify({
+        "status": "MedLyf API Online",
+        "models_loaded": REGISTRY.stats()["prophet_loaded"],
+        "uptime_s": round(time.perf_counter() - STARTED_AT, 1),
+        "ready_after_s": READY_AFTER_S,
+        "models": REGISTRY.stats(),
+        "scan_worker_rss_mb": SCAN_POOL.worker_rss_mb() if SCAN_POOL else {},
+        "dataset_cache": DATASET_CACHE.stats(),
+        "forecast_table": FORECAST_TABLE.stats(),
+        "last_parallel_scan": SCAN_POOL.last_summary if SCAN_POOL else None,
+        "mongo_writer": MONGO_WRITER.stats(),
+        "worker_pid": os.getpid(),
+        "scheduler_leader": SCHEDULER_LOCK.held,
+        "scan_queue": SCAN_QUEUE.status(),
+        "load": SHEDDER.stats(),
+        "prediction_pool": PREDICT_POOL.stats(),
+        "fast_prophet": fast_prophet_stats(),
+    })
 
 @app.route('/predict', methods=['GET'])
 def predict_disease():
     """
     API Endpoint: Get a forecast for a specific disease.
-    Usage: GET /predict?disease=Malaria
+    Usage: GET /predict?disease=Malaria[&horizon=2]
     """
     disease_name = request.args.get('disease')
     if not disease_name:
         return jsonify({"error": "Please provide a disease parameter. Example: /predict?disease=Malaria"}), 400
+    try:
+        horizon = int(request.args.get('horizon', 1))
+        if horizon < 1: raise ValueError
+    except ValueError:
+        return jsonify({"error": "horizon must be a positive integer (months ahead)"}), 400
 
     try:
-        df = pd.read_csv(CSV_FILE)
-        df.columns = [c.lower().strip() for c in df.columns]
+        dataset = DATASET_CACHE.get()
     except Exception as e:
         return jsonify({"error": f"Failed to load CSV: {str(e)}"}), 500
 
-    result = analyze_disease(disease_name, df)
+    # --- Fast path: precomputed table ---
+    refresh_if_stale(dataset)
+    hit = FORECAST_TABLE.lookup(disease_name, horizon, dataset_version=dataset_version(dataset))
+    if hit:
+        result, materialized_at = hit
+        return jsonify(dict(result, source="table", materialized_at=materialized_at.isoformat()))
+
+    # --- Slow path: live Prophet inference ---
+    try:
+        result = PREDICT_POOL.run(analyze_disease, disease_name, dataset, horizon)
+    except PredictionTimeout as e:
+        return jsonify({"error": str(e)}), 504
     
     if not result:
         return jsonify({"error": "Disease not found or analysis failed"}), 404
@@ -211,32 +403,283 @@ def predict_disease():
     # Optional: Save API requests to DB too?
     # save_to_mongo(result) 
     
-    return jsonify(result)
+    return jsonify(dict(result, source="live", materialized_at=datetime.now().isoformat()))
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    API Endpoint: Forecast several diseases at once.
+    Usage: POST /predict/batch {"diseases": ["Malaria", "Dengue"], "horizon": 1}
+    Omitting "diseases" scores every disease in the dataset.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        horizon = int(body.get('horizon', 1))
+        if horizon < 1: raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({"error": "horizon must be a positive integer (months ahead)"}), 400
+
+    try:
+        dataset = DATASET_CACHE.get()
+    except Exception as e:
+        return jsonify({"error": f"Failed to load CSV: {str(e)}"}), 500
+
+    diseases = body.get('diseases') or dataset.diseases
+    if not isinstance(diseases, list):
+        return jsonify({"error": "diseases must be a list of names"}), 400
+
+    # Table hits are returned as-is; all misses go through one batched analysis
+    refresh_if_stale(dataset)
+    results, misses = {}, []
+    for name in diseases:
+        hit = FORECAST_TABLE.lookup(name, horizon, dataset_version=dataset_version(dataset))
+        if hit:
+            result, materialized_at = hit
+            results[name] = dict(result, source="table", materialized_at=materialized_at.isoformat())
+        else:
+            misses.append(name)
+
+    errors = {}
+    if misses:
+        computed_at = datetime.now().isoformat()
+        try:
+            computed = PREDICT_POOL.run(analyze_diseases, misses, dataset, (horizon,))
+        except PredictionTimeout as e:
+            return jsonify({"error": str(e)}), 504
+        for name, by_horizon in computed.items():
+            result = by_horizon.get(horizon)
+            if not result:
+                errors[name] = "Disease not found or analysis failed"
+            elif "error" in result:
+                errors[name] = result["error"]
+            else:
+                results[name] = dict(result, source="live", materialized_at=computed_at)
+
+    return jsonify({
+        "horizon": horizon,
+        "results": [results[n] for n in diseases if n in results],
+        "errors": errors,
+    })
+
+# ============================================
+# 7b. MODEL ADMIN ENDPOINTS
+# ============================================
+def admin_denied():
+    if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "admin token required"}), 403
+    return None
+
+@app.route('/admin/models', methods=['GET'])
+def admin_models():
+    """Active model version per disease plus the versions kept for rollback."""
+    return admin_denied() or jsonify(REGISTRY.versions())
+
+@app.route('/admin/models/reload', methods=['POST'])
+def admin_reload_models():
+    """
+    Loads + smoke-tests the models on disk and swaps them in.
+    Usage: POST /admin/models/reload[?force=1][&wait=1]
+    """
+    denied = admin_denied()
+    if denied: return denied
+    force = request.args.get('force') == '1'
+    if request.args.get('wait') == '1':
+        status = REGISTRY.reload(force=force)
+        return jsonify(status), (409 if status["status"] == "rejected" else 200)
+    if not REGISTRY.reload_async(force=force):
+        return jsonify({"status": "in_progress"}), 409
+    return jsonify({"status": "started"}), 202
+
+@app.route('/admin/models/rollback', methods=['POST'])
+def admin_rollback_models():
+    """Usage: POST /admin/models/rollback {"version": "<id>"} (default: previous)"""
+    denied = admin_denied()
+    if denied: return denied
+    version = (request.get_json(silent=True) or {}).get('version')
+    restored = REGISTRY.rollback(version)
+    if not restored:
+        return jsonify({"error": "No such previous version", "versions": REGISTRY.versions()}), 404
+    return jsonify({"status": "rolled_back", "version": restored})
 
 @app.route('/trigger-scan', methods=['POST'])
 def trigger_scan():
-    """Manually trigger the daily scan via API"""
-    thread = threading.Thread(target=run_daily_scan)
-    thread.start()
-    return jsonify({"message": "Daily scan triggered in background."})
+    """
+    Manually trigger the daily scan via API. A scan already waiting to start
+    absorbs the request; one running in another worker rejects it (409).
+    ?profile=1 (admin) samples the next scan this worker runs; ?full=1
+    recomputes every disease instead of only those whose inputs changed.
+    """
+    if request.args.get('profile') == '1':
+        denied = admin_denied()
+        if denied: return denied
+        PROFILES.arm("scan")
+    job, status = SCAN_QUEUE.submit(source="api", full=request.args.get('full') == '1')
+    if status == "rejected":
+        return jsonify({"message": "A scan is already running in another worker.", "status": status, "job": job}), 409
+    return jsonify({"message": "Daily scan triggered in background.", "status": status, "job": job}), 202
+
+@app.route('/scan/status', methods=['GET'])
+def scan_status():
+    # Read from the file: the last scan may have run in another worker
+    return jsonify({**SCAN_QUEUE.status(), "state": ScanState(SCAN_STATE_FILE).load().stats()})
+
+# ============================================
+# 7c. METRICS & PROFILING
+# ============================================
+HTTP_REQUESTS = METRICS.counter("medlyf_http_requests_total", "Requests by endpoint and status.",
+                                ("endpoint", "status"))
+HTTP_SECONDS = METRICS.histogram("medlyf_http_request_seconds", "Request handling time.", ("endpoint",))
+METRICS.callback("medlyf_inflight_requests", "Requests in progress in this worker.",
+                 lambda: SHEDDER.stats()["inflight"])
+METRICS.callback("medlyf_requests_shed_total", "Requests refused with 503.", lambda: SHEDDER.stats()["shed"],
+                 kind="counter")
+METRICS.callback("medlyf_prediction_timeouts_total", "Live predictions that hit the timeout.",
+                 lambda: PREDICT_POOL.stats()["timeouts"], kind="counter")
+METRICS.callback("medlyf_prediction_threads_busy", "Prediction threads running, including timed-out ones.",
+                 lambda: PREDICT_POOL.stats()["busy"])
+METRICS.callback("medlyf_forecast_table_lookups_total", "Forecast table lookups by result.",
+                 lambda: {"hit": FORECAST_TABLE.stats()["hits"], "miss": FORECAST_TABLE.stats()["misses"]},
+                 ("result",), kind="counter")
+METRICS.callback("medlyf_dataset_cache_lookups_total", "Dataset cache lookups by result.",
+                 lambda: {"hit": DATASET_CACHE.stats()["hits"], "miss": DATASET_CACHE.stats()["misses"]},
+                 ("result",), kind="counter")
+METRICS.callback("medlyf_models_loaded", "Prophet models loaded in this worker.",
+                 lambda: REGISTRY.stats()["prophet_loaded"])
+METRICS.callback("medlyf_mongo_pending_docs", "Results buffered for the next Mongo flush.",
+                 lambda: MONGO_WRITER.pending())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text format. Per worker process: scrape each worker, or run one."""
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """
+    Arms the sampling profiler for the next run(s) of a target in this worker.
+    Usage: POST /admin/profile?target=scan|request[&count=1]; GET lists recent profiles.
+    Any single request can also be profiled with ?profile=1 (X-Profile header has the file).
+    """
+    denied = admin_denied()
+    if denied: return denied
+    if request.method == 'POST':
+        target = request.args.get('target', 'scan')
+        if target not in ("scan", "request"):
+            return jsonify({"error": "target must be scan or request"}), 400
+        try:
+            count = int(request.args.get('count', 1))
+        except ValueError:
+            return jsonify({"error": "count must be an integer"}), 400
+        PROFILES.arm(target, count)
+    return jsonify(PROFILES.status())
+
+@app.before_request
+def start_request():
+    g.started = time.perf_counter()
+    wanted = request.args.get('profile') == '1' and request.endpoint != "trigger_scan"
+    if (wanted and not admin_denied()) or (request.endpoint not in ("metrics", "admin_profile")
+                                           and PROFILES.take("request")):
+        g.profiler = SamplingProfiler(f"request:{request.endpoint}").start()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or "unmatched"
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    HTTP_SECONDS.observe(time.perf_counter() - g.get("started", time.perf_counter()), endpoint=endpoint)
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        summary = PROFILES.finish(profiler)
+        response.headers["X-Profile"] = summary["path"] or ""
+        response.headers["X-Profile-Samples"] = str(summary["samples"])
+    return response
+
+# ============================================
+# 7d. LOAD SHEDDING
+# ============================================
+# Concurrent requests per worker; beyond this they are refused with 503
+SHEDDER = LoadShedder()
+
+# Live (non-table) predictions run here, with a timeout
+PREDICT_POOL = PredictionPool()
+
+# Health checks must answer even when the worker is saturated
+SHED_EXEMPT = {"health_check", "scan_status", "metrics"}
+
+@app.before_request
+def shed_load():
+    if request.endpoint in SHED_EXEMPT:
+        return None
+    if not SHEDDER.try_enter():
+        response = jsonify({"error": "Server busy, retry shortly."})
+        response.headers["Retry-After"] = str(SHED_RETRY_AFTER_S)
+        return response, 503
+    g.counted = True
+    return None
+
+@app.teardown_request
+def release_load(exc=None):
+    if g.pop("counted", False):
+        SHEDDER.leave()
+    profiler = g.pop("profiler", None)  # the request raised before after_request
+    if profiler is not None:
+        PROFILES.finish(profiler)
 
 # ============================================
 # 8. THREADING & EXECUTION
 # ============================================
+# Held by the one process (out of all server workers) that runs the scheduler
+SCHEDULER_LOCK = ProcessLock(lock_path("scheduler"))
+
 def run_scheduler():
-    """Runs the schedule loop in a background thread"""
-    print("⏳ Scheduler active in background.")
-    schedule.every(24).minutes.do(run_daily_scan)
+    """
+    Runs the schedule loop in a background thread, in one process only: other
+    workers retry the lock every SCHEDULER_ELECTION_S and take over if the
+    scheduling worker exits.
+    """
+    while not SCHEDULER_LOCK.acquire():
+        time.sleep(SCHEDULER_ELECTION_S)
+    print(f"⏳ Scheduler active in background (pid {os.getpid()}).")
+    schedule.every(SCAN_INTERVAL_MIN).minutes.do(SCAN_QUEUE.submit, source="scheduler")
     while True:
         schedule.run_pending()
         time.sleep(1)
 
-if __name__ == "__main__":
-    # 1. Start the Scheduler in a separate thread
+READY_AFTER_S = None
+
+def startup():
+    """Warms models, fills the forecast table and starts the model watcher."""
+    global READY_AFTER_S
+    warmup_models()
+    REGISTRY.start_watcher(MODEL_WATCH_INTERVAL_S)
+    try:
+        materialize_forecasts()
+    except Exception as e:
+        print(f"⚠️ Could not materialize forecasts at startup: {e}")
+    READY_AFTER_S = round(time.perf_counter() - STARTED_AT, 3)
+
+def start_background():
+    """
+    Warmup + scheduler threads. Called once per process: by __main__ for the
+    dev server, and by gunicorn.conf.py in every worker after the fork.
+    """
+    # 0. Warm models + fill the forecast table (in the background by default
+    #    so the health endpoint answers immediately)
+    if MODEL_WARMUP == "blocking":
+        startup()
+    elif MODEL_WARMUP == "background":
+        threading.Thread(target=startup, daemon=True).start()
+    else:
+        REGISTRY.start_watcher(MODEL_WATCH_INTERVAL_S)
+
+    # 1. Start the Scheduler in a separate thread (runs in one worker only)
     scheduler_thread = threading.Thread(target=run_scheduler)
     scheduler_thread.daemon = True # Ensures thread dies when app closes
     scheduler_thread.start()
 
-    # 2. Start the Flask App
+if __name__ == "__main__":
+    start_background()
+
+    # 2. Start the Flask App (development server; for production use
+    #    `gunicorn -c gunicorn.conf.py`)
     print("🌍 Starting Flask API on port 5001...")
     app.run(host='0.0.0.0', port=5001, debug=False)
\ No newline at end of file
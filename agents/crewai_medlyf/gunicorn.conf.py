@@ -0,0 +1,32 @@
+"""
+Production server for the forecasting API:
+
+    gunicorn -c gunicorn.conf.py
+
+Pre-fork workers give predictions real CPU parallelism (no shared GIL);
+threads inside each worker handle I/O-bound requests. Every worker loads
+its own models and forecast table after the fork, and exactly one of them
+wins the scheduler lock and runs the periodic scan.
+"""
+
+import os
+
+wsgi_app = "forecasting_agent:app"
+bind = os.getenv("BIND", "0.0.0.0:5001")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+# Workers silent for longer than this are killed and replaced
+timeout = int(os.getenv("WEB_TIMEOUT_S", "120"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT_S", "30"))
+keepalive = 5
+# Recycle workers now and then so a leak can't grow forever
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "5000"))
+max_requests_jitter = max_requests // 10
+# Threads, pools and Mongo clients don't survive fork: load the app per worker
+preload_app = False
+
+
+def post_worker_init(worker):
+    from forecasting_agent import start_background
+    start_background()
@@ -0,0 +1,190 @@
+"""
+HTTP client for the crew's calls to the Node server.
+
+ServerClient keeps one aiohttp session (and its connection pool) for the
+life of the crew, so requests reuse keep-alive connections instead of
+paying a TCP/TLS handshake each. Every endpoint keeps latency samples for
+percentiles.
+
+Job creation isn't idempotent: a timeout, 500, 502 or 504 can come back
+after the server already saved the job (or, for /api/jobs/bulk, part of
+the batch). So only failures where the request never reached the handler
+are retried, with jittered exponential backoff: connection errors, connect
+timeouts, 429 and 503.
+
+JobBatcher coalesces job creations: jobs submitted within window_s of each
+other go out as one POST to the bulk endpoint, and every caller still gets
+its own (status, text) back.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+
+import aiohttp
+
+from event_dispatcher import percentile
+
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "20"))
+HTTP_TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "20"))
+HTTP_CONNECT_TIMEOUT_S = float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "5"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_S = float(os.getenv("HTTP_BACKOFF_S", "0.2"))
+# Rejected before the request was handled
+RETRY_STATUSES = {429, 503}
+# Raised before anything was sent (refused, DNS, TLS handshake, connect timeout)
+RETRY_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+
+
+class ServerClient:
+    def __init__(self, base_url, limit=HTTP_POOL_LIMIT, limit_per_host=HTTP_POOL_PER_HOST, timeout_s=HTTP_TIMEOUT_S,
+                 connect_timeout_s=HTTP_CONNECT_TIMEOUT_S, max_retries=HTTP_MAX_RETRIES, backoff_s=HTTP_BACKOFF_S, sample_size=1000):
+        self.base_url = base_url.rstrip("/")
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout_s = timeout_s
+        self.connect_timeout_s = connect_timeout_s
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.sample_size = sample_size
+        self._session = None
+        self._endpoints = {}
+
+    def session(self):
+        """The shared session; created on first use inside the running loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+            timeout = aiohttp.ClientTimeout(total=self.timeout_s, sock_connect=self.connect_timeout_s)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _backoff(self, attempt):
+        # "Full jitter": spreads retries from many agents instead of syncing them
+        return random.uniform(0, self.backoff_s * (2 ** attempt))
+
+    def _endpoint(self, path):
+        return self._endpoints.setdefault(path, {
+            "requests": 0, "errors": 0, "retries": 0, "latency": deque(maxlen=self.sample_size),
+        })
+
+    async def post(self, path: str, json_payload):
+        """Returns (status, text); (500, error) once the retries are exhausted."""
+        url = self.base_url + "/" + path.lstrip("/")
+        stats = self._endpoint(path)
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                async with self.session().post(url, json=json_payload) as resp:
+                    text = await resp.text()
+                    status = resp.status
+            except RETRY_ERRORS as e:
+                status, text = 500, str(e) or type(e).__name__
+                transient = True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # The server may have handled it: resending could duplicate jobs
+                status, text = 500, str(e) or type(e).__name__
+                transient = False
+            else:
+                transient = status in RETRY_STATUSES
+            stats["requests"] += 1
+            stats["latency"].append(time.perf_counter() - start)
+            if not transient or attempt == self.max_retries:
+                if status >= 400:
+                    stats["errors"] += 1
+                return status, text
+            stats["retries"] += 1
+            await asyncio.sleep(self._backoff(attempt))
+
+    def stats(self):
+        out = {}
+        for path, s in self._endpoints.items():
+            lat = list(s["latency"])
+            out[path] = {
+                "requests": s["requests"],
+                "errors": s["errors"],
+                "retries": s["retries"],
+                "p50_ms": round(percentile(lat, 0.5) * 1000, 1) if lat else None,
+                "p95_ms": round(percentile(lat, 0.95) * 1000, 1) if lat else None,
+                "p99_ms": round(percentile(lat, 0.99) * 1000, 1) if lat else None,
+            }
+        return out
+
+
+class JobBatcher:
+    """
+    submit(job) waits at most window_s for other jobs and sends them together.
+    A server without the bulk endpoint (404/405) gets the jobs one by one.
+    """
+
+    def __init__(self, client: ServerClient, path="/api/jobs", bulk_path="/api/jobs/bulk", window_s=0.05, max_batch=50):
+        self.client = client
+        self.path = path
+        self.bulk_path = bulk_path
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        self._bulk_supported = True
+        self.batches = 0
+        self.jobs = 0
+
+    async def submit(self, job: dict):
+        if self.window_s <= 0:
+            return await self.client.post(self.path, job)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((job, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_s, self._flush_now)
+        return await fut
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch):
+        self.batches += 1
+        self.jobs += len(batch)
+        try:
+            results = await self._post_batch([job for job, _ in batch])
+        except Exception as e:
+            results = [(500, str(e))] * len(batch)
+        for (_, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
+
+    async def _post_batch(self, jobs):
+        if len(jobs) > 1 and self._bulk_supported:
+            status, text = await self.client.post(self.bulk_path, {"jobs": jobs})
+            if status in (404, 405):
+                self._bulk_supported = False
+            elif status < 400:
+                items = json.loads(text).get("results", [])
+                if len(items) == len(jobs):
+                    return [(item.get("status", status), json.dumps(item.get("job", item))) for item in items]
+                return [(502, f"bulk response had {len(items)} results for {len(jobs)} jobs")] * len(jobs)
+            else:
+                return [(status, text)] * len(jobs)
+        return await asyncio.gather(*(self.client.post(self.path, job) for job in jobs))
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "jobs": self.jobs,
+            "avg_batch": round(self.jobs / self.batches, 1) if self.batches else 0,
+            "bulk_supported": self._bulk_supported,
+        }
@@ -0,0 +1,243 @@
+"""
+Incremental per-hospital Prophet forecasting for the crew's forecast_agent.
+
+Every hospital keeps its fitted model ({hospital_id}_prophet.joblib) next to
+a small state file ({hospital_id}_prophet.state.json) recording what the model
+was trained on. An upload is then handled by the cheapest step that is still
+correct:
+
+- duplicate: same data fingerprint as last time -> cached predictions, no work
+- reused: fewer than min_new_rows new rows, history unchanged, no drift
+  -> the saved model forecasts from the new last date
+- warm_refit: enough new rows, drift, or an old model -> refit initialised
+  from the saved model's parameters (fewer optimiser iterations)
+- cold_fit: no usable saved model, or the warm start failed
+
+Drift means the saved model's error on the new rows is more than
+drift_factor times its in-sample error at training time.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from metrics import timed
+from prophet_fast import predict_frame
+
+REFIT_MIN_NEW_ROWS = int(os.getenv("FORECAST_REFIT_MIN_ROWS", "7"))
+DRIFT_FACTOR = float(os.getenv("FORECAST_DRIFT_FACTOR", "2.0"))
+MAX_MODEL_AGE_S = float(os.getenv("FORECAST_MAX_MODEL_AGE_S", str(7 * 24 * 3600)))
+MODEL_CACHE_SIZE = int(os.getenv("FORECAST_MODEL_CACHE", "64"))
+
+
+def data_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of the ds/y columns, independent of the CSV's formatting."""
+    frame = df[["ds", "y"]].reset_index(drop=True)
+    hashed = pd.util.hash_pandas_object(frame, index=False).values
+    return hashlib.sha256(hashed.tobytes()).hexdigest()[:16]
+
+
+def warm_start_params(model) -> dict:
+    """Initial values for Prophet.fit(init=...) taken from a fitted model."""
+    params = model.params
+    init = {name: float(params[name][0][0]) for name in ("k", "m", "sigma_obs")}
+    for name in ("delta", "beta"):
+        init[name] = np.asarray(params[name][0], dtype=float)
+    return init
+
+
+def future_frame(last_ds, periods: int) -> pd.DataFrame:
+    """The `periods` days after last_ds (what make_future_dataframe would add)."""
+    start = pd.Timestamp(last_ds) + pd.Timedelta(days=1)
+    return pd.DataFrame({"ds": pd.date_range(start, periods=periods, freq="D")})
+
+
+def forecast_records(forecast: pd.DataFrame) -> list:
+    """JSON-ready prediction rows; ds as YYYY-MM-DD like the moving-average fallback."""
+    out = forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]].copy()
+    out["ds"] = pd.to_datetime(out["ds"]).dt.strftime("%Y-%m-%d")
+    return [
+        {"ds": row.ds, "yhat": float(row.yhat), "yhat_lower": float(row.yhat_lower), "yhat_upper": float(row.yhat_upper)}
+        for row in out.itertuples(index=False)
+    ]
+
+
+def _default_model():
+    from prophet import Prophet
+    return Prophet(daily_seasonality=True, weekly_seasonality=True)
+
+
+class IncrementalForecaster:
+    """
+    Thread-safe across hospitals. Calls for one hospital must not overlap;
+    the crew's dispatcher guarantees that by handling a hospital in one lane.
+    """
+
+    def __init__(self, model_dir, periods=5, min_new_rows=REFIT_MIN_NEW_ROWS, drift_factor=DRIFT_FACTOR,
+                 max_age_s=MAX_MODEL_AGE_S, cache_size=MODEL_CACHE_SIZE, make_model=_default_model, clock=time.time):
+        self.model_dir = Path(model_dir)
+        self.periods = periods
+        self.min_new_rows = min_new_rows
+        self.drift_factor = drift_factor
+        self.max_age_s = max_age_s
+        self.cache_size = cache_size
+        self.make_model = make_model
+        self.clock = clock
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self.counts = {"duplicate": 0, "reused": 0, "warm_refit": 0, "cold_fit": 0, "warm_start_failed": 0}
+        self.seconds = {mode: 0.0 for mode in ("duplicate", "reused", "warm_refit", "cold_fit")}
+
+    def model_path(self, hospital_id):
+        return self.model_dir / f"{hospital_id}_prophet.joblib"
+
+    def state_path(self, hospital_id):
+        return self.model_dir / f"{hospital_id}_prophet.state.json"
+
+    def load_state(self, hospital_id):
+        try:
+            with open(self.state_path(hospital_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self, hospital_id, state):
+        path = self.state_path(hospital_id)
+        tmp = path.with_name(path.name + f".tmp-{os.getpid()}-{threading.get_ident()}")
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    def _load_model(self, hospital_id):
+        with self._lock:
+            model = self._models.get(hospital_id)
+            if model is not None:
+                self._models.move_to_end(hospital_id)
+                return model
+        path = self.model_path(hospital_id)
+        if not path.exists():
+            return None
+        try:
+            model = joblib.load(path)
+        except Exception as e:
+            print(f"[IncrementalForecaster] could not load {path.name}: {e}")
+            return None
+        self._remember(hospital_id, model)
+        return model
+
+    def _remember(self, hospital_id, model):
+        with self._lock:
+            self._models[hospital_id] = model
+            self._models.move_to_end(hospital_id)
+            while len(self._models) > self.cache_size:
+                self._models.popitem(last=False)
+
+    def _fit(self, hospital_id, df, previous):
+        """Returns (model, mode); warm-starts from `previous` when possible."""
+        history = df[["ds", "y"]]
+        if previous is not None:
+            try:
+                model = self.make_model()
+                model.fit(history, init=warm_start_params(previous))
+                return model, "warm_refit"
+            except Exception as e:
+                # e.g. a different number of changepoints/seasonality terms
+                with self._lock:
+                    self.counts["warm_start_failed"] += 1
+                print(f"[IncrementalForecaster] warm start failed for {hospital_id}, fitting from scratch: {e}")
+        model = self.make_model()
+        model.fit(history)
+        return model, "cold_fit"
+
+    def _refit_reason(self, state, df, model, now):
+        """None if the saved model can be reused, else why it must be refit."""
+        if model is None or state is None:
+            return "no_model"
+        trained_until = pd.Timestamp(state["trained_until"])
+        seen = df[df["ds"] <= trained_until]
+        if len(seen) != state["trained_rows"] or data_fingerprint(seen) != state["trained_fingerprint"]:
+            return "history_changed"
+        new = df[df["ds"] > trained_until]
+        if len(new) >= self.min_new_rows:
+            return "new_rows"
+        if now - state.get("fitted_at", 0) > self.max_age_s:
+            return "model_age"
+        if len(new):
+            err = float(np.mean(np.abs(new["y"].to_numpy() - predict_frame(model, new["ds"])["yhat"].to_numpy())))
+            if err > self.drift_factor * max(state.get("train_mae", 0.0), 1e-9):
+                return "drift"
+        return None
+
+    def forecast(self, hospital_id, df: pd.DataFrame):
+        """Returns (preds, model_meta) for the next `periods` days after df's last ds."""
+        start = time.perf_counter()
+        df = df.assign(ds=pd.to_datetime(df["ds"])).sort_values("ds", kind="stable").reset_index(drop=True)
+        fingerprint = data_fingerprint(df)
+        state = self.load_state(hospital_id)
+
+        if state and state.get("fingerprint") == fingerprint and state.get("preds"):
+            return self._done("duplicate", start, state["preds"], state, new_rows=0)
+
+        now = self.clock()
+        model = self._load_model(hospital_id)
+        reason = self._refit_reason(state, df, model, now)
+        new_rows = max(0, len(df) - state["trained_rows"]) if state else len(df)
+
+        if reason is None:
+            mode = "reused"
+            trained = state
+        else:
+            with timed("prophet_fit"):
+                model, mode = self._fit(hospital_id, df, model)
+            insample = predict_frame(model, df["ds"])["yhat"].to_numpy()
+            joblib.dump(model, self.model_path(hospital_id))
+            self._remember(hospital_id, model)
+            trained = {
+                "trained_rows": len(df),
+                "trained_until": df["ds"].max().isoformat(),
+                "trained_fingerprint": fingerprint,
+                "train_mae": float(np.mean(np.abs(df["y"].to_numpy() - insample))),
+                "fitted_at": now,
+                "refit_reason": reason,
+            }
+
+        with timed("prophet_predict"):
+            forecast = predict_frame(model, future_frame(df["ds"].max(), self.periods)["ds"], intervals=True)
+        preds = forecast_records(forecast)
+        state = dict(trained, fingerprint=fingerprint, preds=preds)
+        self._save_state(hospital_id, state)
+        return self._done(mode, start, preds, state, new_rows=new_rows)
+
+    def _done(self, mode, start, preds, state, new_rows):
+        elapsed = time.perf_counter() - start
+        # forecast() runs concurrently on the crew's CPU executor
+        with self._lock:
+            self.counts[mode] += 1
+            self.seconds[mode] += elapsed
+        meta = {
+            "model": "prophet",
+            "mode": mode,
+            "trained_rows": state["trained_rows"],
+            "new_rows": new_rows,
+            "refit_reason": state.get("refit_reason") if mode in ("warm_refit", "cold_fit") else None,
+            "seconds": round(elapsed, 3),
+        }
+        return preds, meta
+
+    def stats(self):
+        with self._lock:
+            cached = len(self._models)
+            counts, seconds = dict(self.counts), dict(self.seconds)
+        return {
+            "counts": counts,
+            "avg_seconds": {m: round(seconds[m] / counts[m], 3) for m in seconds if counts[m]},
+            "cached_models": cached,
+        }
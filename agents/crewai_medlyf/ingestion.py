@@ -0,0 +1,190 @@
+"""
+Streaming ingestion of hospital uploads for the crew's forecast_agent.
+
+An upload is read in fixed-size chunks (only the ds/y columns), each chunk is
+validated and reduced to one row per day right away, so memory depends on the
+number of days in the file, not its size. Too many unparseable rows abort the
+upload instead of forecasting on garbage.
+
+An upload can also be an admissions export (*.json, see patient_store):
+its daily occupancy series is estimated from the admit times instead.
+
+The daily series is written to an Arrow IPC file next to a small JSON
+sidecar recording which source file (path, size, mtime) it came from. Later
+forecasts on an unchanged upload memory-map the Arrow file instead of
+parsing the CSV again.
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except Exception:  # optional: without pyarrow nothing is cached
+    pa = None
+
+from metrics import timed
+
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "200000"))
+INGEST_MAX_BAD_RATIO = float(os.getenv("INGEST_MAX_BAD_RATIO", "0.05"))
+INGEST_AGG = os.getenv("INGEST_AGG", "mean")  # several rows on one day: "mean" (occupancy) or "sum" (counts)
+INGEST_FREQ = os.getenv("INGEST_FREQ", "D")  # fixed frequency the series is bucketed to
+
+
+class IngestError(ValueError):
+    """The upload is unusable (missing columns, too many bad rows, no data)."""
+
+
+@dataclass
+class IngestResult:
+    frame: pd.DataFrame   # ds (datetime64), y (float32), one row per period, sorted
+    stats: dict
+
+
+def source_signature(path):
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _reduce_chunk(chunk, freq):
+    """(per-period sum, per-period count, bad rows) for one raw chunk."""
+    ds = pd.to_datetime(chunk["ds"], errors="coerce")
+    y = pd.to_numeric(chunk["y"], errors="coerce").astype("float32")
+    ok = ds.notna() & y.notna() & np.isfinite(y)
+    periods = ds[ok].dt.floor(freq)
+    grouped = y[ok].groupby(periods.to_numpy())
+    return grouped.sum(), grouped.count(), int((~ok).sum())
+
+
+def _read_chunks(path, chunk_rows):
+    """ds/y chunks of the CSV; a line that can't be parsed raises IngestError."""
+    # y is left to the C parser's float fast path; a chunk with junk in it
+    # comes back as object and is coerced row by row in _reduce_chunk
+    try:
+        with pd.read_csv(path, usecols=["ds", "y"], dtype={"ds": str}, chunksize=chunk_rows) as reader:
+            yield from reader
+    except (pd.errors.ParserError, ValueError, UnicodeDecodeError) as e:
+        raise IngestError(f"unreadable CSV: {e}") from e
+
+
+def read_daily_series(path, chunk_rows=INGEST_CHUNK_ROWS, max_bad_ratio=INGEST_MAX_BAD_RATIO, agg=INGEST_AGG,
+                      freq=INGEST_FREQ):
+    """Parses the CSV chunk by chunk into a ds/y frame. Raises IngestError."""
+    start = time.perf_counter()
+    try:
+        header = pd.read_csv(path, nrows=0).columns
+    except Exception as e:
+        raise IngestError(f"unreadable CSV: {e}") from e
+    missing = {"ds", "y"} - set(header)
+    if missing:
+        raise IngestError(f"missing column(s): {', '.join(sorted(missing))}")
+
+    sums, counts = [], []
+    rows = bad = chunks = 0
+    for chunk in _read_chunks(path, chunk_rows):
+        s, c, b = _reduce_chunk(chunk, freq)
+        rows += len(chunk)
+        bad += b
+        chunks += 1
+        if rows >= chunk_rows and bad > max_bad_ratio * rows:
+            # Fail fast on a clearly broken file rather than reading all of it
+            raise IngestError(f"{bad} of the first {rows} rows are invalid")
+        # Merge as we go so the partials never outgrow the number of periods
+        sums.append(s)
+        counts.append(c)
+        if len(sums) > 8:
+            sums = [pd.concat(sums).groupby(level=0).sum()]
+            counts = [pd.concat(counts).groupby(level=0).sum()]
+
+    if rows and bad > max_bad_ratio * rows:
+        raise IngestError(f"{bad} of {rows} rows are invalid")
+    if not sums or sum(len(s) for s in sums) == 0:
+        raise IngestError("no valid rows")
+
+    total = pd.concat(sums).groupby(level=0).sum()
+    if agg == "mean":
+        total = total / pd.concat(counts).groupby(level=0).sum()
+    frame = pd.DataFrame({"ds": total.index.astype("datetime64[ns]"), "y": total.to_numpy(dtype="float32")})
+    frame = frame.sort_values("ds", ignore_index=True)
+    stats = {
+        "rows": rows,
+        "bad_rows": bad,
+        "chunks": chunks,
+        "periods": len(frame),
+        "parse_s": round(time.perf_counter() - start, 3),
+    }
+    return frame, stats
+
+
+def write_arrow(frame, path):
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def read_arrow(path):
+    """Memory-maps the Arrow file; the columns are not copied into the heap."""
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+class IngestCache:
+    """Per-hospital Arrow cache of ingested uploads."""
+
+    def __init__(self, cache_dir, **read_kwargs):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.read_kwargs = read_kwargs
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def paths(self, hospital_id):
+        return self.cache_dir / f"{hospital_id}.arrow", self.cache_dir / f"{hospital_id}.ingest.json"
+
+    def load(self, hospital_id, file_path):
+        """IngestResult for the upload; parses the CSV (or admissions JSON) only if it is not cached."""
+        data_path, meta_path = self.paths(hospital_id)
+        signature = source_signature(file_path)
+        if pa is not None and data_path.exists():
+            try:
+                meta = json.loads(meta_path.read_text())
+                if meta.get("source") == signature:
+                    start = time.perf_counter()
+                    with timed("arrow_load"):
+                        frame = read_arrow(data_path)
+                    self.hits += 1
+                    return IngestResult(frame, dict(meta["stats"], cached=True,
+                                                    load_s=round(time.perf_counter() - start, 4)))
+            except (OSError, ValueError, KeyError, pa.ArrowException):
+                pass  # stale or corrupt cache: re-ingest
+
+        self.misses += 1
+        try:
+            if str(file_path).lower().endswith(".json"):
+                from patient_store import read_admissions_series
+                with timed("admissions_load"):
+                    frame, stats = read_admissions_series(file_path, hospital=hospital_id,
+                                                          freq=self.read_kwargs.get("freq", INGEST_FREQ))
+            else:
+                with timed("csv_load"):
+                    frame, stats = read_daily_series(file_path, **self.read_kwargs)
+        except IngestError:
+            self.rejected += 1
+            raise
+        if pa is not None:
+            write_arrow(frame, data_path)
+            meta_path.write_text(json.dumps({"source": signature, "stats": stats}))
+        return IngestResult(frame, dict(stats, cached=False))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "rejected": self.rejected, "arrow": pa is not None}
@@ -0,0 +1,435 @@
+"""
+In-process instrumentation shared by forecasting_agent.py and crew.py.
+
+- MetricsRegistry: counters, histograms and callback gauges, rendered in the
+  Prometheus text format for the /metrics endpoints. Values live in the
+  process, so under a pre-fork server every worker reports its own.
+- timed(stage): context manager / decorator feeding the per-stage
+  histogram (medlyf_stage_seconds) and error counter.
+- SamplingProfiler: samples the stacks of the threads it follows every few
+  milliseconds via sys._current_frames(); nothing runs while no profile is
+  active. PROFILES arms a profile for the next N runs of a target (a scan,
+  a request, an event type); the collapsed stacks are written to
+  PROFILE_DIR for flamegraph.pl / speedscope.
+"""
+
+import collections
+import contextvars
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+PROFILE_DIR = os.getenv("MEDLYF_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "medlyf-profiles"))
+PROFILE_INTERVAL_S = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_MAX_S = float(os.getenv("PROFILE_MAX_S", "300"))  # a forgotten profile stops sampling after this
+
+# Seconds; covers a cached table lookup up to a full scan
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """Cumulative buckets + sum + count per label set."""
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels):
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def total(self, **labels):
+        series = self._series.get(self._key(labels))
+        return series[-2] if series else 0.0
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Callback(_Metric):
+    """
+    Value read at scrape time from fn(): a number, or {label values: number}
+    for labelled metrics. Exposes stats the components already keep.
+    """
+
+    def __init__(self, name, help, fn, labelnames=(), kind="gauge"):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            return [f"# {self.name} unavailable: {_escape(e)}"]
+        if value is None:
+            return []
+        if not self.labelnames:
+            return self.header() + [f"{self.name} {_number(value)}"]
+        lines = self.header()
+        for key, v in sorted(value.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            if v is not None:
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(v)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics of one process. Registering a name twice returns the existing metric."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"{metric.name} is already registered as a {existing.kind}")
+                if isinstance(existing, Callback):
+                    existing.fn = metric.fn  # re-registration points at the current component
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, fn, labelnames=(), kind="gauge"):
+        return self._register(Callback(name, help, fn, labelnames, kind))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS = MetricsRegistry()
+STAGE_SECONDS = METRICS.histogram("medlyf_stage_seconds", "Wall-clock time per hot-path stage.", ("stage",))
+STAGE_ERRORS = METRICS.counter("medlyf_stage_errors_total", "Stage runs that raised.", ("stage",))
+
+
+@contextmanager
+def timed(stage):
+    """
+    Times the block (or, as a decorator, each call) into medlyf_stage_seconds;
+    an exception leaving the block also counts in medlyf_stage_errors_total.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+# ---------- sampling profiler ----------
+_ACTIVE = contextvars.ContextVar("medlyf_profile", default=None)
+
+
+def active_profiler():
+    """The profiler sampling the current context, if one is running."""
+    profiler = _ACTIVE.get()
+    return profiler if profiler is not None and profiler.running else None
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for one run of something. It follows the thread
+    that starts it plus any thread entered via follow(); samples are folded
+    stacks ("root;...;leaf" -> count). Code running in other processes (the
+    ScanPool workers) is not seen.
+    """
+
+    def __init__(self, name, interval_s=PROFILE_INTERVAL_S, max_s=PROFILE_MAX_S):
+        self.name = name
+        self.interval_s = interval_s
+        self.max_s = max_s
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration_s = None
+        self._threads = collections.Counter()  # ident -> nesting depth
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._token = None
+
+    @property
+    def running(self):
+        return self._sampler is not None and not self._stop.is_set()
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._add(threading.get_ident())
+        self._token = _ACTIVE.set(self)
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.name}", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        if self._token is not None:
+            try:
+                _ACTIVE.reset(self._token)
+            except ValueError:  # stopped from another context; that context just ends
+                pass
+            self._token = None
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.duration_s = time.perf_counter() - self.started_at
+        return self
+
+    def _add(self, ident):
+        with self._lock:
+            self._threads[ident] += 1
+
+    def _remove(self, ident):
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    @contextmanager
+    def follow(self):
+        """Samples the current thread too while the block runs."""
+        ident = threading.get_ident()
+        self._add(ident)
+        token = _ACTIVE.set(self)
+        try:
+            yield
+        finally:
+            _ACTIVE.reset(token)
+            self._remove(ident)
+
+    def _run(self):
+        deadline = time.perf_counter() + self.max_s
+        while not self._stop.wait(self.interval_s) and time.perf_counter() < deadline:
+            self.sample()
+
+    def sample(self):
+        with self._lock:
+            idents = list(self._threads)
+        frames = sys._current_frames()
+        for ident in idents:
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def top(self, n=15):
+        """[(function, share of samples)] by self time (leaf frames)."""
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [(fn, round(count / total, 3)) for fn, count in leaves.most_common(n)]
+
+    def write(self, out_dir=None):
+        """Writes the folded stacks (default: PROFILE_DIR); returns the file path."""
+        out = Path(out_dir or PROFILE_DIR)
+        out.mkdir(parents=True, exist_ok=True)
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in self.name)
+        path = out / f"{safe}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}-{id(self) % 10000:04d}.folded"
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items())))
+        return str(path)
+
+    def summary(self, path=None):
+        return {
+            "name": self.name,
+            "path": path,
+            "samples": self.samples,
+            "duration_s": round(self.duration_s, 3) if self.duration_s is not None else None,
+            "interval_ms": round(self.interval_s * 1000, 2),
+            "top": self.top(),
+        }
+
+
+class ProfileSwitch:
+    """Runtime on/off switch: arm(target, n) profiles the next n runs of target."""
+
+    def __init__(self, history=20):
+        self._armed = {}
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=history)
+
+    def arm(self, target, count=1):
+        with self._lock:
+            self._armed[target] = self._armed.get(target, 0) + max(1, int(count))
+            return self._armed[target]
+
+    def take(self, target):
+        """True (and one fewer armed) if the next run of target should be profiled."""
+        with self._lock:
+            left = self._armed.get(target, 0)
+            if not left:
+                return False
+            if left == 1:
+                del self._armed[target]
+            else:
+                self._armed[target] = left - 1
+            return True
+
+    def armed(self):
+        with self._lock:
+            return dict(self._armed)
+
+    def finish(self, profiler):
+        """Stops the profiler, writes its stacks and records the summary."""
+        profiler.stop()
+        try:
+            path = profiler.write()
+        except OSError as e:
+            print(f"   ⚠️ Could not write profile {profiler.name}: {e}")
+            path = None
+        summary = profiler.summary(path)
+        self.recent.append(summary)
+        return summary
+
+    def status(self):
+        return {"armed": self.armed(), "profile_dir": PROFILE_DIR, "recent": list(self.recent)}
+
+
+PROFILES = ProfileSwitch()
+
+
+@contextmanager
+def profiled(target, force=False):
+    """
+    Profiles the block if `force` or target is armed; yields the profiler or
+    None. Only one profile runs per context: nested targets join the outer one.
+    """
+    if active_profiler() is not None or not (force or PROFILES.take(target)):
+        yield None
+        return
+    profiler = SamplingProfiler(target).start()
+    try:
+        yield profiler
+    finally:
+        summary = PROFILES.finish(profiler)
+        print(f"   🔬 Profiled {target}: {summary['samples']} samples -> {summary['path']}")
+
+
+def propagate(fn):
+    """
+    Wraps fn, handed to another thread (executor / thread pool), so the
+    profile active in the submitting context also samples that thread.
+    """
+    profiler = active_profiler()
+    if profiler is None:
+        return fn
+
+    def run(*args, **kwargs):
+        with profiler.follow():
+            return fn(*args, **kwargs)
+    return run
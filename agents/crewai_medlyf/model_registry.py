@@ -0,0 +1,476 @@
+"""
+Model loading for forecasting_agent.py and its scan workers.
+
+Nothing is unpickled at import time: the registry lists the model files and
+loads each one on first use (or all of them in parallel during warmup).
+The RandomForest is served as a packed_forest.PackedForest: its trees are
+flattened once per version into .npy arrays beside the snapshot and
+memory-mapped, so the page cache holds one copy shared by every worker
+process (an unpickled scikit-learn forest is private to each process).
+
+Before the first load, ensure_downloaded() resolves the folder through
+artifact_cache: Git LFS pointer stubs (and files that don't match their
+pins) are replaced from the local artifact cache, MODEL_SOURCES or the
+Hugging Face repo. Whatever is still a stub afterwards is left out of the
+snapshot rather than unpickled.
+
+Models are versioned: every distinct set of files in LOCAL_MODELS is copied
+into LOCAL_MODELS/.versions/<version>/ (so later deploys can't change a
+version underneath a reader or an mmap) and served as one ModelSet. A reload
+builds the next set in the background, smoke-tests it and swaps it in with a
+single reference assignment; the previous sets are kept for rollback.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from artifact_cache import MODEL_SOURCES, ArtifactCache, file_digest, lfs_pointer
+from name_index import NameIndex
+from packed_forest import PackedForest, load_or_pack
+from prophet_fast import engine_for
+
+RF_FILE = "severity_rf.joblib"
+LABEL_ENCODER_FILE = "label_encoder.joblib"
+VERSIONS_DIR = ".versions"
+
+# Snapshots not used by this process are deleted once older than this
+# (other processes on the node may still be serving them)
+PRUNE_AFTER_S = 24 * 3600
+
+
+def prophet_key(fname):
+    """'prophet_HIV_AIDS.pkl' -> 'hiv aids'."""
+    return fname.replace("prophet_", "").replace(".pkl", "").replace("_", " ").replace("-", " ").lower()
+
+
+def is_model_file(fname):
+    return fname in (RF_FILE, LABEL_ENCODER_FILE) or (fname.startswith("prophet_") and fname.endswith(".pkl"))
+
+
+def prophet_files(models_dir):
+    """{key: path} for every prophet_*.pkl in models_dir."""
+    return {
+        prophet_key(fname): os.path.join(models_dir, fname)
+        for fname in sorted(os.listdir(models_dir))
+        if fname.startswith("prophet_") and fname.endswith(".pkl")
+    }
+
+
+def resolve_key(models, clean_name):
+    """Model key for a disease name through the models' NameIndex (exact, alias, words, trigrams)."""
+    index = getattr(models, "index", None)
+    if index is None:
+        index = NameIndex(models)
+    return index.resolve(clean_name)
+
+
+def find_model(models, clean_name):
+    key = resolve_key(models, clean_name)
+    return models[key] if key is not None else None
+
+
+def current_rss_mb(pid="self"):
+    """Resident set size of a process in MB (Linux /proc, else own peak RSS)."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1e6, 1)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, 1)
+
+
+def dir_fingerprint(models_dir):
+    """Cheap change check: (name, size, mtime_ns) of every model file."""
+    out = []
+    for fname in sorted(os.listdir(models_dir)):
+        if is_model_file(fname):
+            st = os.stat(os.path.join(models_dir, fname))
+            out.append((fname, st.st_size, st.st_mtime_ns))
+    return tuple(out)
+
+
+def snapshot_models(models_dir, skip=()):
+    """
+    Copies the current model files into models_dir/.versions/<version>/.
+    The version is derived from the file contents, so identical files map to
+    the same (already existing) snapshot. LFS pointer stubs and the names in
+    `skip` are left out. Returns (version, path, digests).
+    """
+    digests = {
+        fname: file_digest(os.path.join(models_dir, fname))
+        for fname in sorted(os.listdir(models_dir))
+        if is_model_file(fname) and fname not in skip and lfs_pointer(os.path.join(models_dir, fname)) is None
+    }
+    version = hashlib.sha256(repr(sorted(digests.items())).encode()).hexdigest()[:12]
+    root = os.path.join(models_dir, VERSIONS_DIR)
+    path = os.path.join(root, version)
+    if not os.path.isdir(path):
+        tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(tmp, exist_ok=True)
+        for fname in digests:
+            shutil.copy2(os.path.join(models_dir, fname), os.path.join(tmp, fname))
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another process published the same version first
+            shutil.rmtree(tmp, ignore_errors=True)
+    return version, path, digests
+
+
+class LazyModels(Mapping):
+    """Read-only {key: model} view that unpickles each model on first access."""
+
+    def __init__(self, paths, loader=joblib.load, preloaded=None):
+        self._paths = dict(paths)
+        self._loader = loader
+        self._models = dict(preloaded or {})
+        self._locks = {key: threading.Lock() for key in self._paths}
+        self.load_seconds = {}
+        # Built from the file names only; nothing is unpickled
+        self.index = NameIndex(self._paths)
+
+    def __getitem__(self, key):
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        if key not in self._paths:
+            raise KeyError(key)
+        with self._locks[key]:
+            if key not in self._models:
+                start = time.perf_counter()
+                self._models[key] = self._loader(self._paths[key])
+                self.load_seconds[key] = round(time.perf_counter() - start, 3)
+            return self._models[key]
+
+    def __contains__(self, key):
+        # Mapping's default goes through __getitem__, which would load the model
+        return key in self._paths
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def loaded(self):
+        return list(self._models)
+
+    def loaded_items(self):
+        return dict(self._models)
+
+
+class ModelSet:
+    """One immutable version of the RF, label encoder and Prophet models."""
+
+    def __init__(self, version, path, digests, mmap_mode="r", reuse=None):
+        self.version = version
+        self.path = path
+        self.digests = digests
+        self.mmap_mode = mmap_mode
+        self.created_at = datetime.now()
+        self._lock = threading.Lock()
+        self._single = {}
+        self.load_seconds = {}
+
+        # Prophet models whose file is unchanged are shared with `reuse`
+        preloaded = {}
+        if reuse is not None:
+            old = reuse.prophet.loaded_items()
+            for fname, digest in digests.items():
+                key = prophet_key(fname)
+                if fname.startswith("prophet_") and reuse.digests.get(fname) == digest and key in old:
+                    preloaded[key] = old[key]
+        self.prophet = LazyModels(prophet_files(path), preloaded=preloaded)
+
+    def _load_single(self, fname, loader=joblib.load):
+        model = self._single.get(fname)
+        if model is not None:
+            return model
+        with self._lock:
+            if fname not in self._single:
+                start = time.perf_counter()
+                self._single[fname] = loader(os.path.join(self.path, fname))
+                self.load_seconds[fname] = round(time.perf_counter() - start, 3)
+            return self._single[fname]
+
+    @property
+    def rf(self):
+        return self._load_single(RF_FILE, lambda path: load_or_pack(path, joblib.load, self.mmap_mode))
+
+    @property
+    def label_encoder(self):
+        return self._load_single(LABEL_ENCODER_FILE)
+
+    def find_prophet(self, clean_name):
+        return find_model(self.prophet, clean_name)
+
+    def prophet_digest(self, clean_name):
+        """Content hash of the Prophet file find_prophet() would use (None if there is none)."""
+        key = resolve_key(self.prophet, clean_name)
+        if key is None:
+            return None
+        return next((digest for fname, digest in self.digests.items()
+                     if fname.startswith("prophet_") and prophet_key(fname) == key), None)
+
+    def load_all(self, threads=4):
+        """Loads every model, in a thread pool when threads > 1."""
+        jobs = [lambda: self.rf, lambda: self.label_encoder]
+        # Each Prophet model's fast inference engine is extracted (and validated) with it
+        jobs += [lambda k=key: engine_for(self.prophet[k]) for key in self.prophet]
+        if threads > 1:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                for fut in [pool.submit(job) for job in jobs]:
+                    fut.result()
+        else:
+            for job in jobs:
+                job()
+
+    def smoke_test(self):
+        """Raises if any model can't produce a sane prediction."""
+        features = pd.DataFrame([[100.0, 90.0, 80.0, 90.0, 10.0, 1]],
+                                columns=['lag_1', 'lag_2', 'lag_3', 'roll_mean_3', 'roll_std_3', 'month_num'])
+        proba = self.rf.predict_proba(features)
+        if proba.shape != (1, len(self.rf.classes_)) or not np.isfinite(proba).all():
+            raise ValueError("severity model returned malformed probabilities")
+        self.label_encoder.inverse_transform(self.rf.classes_[:1])
+
+        for key in self.prophet:
+            model = self.prophet[key]
+            fcst = model.predict(model.make_future_dataframe(periods=1, freq="MS").tail(1))
+            if not np.isfinite(fcst["yhat"].to_numpy()).all():
+                raise ValueError(f"prophet model '{key}' returned a non-finite forecast")
+
+    def disease_versions(self):
+        """{disease key: short content hash of its Prophet file}."""
+        return {
+            prophet_key(fname): digest[:12]
+            for fname, digest in self.digests.items() if fname.startswith("prophet_")
+        }
+
+    def info(self):
+        return {
+            "version": self.version,
+            "created_at": self.created_at.isoformat(),
+            "diseases": self.disease_versions(),
+            "rf": self.digests.get(RF_FILE, "")[:12],
+            "label_encoder": self.digests.get(LABEL_ENCODER_FILE, "")[:12],
+        }
+
+
+class ModelRegistry:
+    """
+    Serves the active ModelSet and manages reloads / rollbacks.
+    Readers should grab active() once per request so they see one version.
+    """
+
+    def __init__(self, models_dir, repo_id=None, mmap_mode="r", loader_threads=4, keep_versions=3):
+        self.models_dir = models_dir
+        self.repo_id = repo_id
+        self.mmap_mode = mmap_mode
+        self.loader_threads = loader_threads
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._active = None
+        self._fingerprint = None
+        self.previous = deque(maxlen=keep_versions)
+        self.on_swap = []
+        self.warmup_seconds = None
+        self.last_reload = None
+        self._watcher = None
+        self.artifacts = ArtifactCache()
+        self.sources = list(MODEL_SOURCES) + ([f"hf:{repo_id}"] if repo_id else [])
+        self.artifact_report = None
+
+    # ---------- download ----------
+    def ensure_downloaded(self):
+        """
+        Makes the model files real and verified: LFS pointers and corrupt
+        files come from the artifact cache or the first source that has
+        them, and an empty folder is filled from the first source.
+        """
+        try:
+            self.artifact_report = self.artifacts.resolve(self.models_dir, self.sources, want=is_model_file)
+        except OSError as e:
+            # e.g. a read-only cache; serve whatever is on disk
+            print(f"   ⚠️ Artifact cache unavailable: {e}")
+            self.artifact_report = {"error": str(e), "unusable": []}
+            os.makedirs(self.models_dir, exist_ok=True)
+        fetched = [f for f, s in self.artifact_report.get("files", {}).items() if s not in ("ok", "missing", "corrupt")]
+        if fetched:
+            print(f"   Resolved {len(fetched)} model files in {self.artifact_report['seconds']}s")
+
+    def _build(self, reuse=None):
+        # Resolved on every build so a reload picks up newly deployed pointers
+        self.ensure_downloaded()
+        fingerprint = dir_fingerprint(self.models_dir)
+        skip = (self.artifact_report or {}).get("unusable", ())
+        version, path, digests = snapshot_models(self.models_dir, skip=skip)
+        return ModelSet(version, path, digests, self.mmap_mode, reuse=reuse), fingerprint
+
+    # ---------- accessors ----------
+    def active(self):
+        if self._active is None:
+            with self._lock:
+                if self._active is None:
+                    self._active, self._fingerprint = self._build()
+        return self._active
+
+    @property
+    def prophet(self):
+        return self.active().prophet
+
+    @property
+    def rf(self):
+        return self.active().rf
+
+    @property
+    def label_encoder(self):
+        return self.active().label_encoder
+
+    def find_prophet(self, clean_name):
+        return self.active().find_prophet(clean_name)
+
+    # ---------- warmup ----------
+    def warmup(self, parallel=True):
+        """Loads every model now, in a thread pool unless parallel=False."""
+        start = time.perf_counter()
+        self.active().load_all(self.loader_threads if parallel else 1)
+        self.warmup_seconds = round(time.perf_counter() - start, 3)
+        return self.warmup_seconds
+
+    # ---------- versions ----------
+    def _swap(self, new):
+        with self._lock:
+            old, self._active = self._active, new
+            if old is not None and old.version != new.version:
+                self.previous.appendleft(old)
+        for callback in self.on_swap:
+            try:
+                callback(new)
+            except Exception as e:
+                print(f"   ⚠️ Model swap callback failed: {e}")
+        self.prune_versions()
+
+    def prune_versions(self, older_than_s=PRUNE_AFTER_S):
+        """Deletes stale snapshots that are neither active nor kept for rollback."""
+        root = os.path.join(self.models_dir, VERSIONS_DIR)
+        keep = {s.version for s in [self._active, *self.previous] if s is not None}
+        cutoff = time.time() - older_than_s
+        for name in os.listdir(root) if os.path.isdir(root) else []:
+            path = os.path.join(root, name)
+            if name not in keep and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def changed(self):
+        return dir_fingerprint(self.models_dir) != self._fingerprint
+
+    def reload(self, force=False):
+        """
+        Builds, validates and swaps in the models currently on disk.
+        Runs in the caller's thread; /predict keeps using the old set until
+        the final swap. Returns a status dict.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return {"status": "in_progress"}
+        try:
+            current = self.active()
+            if not force and not self.changed():
+                return {"status": "unchanged", "version": current.version}
+            start = time.perf_counter()
+            try:
+                candidate, fingerprint = self._build(reuse=current)
+                if candidate.version == current.version:
+                    self._fingerprint = fingerprint
+                    status = {"status": "unchanged", "version": current.version}
+                elif any(s.version == candidate.version for s in self.previous):
+                    # Files went back to a version we still hold in memory
+                    self._fingerprint = fingerprint
+                    self.rollback(candidate.version)
+                    status = {"status": "swapped", "version": candidate.version, "previous": current.version}
+                else:
+                    candidate.load_all(self.loader_threads)
+                    candidate.smoke_test()
+                    self._fingerprint = fingerprint
+                    self._swap(candidate)
+                    status = {"status": "swapped", "version": candidate.version, "previous": current.version}
+            except Exception as e:
+                # Don't retry the same broken files on every watcher tick
+                self._fingerprint = dir_fingerprint(self.models_dir)
+                status = {"status": "rejected", "error": str(e), "version": current.version}
+            status["seconds"] = round(time.perf_counter() - start, 3)
+            self.last_reload = dict(status, at=datetime.now().isoformat())
+            print(f"   🔁 Model reload: {status}")
+            return status
+        finally:
+            self._reload_lock.release()
+
+    def reload_async(self, force=False):
+        """Starts reload() in a background thread; returns False if one is running."""
+        if self._reload_lock.locked():
+            return False
+        threading.Thread(target=self.reload, kwargs={"force": force}, daemon=True).start()
+        return True
+
+    def rollback(self, version=None):
+        """Re-activates a kept version (default: the most recent previous one)."""
+        with self._lock:
+            target = next((s for s in self.previous if version in (None, s.version)), None)
+            if target is None:
+                return None
+            self.previous.remove(target)
+        self._swap(target)
+        return target.version
+
+    def start_watcher(self, interval_s):
+        """Polls LOCAL_MODELS and reloads when the files change."""
+        if self._watcher is not None or interval_s <= 0:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval_s)
+                try:
+                    if self._active is not None and self.changed():
+                        self.reload()
+                except Exception as e:
+                    print(f"   ⚠️ Model watcher error: {e}")
+
+        self._watcher = threading.Thread(target=watch, daemon=True)
+        self._watcher.start()
+
+    def versions(self):
+        active = self._active
+        return {
+            "active": active.info() if active else None,
+            "previous": [s.info() for s in list(self.previous)],
+            "last_reload": self.last_reload,
+        }
+
+    def stats(self):
+        active = self._active
+        prophet = active.prophet if active else None
+        return {
+            "version": active.version if active else None,
+            "prophet_available": len(prophet) if prophet is not None else None,
+            "prophet_loaded": len(prophet.loaded()) if prophet is not None else 0,
+            "rf_loaded": bool(active and RF_FILE in active.load_seconds),
+            "rf_mmap": self.mmap_mode,
+            "rf_packed": bool(active and isinstance(active._single.get(RF_FILE), PackedForest)),
+            "warmup_s": self.warmup_seconds,
+            "load_s": dict(active.load_seconds, **prophet.load_seconds) if active else {},
+            "name_index": prophet.index.stats() if prophet is not None else None,
+            "artifacts": self.artifact_report,
+            "rss_mb": current_rss_mb(),
+        }
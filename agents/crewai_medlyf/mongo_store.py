@@ -0,0 +1,193 @@
+"""
+Shared MongoDB persistence for the forecasting agent and the scheduler.
+
+One long-lived MongoClient per (process, URI) is reused for every write
+(no per-document TLS handshake). Documents are buffered and flushed with a
+single bulk_write: rows carrying the key fields become upserts so re-running
+a scan updates the same documents instead of inserting duplicates, anything
+else is a plain insert with a client-side _id, so resending an insert the
+server already applied fails as a duplicate instead of writing it twice.
+
+Only transient errors (AutoReconnect, NetworkTimeout) retry the batch, with
+exponential backoff. After a partial BulkWriteError only the failed
+operations with a retryable code are sent again; the rest are dropped and
+logged. At most MONGO_MAX_PENDING documents are buffered; beyond that the
+oldest are dropped.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import InsertOne, MongoClient, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError, NetworkTimeout
+
+from metrics import timed
+
+MONGO_MAX_PENDING = int(os.getenv("MONGO_MAX_PENDING", "10000"))
+
+TRANSIENT_ERRORS = (AutoReconnect, NetworkTimeout)
+DUPLICATE_KEY = 11000
+# Per-operation write errors worth sending again: duplicate key on a
+# concurrent upsert, and primary changes / shutdowns
+RETRYABLE_CODES = {DUPLICATE_KEY, 6, 7, 89, 91, 189, 9001, 10107, 11600, 11602, 13435, 13436}
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(uri, client_factory=MongoClient, **kwargs):
+    """Process-wide pooled client; forked children get their own."""
+    key = (os.getpid(), uri)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = client_factory(uri, **kwargs)
+            _CLIENTS[key] = client
+        return client
+
+
+class BatchedWriter:
+    """Buffers documents and writes them with bulk upserts."""
+
+    def __init__(self, get_collection, key_fields=("disease", "predicted_date"), batch_size=100,
+                 max_retries=3, backoff_s=0.5, sleep=time.sleep, max_pending=MONGO_MAX_PENDING):
+        self.get_collection = get_collection
+        self.key_fields = tuple(key_fields)
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.sleep = sleep
+        self.max_pending = max_pending
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.retries = 0
+        self.docs_written = 0
+        self.docs_dropped = 0
+        self.batch_sizes = []
+        self.flush_ms = []
+
+    def add(self, doc):
+        """Queues a document; flushes once batch_size documents are waiting."""
+        doc = dict(doc)
+        doc.pop("_id", None)
+        doc.pop("created_at", None)
+        with self._lock:
+            self._buffer.append(doc)
+            self._trim()
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def _trim(self):
+        """Drops the oldest documents beyond max_pending (caller holds _lock)."""
+        excess = len(self._buffer) - self.max_pending
+        if excess > 0:
+            del self._buffer[:excess]
+            self.docs_dropped += excess
+            print(f"   ⚠️ MongoDB write buffer full: dropped {excess} oldest documents")
+
+    def _keyed(self, doc):
+        return all(doc.get(k) is not None for k in self.key_fields)
+
+    def _operation(self, doc, now):
+        if self._keyed(doc):
+            key = {k: doc[k] for k in self.key_fields}
+            return UpdateOne(
+                key,
+                {"$set": dict(doc, updated_at=now), "$setOnInsert": {"created_at": now}},
+                upsert=True,
+            )
+        # Assigned once and kept in the buffered doc, so a resend is recognisable
+        doc.setdefault("_id", ObjectId())
+        return InsertOne(dict(doc, created_at=now))
+
+    def _requeue(self, batch):
+        with self._lock:
+            self._buffer = batch + self._buffer
+            self._trim()
+
+    def _failed(self, batch, written, message):
+        self.failed_flushes += 1
+        self.docs_written += written
+        self._requeue(batch)
+        print(f"   ❌ {message}")
+        return written
+
+    def flush(self):
+        """Writes everything buffered. Returns the number of documents written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+
+            now = datetime.now()
+            ops = [self._operation(doc, now) for doc in batch]
+            start = time.perf_counter()
+            written = 0
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with timed("mongo_write"):
+                        self.get_collection().bulk_write(ops, ordered=False)
+                    written += len(batch)
+                    batch = []
+                except BulkWriteError as e:
+                    last_error, retry, dropped = e, [], 0
+                    errors = {err["index"]: err for err in e.details.get("writeErrors", [])}
+                    for i, doc in enumerate(batch):
+                        err = errors.get(i)
+                        if err is None or (err["code"] == DUPLICATE_KEY and not self._keyed(doc)):
+                            written += 1  # written now, or by an earlier attempt
+                        elif err["code"] in RETRYABLE_CODES:
+                            retry.append(doc)
+                        else:
+                            dropped += 1
+                            print(f"   ❌ MongoDB rejected a document: {err.get('errmsg', err['code'])}")
+                    self.docs_dropped += dropped
+                    batch, ops = retry, [self._operation(doc, now) for doc in retry]
+                except TRANSIENT_ERRORS as e:
+                    last_error = e
+                except Exception as e:
+                    # Not transient (auth, bad config): keep the documents for the next flush
+                    return self._failed(batch, written, f"MongoDB bulk write failed: {e}")
+                if not batch:
+                    break
+                if attempt == self.max_retries:
+                    return self._failed(batch, written,
+                                        f"MongoDB bulk write failed after {attempt + 1} attempts: {last_error}")
+                self.retries += 1
+                self.sleep(self.backoff_s * (2 ** attempt))
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.flushes += 1
+            self.docs_written += written
+            self.batch_sizes.append(written)
+            self.flush_ms.append(elapsed_ms)
+            # Keep the history bounded for long-running processes
+            del self.batch_sizes[:-500], self.flush_ms[:-500]
+            return written
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def stats(self):
+        sizes, lat = list(self.batch_sizes), list(self.flush_ms)
+        return {
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "retries": self.retries,
+            "docs_written": self.docs_written,
+            "docs_dropped": self.docs_dropped,
+            "pending": self.pending(),
+            "last_batch_size": sizes[-1] if sizes else 0,
+            "avg_batch_size": round(sum(sizes) / len(sizes), 1) if sizes else 0,
+            "last_flush_ms": round(lat[-1], 2) if lat else None,
+            "avg_flush_ms": round(sum(lat) / len(lat), 2) if lat else None,
+        }
@@ -0,0 +1,150 @@
+"""
+Disease-name resolution for model lookups.
+
+Built once per model set from the model keys (no model is loaded). A query
+is resolved by, in order:
+
+1. exact key, spacing variant ("covid19") or known alias ("tb", "aids")
+2. token containment: the key whose words all appear in the query, the most
+   specific one winning ("cerebral malaria" -> "malaria", never the shorter
+   key just because it is a substring of a longer one)
+3. character trigram similarity above min_score, for typos ("tuberclosis")
+
+Resolved names go into an LRU cache and unknown names into a bounded
+negative cache, so repeated queries are a dict lookup.
+"""
+
+import threading
+from collections import Counter, OrderedDict
+from itertools import combinations
+
+from series_prep import normalize_disease_name
+
+# alias -> canonical key; only aliases whose target is a model key are used
+DEFAULT_ALIASES = {
+    "aids": "hiv aids",
+    "hiv": "hiv aids",
+    "covid": "covid 19",
+    "coronavirus": "covid 19",
+    "sars cov 2": "covid 19",
+    "tb": "tuberculosis",
+    "flu": "viral flu",
+    "influenza": "viral flu",
+    "enteric fever": "typhoid",
+    "typhoid fever": "typhoid",
+    "rubeola": "measles",
+    "dengue fever": "dengue",
+}
+
+
+MAX_QUERY_TOKENS = 8  # words of a query considered for containment (2^8 subset lookups)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def compact(text):
+    return text.replace(" ", "")
+
+
+class NameIndex:
+    def __init__(self, keys, aliases=None, min_score=0.6, cache_size=4096, negative_size=4096):
+        self.keys = list(keys)
+        self._position = {key: i for i, key in enumerate(self.keys)}
+        self.min_score = min_score
+        self.cache_size = cache_size
+        self.negative_size = negative_size
+
+        self._exact = {}
+        for key in self.keys:
+            self._exact[key] = key
+            self._exact.setdefault(compact(key), key)
+        for alias, target in (DEFAULT_ALIASES if aliases is None else aliases).items():
+            target = normalize_disease_name(target)
+            if target in self._exact:
+                self._exact.setdefault(normalize_disease_name(alias), self._exact[target])
+
+        # word set -> most specific key with exactly those words
+        self._by_tokens_set = {}
+        for key in sorted(self.keys, key=lambda k: (-len(k), self._position[k])):
+            self._by_tokens_set.setdefault(frozenset(key.split()), key)
+
+        self._key_grams = {}
+        self._by_gram = {}
+        for key in self.keys:
+            grams = trigrams(key)
+            self._key_grams[key] = sum(grams.values())
+            for gram, n in grams.items():
+                self._by_gram.setdefault(gram, []).append((key, n))
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._negative = OrderedDict()
+        self.counts = Counter()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _by_tokens(self, query):
+        # Subsets of the query's words, largest first: cost depends on the
+        # query length, not on the number of keys
+        tokens = sorted(set(query.split()))[:MAX_QUERY_TOKENS]
+        for size in range(len(tokens), 0, -1):
+            matches = [self._by_tokens_set[s] for s in map(frozenset, combinations(tokens, size))
+                       if s in self._by_tokens_set]
+            if matches:
+                return min(matches, key=lambda k: (-len(k), self._position[k]))
+        return None
+
+    def _by_ngrams(self, query):
+        grams = trigrams(query)
+        total = sum(grams.values())
+        shared = Counter()
+        for gram, n in grams.items():
+            for key, m in self._by_gram.get(gram, ()):
+                shared[key] += min(n, m)
+        best, best_score = None, self.min_score
+        for key, common in shared.items():
+            score = 2.0 * common / (total + self._key_grams[key])  # Dice coefficient
+            if score > best_score or (score == best_score and best is None):
+                best, best_score = key, score
+        return best
+
+    def _lookup(self, query):
+        key = self._exact.get(query) or self._exact.get(compact(query))
+        if key is not None:
+            return key, "exact"
+        key = self._by_tokens(query)
+        if key is not None:
+            return key, "tokens"
+        key = self._by_ngrams(query)
+        return key, "ngram" if key is not None else "unknown"
+
+    def resolve(self, name):
+        """Model key for a disease name, or None."""
+        query = normalize_disease_name(name).strip()
+        with self._lock:
+            if query in self._cache:
+                self._cache.move_to_end(query)
+                self.counts["cache_hits"] += 1
+                return self._cache[query]
+            if query in self._negative:
+                self._negative.move_to_end(query)
+                self.counts["negative_hits"] += 1
+                return None
+
+        key, method = self._lookup(" ".join(query.split()))
+        with self._lock:
+            self.counts[method] += 1
+            store, limit = (self._cache, self.cache_size) if key is not None else (self._negative, self.negative_size)
+            store[query] = key
+            store.move_to_end(query)
+            while len(store) > limit:
+                store.popitem(last=False)
+        return key
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, keys=len(self.keys), cached=len(self._cache), negative=len(self._negative))
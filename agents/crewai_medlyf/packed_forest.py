@@ -0,0 +1,157 @@
+"""
+Memory-mapped RandomForest inference for the severity model.
+
+Unpickling a scikit-learn forest copies every tree's node and value arrays
+into private memory (Tree.__setstate__ rebuilds them), so joblib's
+mmap_mode doesn't help and each gunicorn worker holds its own copy.
+pack() flattens all trees of a fitted forest into a few .npy arrays (one
+node table for the whole forest, child links offset to it) next to the
+model file; PackedForest maps them read-only and walks every tree for every
+row with vector operations. The pages live in the page cache and are
+shared by every process that maps the same snapshot.
+
+Covered: single-output RandomForestClassifier / ExtraTreesClassifier
+(including missing-value routing). Anything else isn't packed and callers
+keep the unpickled model. A packed forest is checked against the original's
+predict_proba when it is built; one that disagrees isn't used.
+"""
+
+import os
+import shutil
+import threading
+
+import numpy as np
+
+# "0" keeps the unpickled scikit-learn forest
+PACKED_FOREST = os.getenv("PACKED_FOREST", "1") != "0"
+
+ARRAYS = ("left", "right", "feature", "threshold", "missing_left", "proba", "roots")
+
+
+def packable(model):
+    estimators = getattr(model, "estimators_", None)
+    return (
+        bool(estimators)
+        and hasattr(model, "classes_") and np.ndim(model.classes_) == 1
+        and getattr(model, "n_outputs_", 1) == 1
+        and all(hasattr(est, "tree_") for est in estimators)
+    )
+
+
+def pack(model, path):
+    """Writes the forest's arrays into the directory `path` (atomically)."""
+    lefts, rights, features, thresholds, missing, probas, roots = [], [], [], [], [], [], []
+    offset = 0
+    for est in model.estimators_:
+        tree = est.tree_
+        n = tree.node_count
+        ids = np.arange(n, dtype=np.int64)
+        leaf = tree.children_left == -1
+        # Leaves point at themselves, so every row can take max_depth steps
+        lefts.append(np.where(leaf, ids, tree.children_left) + offset)
+        rights.append(np.where(leaf, ids, tree.children_right) + offset)
+        features.append(np.where(leaf, 0, tree.feature).astype(np.int64))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold))
+        missing.append(np.asarray(getattr(tree, "missing_go_to_left", np.zeros(n)), dtype=bool))
+        value = tree.value[:, 0, :]
+        total = value.sum(axis=1, keepdims=True)
+        probas.append(np.divide(value, total, out=np.zeros_like(value), where=total > 0))
+        roots.append(offset)
+        offset += n
+
+    arrays = {
+        "left": np.concatenate(lefts), "right": np.concatenate(rights),
+        "feature": np.concatenate(features), "threshold": np.concatenate(thresholds),
+        "missing_left": np.concatenate(missing), "proba": np.concatenate(probas),
+        "roots": np.asarray(roots, dtype=np.int64),
+    }
+    meta = {
+        # Object arrays would need pickle to load back
+        "classes": np.asarray(model.classes_).astype(str) if np.asarray(model.classes_).dtype == object
+        else np.asarray(model.classes_),
+        "depth": np.int64(max(est.tree_.max_depth for est in model.estimators_)),
+        "feature_names": np.asarray(getattr(model, "feature_names_in_", []), dtype=str),
+    }
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(tmp, exist_ok=True)
+    for name, arr in {**arrays, **meta}.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), arr)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Another process packed the same snapshot first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return path
+
+
+class PackedForest:
+    """predict_proba / predict over a packed forest; arrays are np.memmap views."""
+
+    def __init__(self, path, mmap_mode="r"):
+        self.path = path
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode))
+        self.classes_ = np.load(os.path.join(path, "classes.npy"))
+        self.depth = int(np.load(os.path.join(path, "depth.npy")))
+        names = np.load(os.path.join(path, "feature_names.npy"))
+        self.feature_names_in_ = names if len(names) else None
+        self.n_estimators = len(self.roots)
+
+    def _matrix(self, X):
+        if self.feature_names_in_ is not None and hasattr(X, "columns"):
+            X = X[list(self.feature_names_in_)]
+        # Trees compare float32 features against float64 thresholds
+        return np.asarray(X, dtype=np.float32)
+
+    def predict_proba(self, X):
+        X = self._matrix(X)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(np.asarray(self.roots), (len(X), self.n_estimators))
+        for _ in range(self.depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = (x <= self.threshold[nodes]) | (np.isnan(x) & self.missing_left[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.proba[nodes].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def check_rows_for(packed, n_features, n, seed=0):
+    """Rows whose values sit just either side of the forest's own split thresholds."""
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n, n_features))
+    internal = np.isfinite(packed.threshold)
+    for j in range(n_features):
+        thresholds = np.asarray(packed.threshold[internal & (packed.feature == j)])
+        if len(thresholds):
+            X[:, j] = rng.choice(thresholds, n) + rng.choice([-1e-3, 1e-3], n)
+    return X
+
+
+def load_or_pack(model_path, loader, mmap_mode="r", check_rows=64, seed=0):
+    """
+    PackedForest for the forest at model_path, packing it on first use into
+    <model_path>.packed/. Returns the unpickled model when the forest can't
+    be packed or the packed copy disagrees with it.
+    """
+    packed_path = f"{model_path}.packed"
+    if PACKED_FOREST and os.path.isdir(packed_path):
+        return PackedForest(packed_path, mmap_mode)
+    model = loader(model_path)
+    if not PACKED_FOREST or not packable(model):
+        return model
+    try:
+        pack(model, packed_path)
+        packed = PackedForest(packed_path, mmap_mode)
+        X = check_rows_for(packed, model.n_features_in_, check_rows, seed)
+        if getattr(model, "feature_names_in_", None) is not None:
+            import pandas as pd
+            X = pd.DataFrame(X, columns=model.feature_names_in_)
+        if not np.allclose(packed.predict_proba(X), model.predict_proba(X), atol=1e-9):
+            raise ValueError("packed forest disagrees with predict_proba")
+    except Exception as e:
+        print(f"   ⚠️ Serving the unpacked severity model: {e}")
+        shutil.rmtree(packed_path, ignore_errors=True)
+        return model
+    return packed
@@ -0,0 +1,164 @@
+"""
+Parallel Prophet step for run_daily_scan.
+
+Diseases are fanned out to a bounded process pool. Every worker loads each
+Prophet model once, on first use, and keeps it for its lifetime, so a
+task only ships a disease name in and a few forecast rows out. Each disease
+has its own timeout, results come back in input order, and the summary
+reports per-disease durations and the speedup over running the same tasks
+one after another.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from dataset_cache import normalize_disease_name
+from model_registry import LazyModels, current_rss_mb, find_model, prophet_files
+from prophet_fast import forecast_rows
+
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", str(min(4, os.cpu_count() or 1))))
+SCAN_TIMEOUT_S = float(os.getenv("SCAN_TIMEOUT_S", "60"))
+SCAN_START_METHOD = os.getenv("SCAN_START_METHOD", "spawn")
+
+# Per-worker state, filled by _init_worker
+_WORKER_MODELS = None
+
+
+def _init_worker(models_dir):
+    global _WORKER_MODELS
+    _WORKER_MODELS = LazyModels(prophet_files(models_dir))
+
+
+def _forecast_task(disease_name, periods):
+    """Runs in a worker: returns ({h: {"ds", "yhat"}} or error dict, seconds)."""
+    start = time.perf_counter()
+    model = find_model(_WORKER_MODELS or {}, normalize_disease_name(disease_name))
+    if not model:
+        return {"error": f"No AI model for {disease_name}"}, time.perf_counter() - start
+    try:
+        rows = forecast_rows(model, periods, freq="MS")
+    except Exception as e:
+        rows = {"error": "Forecast math failed", "detail": repr(e)}
+    return rows, time.perf_counter() - start
+
+
+class ScanPool:
+    """Long-lived process pool; workers keep their models between scans."""
+
+    def __init__(self, models_dir, workers=SCAN_WORKERS, timeout_s=SCAN_TIMEOUT_S, start_method=SCAN_START_METHOD):
+        self.models_dir = models_dir
+        self.workers = max(1, int(workers))
+        self.timeout_s = timeout_s
+        self.start_method = start_method
+        self._executor = None
+        self.last_summary = None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(self.models_dir,),
+            )
+        return self._executor
+
+    def recycle(self):
+        """Drops the pool (including stuck workers); the next scan starts fresh."""
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for proc in processes:
+            if proc.is_alive():
+                proc.terminate()
+
+    def use_models(self, models_dir):
+        """Points workers at another model version; current workers are replaced."""
+        if models_dir != self.models_dir:
+            self.models_dir = models_dir
+            self.recycle()
+
+    def worker_rss_mb(self):
+        """{pid: RSS MB} for the live pool workers."""
+        executor = self._executor
+        processes = (getattr(executor, "_processes", None) or {}) if executor else {}
+        return {pid: current_rss_mb(pid) for pid in list(processes)}
+
+    def forecast(self, diseases, periods):
+        """
+        Returns (results, summary). results is [(disease, rows_or_error)] in
+        input order; summary has per-disease durations and the speedup.
+        """
+        diseases = list(diseases)
+        pool = self._pool()
+        results = [None] * len(diseases)
+        durations = {}
+        started = time.perf_counter()
+
+        # At most one task per live worker is in flight, so a task starts as
+        # soon as it is submitted and its deadline can be measured from there.
+        queue = list(enumerate(diseases))
+        in_flight = {}
+        stuck = 0
+        broken = False
+        while queue or in_flight:
+            while queue and not broken and len(in_flight) < self.workers - stuck:
+                idx, disease = queue[0]
+                try:
+                    fut = pool.submit(_forecast_task, disease, periods)
+                except BrokenProcessPool:
+                    broken = True
+                    break
+                queue.pop(0)
+                in_flight[fut] = (idx, disease, time.perf_counter() + self.timeout_s)
+            if not in_flight:
+                # Every worker is wedged on a timed-out task, or the pool died
+                reason = "Scan pool crashed" if broken else "No free scan worker"
+                for idx, disease in queue:
+                    results[idx] = (disease, {"error": reason})
+                break
+
+            next_deadline = min(deadline for _, _, deadline in in_flight.values())
+            done, _ = wait(in_flight, timeout=max(0.0, next_deadline - time.perf_counter()), return_when=FIRST_COMPLETED)
+            for fut in done:
+                idx, disease, _ = in_flight.pop(fut)
+                try:
+                    rows, seconds = fut.result()
+                except BrokenProcessPool:
+                    broken = True
+                    rows, seconds = {"error": "Scan pool crashed"}, None
+                except Exception as e:
+                    rows, seconds = {"error": f"Scan worker failed: {e}"}, None
+                results[idx] = (disease, rows)
+                durations[disease] = seconds
+
+            now = time.perf_counter()
+            for fut, (idx, disease, deadline) in list(in_flight.items()):
+                if not fut.done() and now >= deadline:
+                    in_flight.pop(fut)
+                    fut.cancel()
+                    stuck += 1
+                    results[idx] = (disease, {"error": f"Forecast timed out after {self.timeout_s:.0f}s"})
+                    durations[disease] = None
+
+        wall = time.perf_counter() - started
+        if stuck or broken:
+            self.recycle()
+
+        serial = sum(d for d in durations.values() if d)
+        summary = {
+            "workers": self.workers,
+            "diseases": len(diseases),
+            "wall_s": round(wall, 3),
+            "serial_estimate_s": round(serial, 3),
+            "speedup": round(serial / wall, 2) if wall > 0 else None,
+            "timeouts": stuck,
+            "durations_s": {d: (round(durations[d], 3) if durations.get(d) is not None else None) for d in diseases},
+        }
+        self.last_summary = summary
+        return results, summary
@@ -0,0 +1,361 @@
+"""
+Columnar store of patient admissions from Data/*.json.
+
+The admission exports are JSON arrays of records with timeOfAdmit,
+condition / reason (or disease) and status flags (alive, active,
+inHospital). Each file is streamed record by record (ijson, when installed)
+into a few NumPy columns: admit time as int64 ns and category codes for
+hospital, condition and reason. Files are only re-parsed when their size or
+mtime changes. The columns are kept sorted by time, and again by (hospital,
+time), so every query is a couple of binary searches plus a bincount over a
+contiguous slice.
+
+The exports carry no discharge time, so occupancy at t is estimated as the
+patients admitted within the last PATIENT_STAY_DAYS. A record's hospital is
+its hospitalId / hospital_id / hospital field, or else the file it came from
+(one export per hospital). Files that aren't arrays of admissions (such as
+oxygen usage objects) contribute nothing.
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import ijson
+    _JSON_ERRORS = (ValueError, ijson.JSONError)
+except ImportError:  # optional: files are then parsed whole with json
+    ijson = None
+    _JSON_ERRORS = (ValueError,)
+
+from ingestion import IngestError
+from metrics import timed
+
+PATIENT_DATA_DIR = os.getenv("PATIENT_DATA_DIR", str(Path(__file__).resolve().parents[2] / "Data"))
+PATIENT_STAY_DAYS = float(os.getenv("PATIENT_STAY_DAYS", "3"))
+
+UNKNOWN = "Unknown"
+_DAY_NS = 24 * 3600 * 10**9
+
+
+class Categories:
+    """Append-only value <-> code table (codes never change once given)."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        value = str(value).strip() if value is not None else ""
+        value = value or UNKNOWN
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def get(self, value):
+        return self._codes.get(value)
+
+    def __len__(self):
+        return len(self.values)
+
+
+def _flag(*values):
+    """1 / 0 for the first of `values` that is a recognizable bool or yes/no, else -1."""
+    for v in values:
+        if isinstance(v, bool):
+            return int(v)
+        if isinstance(v, str) and v.strip().lower() in ("yes", "no", "true", "false"):
+            return int(v.strip().lower() in ("yes", "true"))
+    return -1
+
+
+def iter_records(path):
+    """Admission dicts of one file, streamed if ijson is installed."""
+    with open(path, "rb") as f:
+        if ijson is not None:
+            # "item" = elements of a top-level array; anything else yields nothing
+            for record in ijson.items(f, "item"):
+                if isinstance(record, dict):
+                    yield record
+            return
+        doc = json.load(f)
+    for record in doc if isinstance(doc, list) else []:
+        if isinstance(record, dict):
+            yield record
+
+
+@dataclass
+class FileColumns:
+    """The admissions of one file, in file order."""
+    time_ns: np.ndarray
+    hospital: np.ndarray
+    condition: np.ndarray
+    reason: np.ndarray
+    alive: np.ndarray
+    in_hospital: np.ndarray
+    rejected: int
+    mtime_ns: int
+    size: int
+    error: str = None
+
+
+def parse_file(path, hospitals, conditions, reasons, st=None):
+    """
+    FileColumns for `path`, encoding categories into the given tables. A file
+    that isn't valid JSON contributes no rows and records the error.
+    """
+    st = st or os.stat(path)
+    default_hospital = Path(path).stem
+    stamps, hospital, condition, reason, alive, in_hospital = [], [], [], [], [], []
+    error = None
+    try:
+        for rec in iter_records(path):
+            stamps.append(rec.get("timeOfAdmit"))
+            hospital.append(hospitals.code(rec.get("hospitalId") or rec.get("hospital_id") or rec.get("hospital")
+                                           or default_hospital))
+            condition.append(conditions.code(rec.get("condition")))
+            reason.append(reasons.code(rec.get("reason") or rec.get("disease")))
+            alive.append(_flag(rec.get("alive")))
+            in_hospital.append(_flag(rec.get("inHospital"), rec.get("active")))
+    except _JSON_ERRORS as e:
+        print(f"   ⚠️ Skipping unreadable admissions file {path}: {e}")
+        error = str(e)
+        stamps, hospital, condition, reason, alive, in_hospital = [], [], [], [], [], []
+
+    times = pd.to_datetime(pd.Series(stamps, dtype=object), utc=True, format="ISO8601", errors="coerce")
+    ok = times.notna().to_numpy()
+    return FileColumns(
+        time_ns=times[ok].dt.tz_localize(None).astype("datetime64[ns]").to_numpy().view(np.int64),
+        hospital=np.asarray(hospital, dtype=np.int32)[ok],
+        condition=np.asarray(condition, dtype=np.int32)[ok],
+        reason=np.asarray(reason, dtype=np.int32)[ok],
+        alive=np.asarray(alive, dtype=np.int8)[ok],
+        in_hospital=np.asarray(in_hospital, dtype=np.int8)[ok],
+        rejected=int((~ok).sum()),
+        mtime_ns=st.st_mtime_ns,
+        size=st.st_size,
+        error=error,
+    )
+
+
+@dataclass(frozen=True)
+class Admissions:
+    """One immutable version of the store. Times are UTC ns; hospital=None means all."""
+    time_ns: np.ndarray          # sorted
+    condition: np.ndarray        # codes, aligned with time_ns
+    reason: np.ndarray
+    alive: np.ndarray
+    in_hospital: np.ndarray
+    hospitals: list              # code -> name
+    conditions: list
+    reasons: list
+    by_hospital: dict            # name -> (start, end) in order_h / time_h
+    order_h: np.ndarray          # indices into the columns above, grouped by hospital, time-sorted within
+    time_h: np.ndarray           # time_ns[order_h]
+    rejected: int
+    errors: dict                 # path -> parse error of files that were skipped
+    loaded_at: datetime = field(default_factory=datetime.now)
+
+    def _times(self, hospital):
+        """(sorted admit times, offset of the first one in order_h) for one hospital or all."""
+        if hospital is None:
+            return self.time_ns, None
+        lo, hi = self.by_hospital.get(hospital, (0, 0))
+        return self.time_h[lo:hi], lo
+
+    def _window(self, start, end, hospital=None):
+        """Positions (in the time-sorted columns) of admissions in [start, end)."""
+        times, offset = self._times(hospital)
+        lo, hi = np.searchsorted(times, [_ns(start), _ns(end)], side="left")
+        return slice(lo, hi) if offset is None else self.order_h[offset + lo:offset + hi]
+
+    def admissions(self, start, end, hospital=None):
+        """Patients admitted in [start, end)."""
+        times, _ = self._times(hospital)
+        lo, hi = np.searchsorted(times, [_ns(start), _ns(end)], side="left")
+        return int(hi - lo)
+
+    def occupancy(self, at, hospital=None, stay_days=PATIENT_STAY_DAYS):
+        """Estimated patients in hospital at `at`: admitted in (at - stay, at]."""
+        times, _ = self._times(hospital)
+        at = _ns(at)
+        lo, hi = np.searchsorted(times, [at - int(stay_days * _DAY_NS), at], side="right")
+        return int(hi - lo)
+
+    def counts(self, start, end, hospital=None, by="condition"):
+        """{condition (or reason): admissions in [start, end)}."""
+        codes, names = (self.condition, self.conditions) if by == "condition" else (self.reason, self.reasons)
+        selected = codes[self._window(start, end, hospital)]
+        tally = np.bincount(selected, minlength=len(names))
+        return {names[i]: int(tally[i]) for i in np.flatnonzero(tally)}
+
+    def census(self, hospital=None):
+        """Patients flagged as still in hospital (active / inHospital), regardless of time."""
+        if hospital is None:
+            flags = self.in_hospital
+        else:
+            lo, hi = self.by_hospital.get(hospital, (0, 0))
+            flags = self.in_hospital[self.order_h[lo:hi]]
+        return int((flags == 1).sum())
+
+    def series(self, hospital=None, freq="D", stay_days=PATIENT_STAY_DAYS):
+        """
+        Occupancy ds/y frame (one row per period, y = occupancy at the end of
+        the period), in the shape ingestion / forecast_agent use.
+        """
+        times, _ = self._times(hospital)
+        if not len(times):
+            return pd.DataFrame({"ds": pd.Series(dtype="datetime64[ns]"), "y": pd.Series(dtype="float32")})
+        first = pd.Timestamp(times[0]).floor(freq)
+        periods = pd.date_range(first, pd.Timestamp(times[-1]), freq=freq).as_unit("ns")
+        ends = np.append(periods.asi8[1:], (periods[-1] + pd.tseries.frequencies.to_offset(freq)).value) - 1
+        lo = np.searchsorted(times, ends - int(stay_days * _DAY_NS), side="right")
+        hi = np.searchsorted(times, ends, side="right")
+        return pd.DataFrame({"ds": periods, "y": (hi - lo).astype("float32")})
+
+    def __len__(self):
+        return len(self.time_ns)
+
+
+def _ns(value):
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.as_unit("ns").value
+
+
+def build(files, hospitals, conditions, reasons):
+    """Admissions over the FileColumns of every file."""
+    parts = list(files.values())
+
+    def cat(name, dtype):
+        return np.concatenate([getattr(p, name) for p in parts]) if parts else np.empty(0, dtype=dtype)
+
+    time_ns, hospital = cat("time_ns", np.int64), cat("hospital", np.int32)
+    condition, reason = cat("condition", np.int32), cat("reason", np.int32)
+    alive, in_hospital = cat("alive", np.int8), cat("in_hospital", np.int8)
+
+    order = np.argsort(time_ns, kind="stable")
+    time_ns, hospital = time_ns[order], hospital[order]
+    condition, reason, alive, in_hospital = condition[order], reason[order], alive[order], in_hospital[order]
+
+    # Same rows grouped by hospital (time order kept within each): per-hospital
+    # queries search one contiguous run
+    order_h = np.argsort(hospital, kind="stable")
+    grouped = hospital[order_h]
+    names = list(hospitals.values)
+    by_hospital = {}
+    for code in np.unique(grouped):
+        lo, hi = np.searchsorted(grouped, [code, code + 1])
+        by_hospital[names[code]] = (int(lo), int(hi))
+    return Admissions(
+        time_ns=time_ns, condition=condition, reason=reason, alive=alive, in_hospital=in_hospital,
+        hospitals=names, conditions=list(conditions.values), reasons=list(reasons.values),
+        by_hospital=by_hospital, order_h=order_h, time_h=time_ns[order_h],
+        rejected=sum(p.rejected for p in parts),
+        errors={path: f.error for path, f in files.items() if f.error},
+    )
+
+
+class PatientStore:
+    """Thread-safe, stat-validated Admissions over the *.json files of a directory (or a list of files)."""
+
+    def __init__(self, source=PATIENT_DATA_DIR, pattern="*.json"):
+        self.source = source
+        self.pattern = pattern
+        self._files = {}
+        self._hospitals, self._conditions, self._reasons = Categories(), Categories(), Categories()
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.reloads = 0
+        self.last_load_s = None
+
+    def paths(self):
+        if isinstance(self.source, (list, tuple)):
+            return [str(p) for p in self.source]
+        return sorted(str(p) for p in Path(self.source).glob(self.pattern))
+
+    def _changed(self, stats):
+        if stats.keys() != self._files.keys():
+            return True
+        return any((f.mtime_ns, f.size) != (st.st_mtime_ns, st.st_size) for f, st in
+                   ((self._files[p], stats[p]) for p in stats))
+
+    def get(self):
+        """Current Admissions; re-parses only files that were added or changed."""
+        stats = {p: os.stat(p) for p in self.paths()}
+        snap = self._snapshot
+        if snap is not None and not self._changed(stats):
+            self.hits += 1
+            return snap
+        with self._lock:
+            if self._snapshot is not None and not self._changed(stats):
+                return self._snapshot
+            start = time.perf_counter()
+            with timed("admissions_load"):
+                files = {}
+                for path, st in stats.items():
+                    old = self._files.get(path)
+                    if old is not None and (old.mtime_ns, old.size) == (st.st_mtime_ns, st.st_size):
+                        files[path] = old
+                    else:
+                        files[path] = parse_file(path, self._hospitals, self._conditions, self._reasons, st)
+                self._files = files
+                self._snapshot = build(files, self._hospitals, self._conditions, self._reasons)
+            self.reloads += 1
+            self.last_load_s = round(time.perf_counter() - start, 4)
+            return self._snapshot
+
+    def stats(self):
+        snap = self._snapshot
+        return {
+            "files": len(self._files),
+            "admissions": len(snap) if snap else 0,
+            "hospitals": len(snap.by_hospital) if snap else 0,
+            "rejected": snap.rejected if snap else 0,
+            "unreadable_files": sorted(snap.errors) if snap else [],
+            "hits": self.hits,
+            "reloads": self.reloads,
+            "last_load_s": self.last_load_s,
+            "streaming": ijson is not None,
+        }
+
+
+def read_admissions_series(path, hospital=None, freq="D", stay_days=PATIENT_STAY_DAYS):
+    """
+    (ds/y frame, stats) for an upload that is an admissions export instead
+    of a ds/y CSV; raises IngestError like ingestion.read_daily_series.
+    The series covers `hospital` if the file has records for it, else the
+    whole file.
+    """
+    start = time.perf_counter()
+    try:
+        admissions = PatientStore([path]).get()
+    except OSError as e:
+        raise IngestError(f"unreadable admissions file: {e}") from e
+    if admissions.errors:
+        raise IngestError(f"unreadable admissions file: {admissions.errors[str(path)]}")
+    if not len(admissions):
+        raise IngestError("no admissions with a valid timeOfAdmit")
+    frame = admissions.series(hospital if hospital in admissions.by_hospital else None, freq=freq,
+                              stay_days=stay_days)
+    stats = {
+        "rows": len(admissions) + admissions.rejected,
+        "bad_rows": admissions.rejected,
+        "chunks": 1,
+        "periods": len(frame),
+        "parse_s": round(time.perf_counter() - start, 3),
+    }
+    return frame, stats
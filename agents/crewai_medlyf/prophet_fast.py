@@ -0,0 +1,268 @@
+"""
+NumPy inference for fitted Prophet models.
+
+Prophet.predict(make_future_dataframe(...)) rebuilds the whole history
+frame, evaluates every component over every historical date and draws
+uncertainty samples for all of them, only for the caller to read the last
+row or two. FastProphet pulls the fitted trend, changepoints, seasonality
+coefficients and scaling out of a model once and evaluates yhat for just the
+requested dates with a few vector operations. Uncertainty intervals are
+optional; they use the same simulation as Prophet's vectorized sampler
+(future trend changes + observation noise), so they agree with predict()
+up to sampling noise.
+
+Covered: linear and flat growth, additive and multiplicative seasonalities.
+Models with logistic growth, holidays, extra regressors or conditional
+seasonalities (and anything that isn't a fitted Prophet) get no engine and
+callers keep using predict(). Every engine is checked against predict()
+when it is built; a model it disagrees with also falls back.
+"""
+
+import math
+import os
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# "0" sends every forecast through Prophet.predict
+FAST_PROPHET = os.getenv("FAST_PROPHET", "1") != "0"
+
+# Largest difference to predict()'s yhat accepted when an engine is built
+VALIDATE_RTOL = 1e-6
+
+
+class UnsupportedModel(ValueError):
+    """The model uses something FastProphet does not evaluate."""
+
+
+def _as_datetimes(dates):
+    return pd.DatetimeIndex(pd.to_datetime(dates)).as_unit("ns")
+
+
+def piecewise_linear(t, deltas, k, m, changepoints_t):
+    """Prophet's piecewise-linear trend at scaled times t."""
+    deltas_t = (changepoints_t[None, :] <= t[:, None]) * deltas
+    return (deltas_t.sum(axis=1) + k) * t + (deltas_t * -changepoints_t).sum(axis=1) + m
+
+
+class FastProphet:
+    """Fitted Prophet parameters plus a NumPy predict for chosen dates."""
+
+    def __init__(self, model):
+        params = getattr(model, "params", None)
+        if not params or getattr(model, "history_dates", None) is None:
+            raise UnsupportedModel("not a fitted Prophet model")
+        if model.growth not in ("linear", "flat"):
+            raise UnsupportedModel(f"{model.growth} growth")
+        if getattr(model, "logistic_floor", False):
+            raise UnsupportedModel("logistic floor")
+        if model.extra_regressors:
+            raise UnsupportedModel("extra regressors")
+        if getattr(model, "train_holiday_names", None) is not None and len(model.train_holiday_names):
+            raise UnsupportedModel("holidays")
+        if any(props.get("condition_name") for props in model.seasonalities.values()):
+            raise UnsupportedModel("conditional seasonality")
+
+        self.growth = model.growth
+        self.seasonalities = [(float(p["period"]), int(p["fourier_order"])) for p in model.seasonalities.values()]
+        self.start_ns = pd.Timestamp(model.start).as_unit("ns").value
+        self.t_scale_ns = pd.Timedelta(model.t_scale).as_unit("ns").value
+        self.y_scale = float(model.y_scale)
+        # Prophet >= 1.1.5 can scale y by min/max; older pickles are always absmax
+        self.floor = float(model.y_min) if getattr(model, "scaling", "absmax") == "minmax" else 0.0
+        self.changepoints_t = np.asarray(model.changepoints_t, dtype=float)
+        self.last_ds = pd.Timestamp(model.history_dates.max())
+
+        # Point forecast: parameters averaged over iterations, as predict() does
+        self.k_iter = np.asarray(params["k"], dtype=float).reshape(-1)
+        self.m_iter = np.asarray(params["m"], dtype=float).reshape(-1)
+        self.delta_iter = np.asarray(params["delta"], dtype=float).reshape(len(self.k_iter), -1)
+        self.beta_iter = np.asarray(params["beta"], dtype=float).reshape(len(self.k_iter), -1)
+        self.sigma_iter = np.asarray(params["sigma_obs"], dtype=float).reshape(-1)
+        self.k = float(np.nanmean(self.k_iter))
+        self.m = float(np.nanmean(self.m_iter))
+        self.deltas = np.nanmean(self.delta_iter, axis=0)
+
+        cols = model.train_component_cols
+        self.s_add = cols["additive_terms"].to_numpy(dtype=float)
+        self.s_mult = cols["multiplicative_terms"].to_numpy(dtype=float)
+        n_features = 2 * sum(order for _, order in self.seasonalities) or 1  # Prophet adds a zero column
+        if self.beta_iter.shape[1] != n_features or len(self.s_add) != n_features:
+            raise UnsupportedModel("unexpected regression columns")
+        beta = np.nanmean(self.beta_iter, axis=0)
+        self.beta_add = beta * self.s_add * self.y_scale
+        self.beta_mult = beta * self.s_mult
+
+        self.interval_width = float(model.interval_width)
+        self.uncertainty_samples = int(model.uncertainty_samples or 0)
+        history = getattr(model, "history", None)
+        self.history_t_step = float(np.diff(history["t"]).mean()) if history is not None and len(history) > 1 else 0.0
+        self._future = {}
+
+    # ---------- evaluation ----------
+    def scaled_time(self, ns):
+        return (ns - self.start_ns) / self.t_scale_ns
+
+    def features(self, ns):
+        """Fourier columns of every seasonality, in Prophet's column order."""
+        if not self.seasonalities:
+            return np.zeros((len(ns), 1))
+        x_T = np.pi * 2 * (ns / 1e9 / (24 * 60 * 60))
+        out = np.empty((len(ns), 2 * sum(order for _, order in self.seasonalities)))
+        col = 0
+        for period, order in self.seasonalities:
+            for i in range(order):
+                c = (i + 1) / period * x_T
+                out[:, col] = np.sin(c)
+                out[:, col + 1] = np.cos(c)
+                col += 2
+        return out
+
+    def _trend(self, t, deltas, k, m):
+        if self.growth == "flat":
+            return np.full(len(t), m)
+        return piecewise_linear(t, deltas, k, m, self.changepoints_t)
+
+    def predict(self, dates, intervals=False, seed=None):
+        """
+        {"ds", "trend", "yhat"[, "yhat_lower", "yhat_upper"]} for `dates`
+        (ascending), matching the same columns of Prophet.predict.
+        """
+        ds = _as_datetimes(dates)
+        ns = ds.asi8.astype(float)
+        t = self.scaled_time(ns)
+        X = self.features(ns)
+        trend = self._trend(t, self.deltas, self.k, self.m) * self.y_scale + self.floor
+        out = {"ds": ds, "trend": trend, "yhat": trend * (1 + X @ self.beta_mult) + X @ self.beta_add}
+        if intervals and self.uncertainty_samples:
+            sims = self.sample(t, X, np.random.default_rng(seed))
+            out["yhat_lower"] = np.percentile(sims, 100 * (1.0 - self.interval_width) / 2, axis=0)
+            out["yhat_upper"] = np.percentile(sims, 100 * (1.0 + self.interval_width) / 2, axis=0)
+        return out
+
+    def future_dates(self, periods, freq="MS"):
+        """The dates make_future_dataframe(periods, freq) appends after the history."""
+        key = (periods, freq)
+        dates = self._future.get(key)
+        if dates is None:
+            dates = pd.date_range(start=self.last_ds, periods=periods + 1, freq=freq)
+            dates = dates[dates > self.last_ds][:periods]
+            self._future[key] = dates
+        return dates
+
+    def forecast(self, periods, freq="MS", intervals=False, seed=None):
+        """predict() for the next `periods` dates after the history."""
+        return self.predict(self.future_dates(periods, freq), intervals=intervals, seed=seed)
+
+    # ---------- uncertainty ----------
+    def _trend_uncertainty(self, t, deltas, n_samples, rng):
+        """Simulated future trend changes (Prophet._sample_uncertainty, linear/flat)."""
+        out = np.zeros((n_samples, len(t)))
+        future = t > 1
+        n_future = int(future.sum())
+        if not n_future or self.growth == "flat":
+            return out
+        step = float(np.diff(t[future]).mean()) if n_future > 1 else self.history_t_step
+        likelihood = len(self.changepoints_t) * step
+        mean_delta = np.mean(np.abs(deltas)) + 1e-8
+        shifts = rng.laplace(0, mean_delta, size=(n_samples, n_future)) * (
+            rng.uniform(size=(n_samples, n_future)) < likelihood)
+        shifts = (np.hstack([np.zeros((n_samples, 1)), shifts])[:, :-1] + shifts) / 2
+        out[:, future] = shifts.cumsum(axis=1).cumsum(axis=1) * step
+        return out
+
+    def sample(self, t, X, rng):
+        """(samples x dates) draws of yhat, split over the fit's iterations like predict()."""
+        per_iter = max(1, int(math.ceil(self.uncertainty_samples / len(self.k_iter))))
+        sims = []
+        for k, m, deltas, beta, sigma in zip(self.k_iter, self.m_iter, self.delta_iter, self.beta_iter,
+                                             self.sigma_iter):
+            expected = self._trend(t, deltas, k, m)
+            trends = (expected + self._trend_uncertainty(t, deltas, per_iter, rng)) * self.y_scale + self.floor
+            additive = X @ (beta * self.s_add) * self.y_scale
+            multiplicative = X @ (beta * self.s_mult)
+            noise = rng.normal(0, sigma, trends.shape) * self.y_scale
+            sims.append(trends * (1 + multiplicative) + additive + noise)
+        return np.vstack(sims)
+
+
+def validate(model, engine):
+    """Raises UnsupportedModel if engine's yhat differs from model.predict()."""
+    dates = [engine.last_ds] + [engine.last_ds + pd.Timedelta(days=d) for d in (1, 31, 92, 366)]
+    expected = model.predict(pd.DataFrame({"ds": dates}))["yhat"].to_numpy()
+    got = engine.predict(dates)["yhat"]
+    tolerance = VALIDATE_RTOL * max(1.0, float(np.abs(expected).max()))
+    err = float(np.abs(got - expected).max())
+    if not err <= tolerance:
+        raise UnsupportedModel(f"differs from predict() by {err:.3g}")
+
+
+# One engine per model object, dropped with the model
+_ENGINES = weakref.WeakKeyDictionary()
+_LOCK = threading.Lock()
+_UNSUPPORTED = {}
+_MISSING = object()
+
+
+def engine_for(model):
+    """Validated FastProphet for `model` (built on first use), or None to use predict()."""
+    if not FAST_PROPHET or model is None:
+        return None
+    try:
+        with _LOCK:
+            engine = _ENGINES.get(model, _MISSING)
+    except TypeError:  # not weak-referenceable (plain dicts in tests, ...)
+        return None
+    if engine is not _MISSING:
+        return engine
+    try:
+        engine = FastProphet(model)
+        validate(model, engine)
+    except UnsupportedModel as e:
+        reason = str(e)
+        engine = None
+    except Exception as e:
+        reason = f"{type(e).__name__}: {e}"
+        engine = None
+    if engine is None:
+        with _LOCK:
+            _UNSUPPORTED[reason] = _UNSUPPORTED.get(reason, 0) + 1
+    with _LOCK:
+        _ENGINES[model] = engine
+    return engine
+
+
+def stats():
+    with _LOCK:
+        engines = list(_ENGINES.values())
+        return {
+            "enabled": FAST_PROPHET,
+            "engines": sum(e is not None for e in engines),
+            "fallback_models": sum(e is None for e in engines),
+            "fallback_reasons": dict(_UNSUPPORTED),
+        }
+
+
+# ---------- helpers for callers holding a model that may or may not be Prophet ----------
+def forecast_rows(model, periods, freq="MS"):
+    """{h: {"ds", "yhat"}} for the next 1..periods dates after the model's history."""
+    engine = engine_for(model)
+    if engine is not None:
+        fcst = engine.forecast(periods, freq)
+    else:
+        fcst = model.predict(model.make_future_dataframe(periods=periods, freq=freq)).tail(periods)
+    return {
+        h: {"ds": pd.Timestamp(ds), "yhat": float(yhat)}
+        for h, (ds, yhat) in enumerate(zip(fcst["ds"], fcst["yhat"]), start=1)
+    }
+
+
+def predict_frame(model, dates, intervals=False):
+    """Prophet.predict's ds/yhat(/yhat_lower/yhat_upper) columns for `dates` (ascending)."""
+    engine = engine_for(model)
+    if engine is None:
+        return model.predict(pd.DataFrame({"ds": pd.to_datetime(dates)}))
+    out = engine.predict(dates, intervals=intervals)
+    return pd.DataFrame({k: v for k, v in out.items() if k != "trend"})
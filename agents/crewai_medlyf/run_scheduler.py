@@ -3,7 +3,7 @@ import schedule
 import json
 import os
 from datetime import datetime
-from pymongo import MongoClient
+from mongo_store import BatchedWriter, get_client
 from forecasting_agent import run_forecast  # Import your agent
 
 # ==========================================
@@ -15,29 +15,17 @@ DB_NAME = "test"
 COLLECTION_NAME = "predictions"
 
 def get_collection():
-    """Connects to the 'test' database and returns the 'predictions' collection."""
-    try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
-        return db[COLLECTION_NAME]
-    except Exception as e:
-        print(f"❌ Connection Error: {e}")
-        return None
+    """Returns the 'predictions' collection on the shared, pooled client."""
+    client = get_client(MONGO_URI)
+    return client[DB_NAME][COLLECTION_NAME]
+
+# Buffered bulk upserts keyed by (disease, predicted_date)
+WRITER = BatchedWriter(get_collection)
 
 def save_prediction(data):
-    """Inserts a single prediction result into 'predictions' collection."""
-    collection = get_collection()
-    
-    if collection is not None:
-        try:
-            # Add a timestamp so you know when the agent ran
-            data['created_at'] = datetime.now()
-            
-            # Insert the document
-            result = collection.insert_one(data)
-            print(f"💾 Saved {data.get('disease', 'Unknown')} to 'test.predictions' (ID: {result.inserted_id})")
-        except Exception as e:
-            print(f"❌ Insert Error: {e}")
+    """Queues a single prediction result for the next bulk write."""
+    WRITER.add(data)
+    print(f"💾 Queued {data.get('disease', 'Unknown')} for 'test.predictions'")
 
 # ==========================================
 # 2. THE 24-HOUR JOB
@@ -81,6 +69,9 @@ def daily_job():
             # 4. Save to MongoDB
             save_prediction(result_dict)
             
+        written = WRITER.flush()
+        print(f"💾 Saved {written} results to 'test.predictions' ({WRITER.stats()})")
+            
     else:
         print(f"⚠️ Warning: Agent did not return a list. Got: {type(all_results)}")
 
@@ -0,0 +1,157 @@
+"""
+Change detection for forecasting_agent's scan.
+
+A disease's inputs are its monthly ds/y series from the CSV, the Prophet
+file that serves it and the severity models. Their content hash is kept in
+a small JSON state file together with the disease's last results, so a scan
+only recomputes diseases whose hash changed (or that failed last time) and
+reuses the stored results for the rest. The file also records which
+diseases the last scan skipped, recomputed or failed.
+
+The file is re-read at the start of every scan and replaced atomically, so
+it can be shared by the worker processes of one host (scans are serialized
+by the scan lock).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from model_registry import LABEL_ENCODER_FILE, RF_FILE
+from series_prep import normalize_disease_name
+
+# Bump when the result format or the scan's computation changes
+STATE_VERSION = 1
+
+
+def series_digest(frame):
+    """Content hash of a ds/y series (None for a missing series)."""
+    if frame is None or frame.empty:
+        return None
+    hashed = pd.util.hash_pandas_object(frame[["ds", "y"]].reset_index(drop=True), index=False).values
+    return hashlib.sha256(hashed.tobytes()).hexdigest()[:16]
+
+
+def disease_digests(dataset, models, horizons):
+    """{disease: hash of everything its results depend on} for every disease of the dataset."""
+    shared = [STATE_VERSION, sorted(horizons), models.digests.get(RF_FILE), models.digests.get(LABEL_ENCODER_FILE)]
+    out = {}
+    for disease in dataset.diseases:
+        clean = normalize_disease_name(disease)
+        inputs = shared + [series_digest(dataset.series(clean)), models.prophet_digest(clean)]
+        out[disease] = hashlib.sha256(json.dumps(inputs).encode()).hexdigest()[:16]
+    return out
+
+
+class ScanState:
+    """Per-disease input hash + last results, persisted as JSON."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.diseases = {}
+        self.last_scan = None
+        self._started = None
+        self._scan = None
+        self._lock = threading.Lock()
+        self._invalidated = False
+
+    def load(self):
+        """Re-reads the file; a missing, corrupt or outdated file means nothing is known."""
+        self.diseases, self.last_scan = {}, None
+        self._invalidated = False
+        try:
+            with open(self.path) as f:
+                doc = json.load(f)
+        except FileNotFoundError:
+            return self
+        except (OSError, ValueError) as e:
+            print(f"   ⚠️ Ignoring unreadable scan state {self.path}: {e}")
+            return self
+        if doc.get("version") == STATE_VERSION:
+            self.diseases = doc.get("diseases", {})
+            self.last_scan = doc.get("last_scan")
+        return self
+
+    def partition(self, digests):
+        """
+        Splits the diseases into (dirty, clean): clean ones have the same
+        input hash as when they last succeeded and can reuse their results.
+        """
+        dirty, clean = [], []
+        for disease, digest in digests.items():
+            entry = self.diseases.get(disease)
+            ok = entry and entry.get("digest") == digest and entry.get("status") != "failed" and entry.get("results")
+            (clean if ok else dirty).append(disease)
+        return dirty, clean
+
+    def results(self, disease):
+        """{horizon: result} stored for the disease."""
+        entry = self.diseases.get(disease) or {}
+        return {int(h): r for h, r in (entry.get("results") or {}).items()}
+
+    def begin(self, digests):
+        """Starts a scan over `digests`; diseases no longer in the dataset are forgotten."""
+        self._started = time.perf_counter()
+        self.diseases = {d: e for d, e in self.diseases.items() if d in digests}
+        self._scan = {"started_at": datetime.now().isoformat(), "skipped": [], "recomputed": [], "failed": {}}
+
+    def skip(self, disease):
+        self._scan["skipped"].append(disease)
+        self.diseases[disease]["status"] = "skipped"
+
+    def record(self, disease, digest, results=None, error=None):
+        """Stores a recomputed disease, or marks it failed (recomputed on the next scan)."""
+        entry = {"digest": digest, "updated_at": datetime.now().isoformat()}
+        if error is None:
+            entry.update(status="recomputed", results={str(h): r for h, r in results.items()})
+            self._scan["recomputed"].append(disease)
+        else:
+            entry.update(status="failed", error=error)
+            self._scan["failed"][disease] = error
+        self.diseases[disease] = entry
+
+    def finish(self):
+        """Writes the file (atomically); returns the summary of the scan."""
+        scan, self._scan = self._scan, None
+        scan["duration_s"] = round(time.perf_counter() - self._started, 3)
+        with self._lock:
+            if self._invalidated:
+                # invalidate() was called after this scan loaded the file
+                self.diseases, self._invalidated = {}, False
+            self.last_scan = scan
+            doc = {"version": STATE_VERSION, "last_scan": scan, "diseases": self.diseases}
+            tmp = f"{self.path}.tmp-{os.getpid()}"
+            with open(tmp, "w") as f:
+                json.dump(doc, f, default=str)
+            os.replace(tmp, self.path)
+        return scan
+
+    def invalidate(self):
+        """
+        Forgets every disease so the next scan recomputes all of them. The
+        entries of a scan already running in this process are dropped when
+        it finishes, instead of being written back.
+        """
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self._invalidated = True
+
+    def stats(self):
+        scan = self.last_scan or {}
+        return {
+            "path": self.path,
+            "diseases": len(self.diseases),
+            "last_scan_at": scan.get("started_at"),
+            "last_scan_s": scan.get("duration_s"),
+            "skipped": len(scan.get("skipped", [])),
+            "recomputed": len(scan.get("recomputed", [])),
+            "failed": scan.get("failed", {}),
+        }
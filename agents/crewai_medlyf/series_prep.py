@@ -0,0 +1,141 @@
+"""
+Vectorized preparation of the disease x month series.
+
+Dates are parsed once for the whole frame (year + month name/number, any
+mix of "Jan"/"January"/"1"), disease names are normalized once per distinct
+value, and every monthly series is summed in a single np.bincount pass into
+a dense month x disease matrix. Cost is O(rows) regardless of how many
+diseases the file contains.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+MONTHS = {}
+for _num, _name in enumerate(
+        ["january", "february", "march", "april", "may", "june", "july",
+         "august", "september", "october", "november", "december"], start=1):
+    MONTHS[_name] = _num
+    MONTHS[_name[:3]] = _num
+MONTHS["sept"] = 9
+
+
+def normalize_disease_name(name):
+    """'HIV/AIDS' -> 'hiv aids', 'COVID-19' -> 'covid 19'."""
+    return str(name).lower().replace("/", " ").replace("-", " ")
+
+
+def normalize_names(names):
+    """
+    normalize_disease_name for a whole column, computed once per distinct
+    name. Returns a categorical Series (missing names stay missing).
+    """
+    codes, uniques = pd.factorize(pd.Series(names), sort=False)
+    clean = [normalize_disease_name(u) for u in uniques]
+    # "HIV/AIDS" and "HIV-AIDS" normalize to the same category
+    categories = list(dict.fromkeys(clean))
+    remap = np.append(np.array([categories.index(c) for c in clean], dtype=int), -1)
+    cat = pd.Categorical.from_codes(remap[codes], categories=categories)
+    return pd.Series(cat, index=getattr(names, "index", None))
+
+
+def month_numbers(month):
+    """Month names, abbreviations or numbers -> float 1..12 (NaN if invalid)."""
+    codes, uniques = pd.factorize(pd.Series(month), sort=False)
+    text = pd.Series(uniques).astype(str).str.strip().str.lower()
+    numeric = pd.to_numeric(text, errors="coerce")
+    nums = text.map(MONTHS).astype(float).fillna(numeric.where((numeric >= 1) & (numeric <= 12)))
+    return np.append(nums.to_numpy(), np.nan)[codes]
+
+
+def build_ds(df):
+    """The `ds` column (month starts) for a frame with year/month or date columns; NaT if unparseable."""
+    if 'year' in df.columns and 'month' in df.columns:
+        year = pd.to_numeric(df['year'], errors="coerce").to_numpy(dtype=float)
+        month = month_numbers(df['month'])
+        ok = ~(np.isnan(year) | np.isnan(month))
+        stamps = np.full(len(df), np.datetime64("NaT"), dtype="datetime64[M]")
+        stamps[ok] = ((year[ok] - 1970) * 12 + (month[ok] - 1)).astype("int64").astype("datetime64[M]")
+        return pd.Series(stamps.astype("datetime64[ns]"), index=df.index)
+    if 'date' in df.columns:
+        return pd.to_datetime(df['date'], errors="coerce")
+    return None
+
+
+@dataclass(frozen=True)
+class MonthlyPanel:
+    """
+    values[m, d] is the total for month months[m] and disease keys[d].
+    first[d]/last[d] are the first and last month that disease has rows for;
+    months in between without rows count as 0 (like a resample sum).
+    """
+    months: pd.DatetimeIndex
+    keys: list
+    values: np.ndarray
+    first: np.ndarray
+    last: np.ndarray
+
+    @classmethod
+    def build(cls, keys, ds, y):
+        """keys: disease per row (categorical is used as is), ds: month per row, y: value per row."""
+        keys = pd.Series(keys)
+        if isinstance(keys.dtype, pd.CategoricalDtype):
+            codes, uniques = keys.cat.codes.to_numpy(), keys.cat.categories
+        else:
+            codes, uniques = pd.factorize(keys, sort=False)
+        ds = pd.to_datetime(pd.Series(ds)).to_numpy()
+        y = pd.to_numeric(pd.Series(y), errors="coerce").to_numpy()
+        ok = ~pd.isna(ds) & (codes >= 0)
+        codes, ds, y = codes[ok], ds[ok], y[ok]
+        if len(codes) == 0:
+            empty = np.empty(0, dtype=int)
+            return cls(pd.DatetimeIndex([]), [], np.empty((0, 0)), empty, empty)
+
+        # Order diseases by first appearance, like groupby(sort=False)
+        present, first_row = np.unique(codes, return_index=True)
+        order = present[np.argsort(first_row)]
+        rank = np.full(len(uniques), -1)
+        rank[order] = np.arange(len(order))
+        codes, uniques = rank[codes], [uniques[i] for i in order]
+        month_idx = ds.astype("datetime64[M]").astype("int64")
+        start = month_idx.min()
+        month_idx = month_idx - start
+        n_m, n_d = int(month_idx.max()) + 1, len(uniques)
+
+        flat = codes * n_m + month_idx
+        totals = np.bincount(flat, weights=np.nan_to_num(y.astype(float)), minlength=n_d * n_m)
+        seen = np.bincount(flat, minlength=n_d * n_m).reshape(n_d, n_m) > 0
+        values = totals.reshape(n_d, n_m).T
+        if np.issubdtype(y.dtype, np.integer):
+            values = np.rint(values).astype(np.int64)
+
+        months = pd.DatetimeIndex(np.arange(start, start + n_m).astype("datetime64[M]").astype("datetime64[ns]"))
+        first = seen.argmax(axis=1)
+        last = n_m - 1 - seen[:, ::-1].argmax(axis=1)
+        return cls(months, list(uniques), values, first, last)
+
+    def frame(self):
+        """month x disease DataFrame (the whole range for every disease)."""
+        return pd.DataFrame(self.values, index=self.months, columns=self.keys)
+
+    def series(self, key):
+        """ds/y frame for one disease over its own first..last months."""
+        d = self.keys.index(key)
+        lo, hi = int(self.first[d]), int(self.last[d]) + 1
+        return pd.DataFrame({"ds": self.months[lo:hi], "y": self.values[lo:hi, d]})
+
+    def partitions(self):
+        return {key: self.series(key) for key in self.keys}
+
+    def tails(self, k=3):
+        """
+        (diseases x k) array of each disease's last k values, oldest first,
+        padded with its first value when the history is shorter: one gather.
+        """
+        if not self.keys:
+            return np.empty((0, k))
+        offsets = np.arange(-k + 1, 1)
+        idx = np.maximum(self.last[:, None] + offsets[None, :], self.first[:, None])
+        return self.values[idx, np.arange(len(self.keys))[:, None]].astype(float)
@@ -0,0 +1,284 @@
+"""
+Production serving pieces for forecasting_agent.
+
+- ProcessLock: a non-blocking flock on a file. Under a pre-fork server
+  every worker tries it; the one that gets it runs the scheduler, and if that
+  worker dies the kernel drops the lock and another worker takes over.
+- ScanQueue: one scan thread per process. A scan requested while one is
+  queued is merged into it; one requested while a scan runs is queued once
+  (at most one running + one queued). A scan already running in another
+  worker process is rejected.
+- LoadShedder: caps concurrent requests per worker; beyond the cap requests
+  get 503 + Retry-After straight away instead of queueing up. gthread
+  never runs more than WEB_THREADS requests in a worker at once, so the cap
+  is one below that: shedding starts while a thread is still free for
+  health checks.
+- PredictionPool: a per-request timeout around live inference, so a slow
+  prediction returns 504 instead of holding the client. It is a thread pool
+  in the worker process: the work still shares the GIL with the request
+  threads, and a timed-out prediction keeps running to the end (stats()
+  reports the threads it holds as busy).
+"""
+
+import itertools
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server, every lock succeeds
+    fcntl = None
+
+from metrics import propagate
+
+LOCK_DIR = os.getenv("MEDLYF_LOCK_DIR", tempfile.gettempdir())
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))  # gunicorn.conf.py: threads per worker
+
+
+def inflight_cap(threads, requested=None):
+    """Concurrent requests a worker with `threads` threads admits (a cap above threads - 1 never sheds)."""
+    limit = max(1, threads - 1)
+    return limit if requested is None else min(requested, limit)
+
+
+MAX_INFLIGHT = inflight_cap(WEB_THREADS, int(os.environ["MAX_INFLIGHT"]) if "MAX_INFLIGHT" in os.environ else None)
+PREDICT_WORKERS = int(os.getenv("PREDICT_WORKERS", "4"))
+PREDICT_TIMEOUT_S = float(os.getenv("PREDICT_TIMEOUT_S", "30"))
+SHED_RETRY_AFTER_S = int(os.getenv("SHED_RETRY_AFTER_S", "1"))
+
+
+class PredictionTimeout(Exception):
+    """Live inference took longer than the request timeout."""
+
+
+class ProcessLock:
+    """Exclusive, non-blocking lock shared by every process on the host."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._fd = None
+        self._guard = threading.Lock()
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def acquire(self):
+        """True if this process now holds the lock."""
+        with self._guard:
+            if self._fd is not None:
+                return True
+            if fcntl is None:
+                self._fd = -1
+                return True
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+            self._fd = fd
+            return True
+
+    def release(self):
+        with self._guard:
+            fd, self._fd = self._fd, None
+            if fd is not None and fd >= 0:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def holder(self):
+        """PID written by the current holder, if any."""
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+
+def lock_path(name):
+    return os.path.join(LOCK_DIR, f"medlyf-{name}.lock")
+
+
+class ScanQueue:
+    """
+    Runs `run(full=...)` on a background thread, deduplicating requests. A
+    job is full if any request merged into it asked for a full scan.
+    """
+
+    def __init__(self, run, lock=None, history=20):
+        self.run = run
+        self.lock = lock  # optional ProcessLock held while a scan runs
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._queued = None
+        self._running = None
+        self._thread = None
+        self.history = deque(maxlen=history)
+        self.counts = {"submitted": 0, "merged": 0, "rejected": 0, "completed": 0, "failed": 0}
+
+    def submit(self, source="api", full=False):
+        """
+        Returns (job, status); status is "queued", "merged" (an existing queued
+        scan covers this request) or "rejected" (another process is scanning).
+        """
+        with self._cond:
+            if self._queued is not None:
+                self._queued["merged"] += 1
+                self._queued["full"] = self._queued["full"] or full
+                self.counts["merged"] += 1
+                return dict(self._queued), "merged"
+            if self._running is None and self.lock is not None and not self.lock.held:
+                if not self.lock.acquire():
+                    self.counts["rejected"] += 1
+                    return {"state": "running_elsewhere", "holder_pid": self.lock.holder()}, "rejected"
+                self.lock.release()
+            job = {
+                "id": next(self._ids), "state": "queued", "source": source, "merged": 0, "full": full,
+                "submitted_at": datetime.now().isoformat(), "started_at": None, "finished_at": None, "error": None,
+            }
+            self._queued = job
+            self.counts["submitted"] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="scan-queue", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return dict(job), "queued"
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._queued is None:
+                    self._cond.wait()
+                job, self._queued = self._queued, None
+                self._running = job
+                job["state"] = "running"
+                job["started_at"] = datetime.now().isoformat()
+
+            if self.lock is not None and not self.lock.acquire():
+                job["state"], job["error"] = "rejected", "scan running in another process"
+                self.counts["rejected"] += 1
+            else:
+                try:
+                    self.run(full=job["full"])
+                    job["state"] = "completed"
+                    self.counts["completed"] += 1
+                except Exception as e:
+                    job["state"], job["error"] = "failed", str(e)
+                    self.counts["failed"] += 1
+                finally:
+                    if self.lock is not None:
+                        self.lock.release()
+
+            with self._cond:
+                job["finished_at"] = datetime.now().isoformat()
+                self._running = None
+                self.history.append(job)
+                self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Blocks until nothing is queued or running; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queued is not None or self._running is not None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def status(self):
+        with self._cond:
+            return {
+                "running": dict(self._running) if self._running else None,
+                "queued": dict(self._queued) if self._queued else None,
+                "recent": [dict(j) for j in self.history],
+                **self.counts,
+            }
+
+
+class LoadShedder:
+    """Counts in-flight requests; try_enter() is False once max_inflight is reached."""
+
+    def __init__(self, max_inflight=MAX_INFLIGHT):
+        self.max_inflight = max_inflight
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.peak = 0
+        self.accepted = 0
+        self.shed = 0
+
+    def try_enter(self):
+        with self._lock:
+            if self.max_inflight > 0 and self.inflight >= self.max_inflight:
+                self.shed += 1
+                return False
+            self.inflight += 1
+            self.accepted += 1
+            self.peak = max(self.peak, self.inflight)
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.inflight = max(0, self.inflight - 1)
+
+    def stats(self):
+        with self._lock:
+            return {"max_inflight": self.max_inflight, "inflight": self.inflight, "peak": self.peak,
+                    "accepted": self.accepted, "shed": self.shed}
+
+
+class PredictionPool:
+    """
+    Timeout wrapper for live predictions. They run on a small thread pool;
+    one that times out can't be stopped and holds its thread until it
+    finishes, so the pool size also bounds how much abandoned work can pile
+    up ("busy" counts those threads too).
+    """
+
+    def __init__(self, workers=PREDICT_WORKERS, timeout_s=PREDICT_TIMEOUT_S):
+        self.workers = workers
+        self.timeout_s = timeout_s
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="predict")
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.timeouts = 0
+        self.busy = 0
+
+    def _tracked(self, fn):
+        def run(*args):
+            with self._lock:
+                self.busy += 1
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.busy -= 1
+        return run
+
+    def run(self, fn, *args, timeout_s=None):
+        """fn(*args) on the pool; raises PredictionTimeout after timeout_s."""
+        timeout_s = self.timeout_s if timeout_s is None else timeout_s
+        with self._lock:
+            self.calls += 1
+        future = self._executor.submit(self._tracked(propagate(fn)), *args)  # a request being profiled follows fn
+        try:
+            return future.result(timeout=timeout_s)
+        except FutureTimeout:
+            future.cancel()  # only helps if it hasn't started yet
+            with self._lock:
+                self.timeouts += 1
+            raise PredictionTimeout(f"prediction took longer than {timeout_s:.0f}s") from None
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "timeout_s": self.timeout_s, "calls": self.calls,
+                    "timeouts": self.timeouts, "busy": self.busy}
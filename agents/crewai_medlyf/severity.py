@@ -0,0 +1,74 @@
+"""
+Vectorized severity scoring for the RandomForest + LabelEncoder pair.
+
+The features of every (disease, horizon) row of a scan are built from one
+array of the diseases' last three months (MonthlyPanel.tails()) and their
+forecasts, with no per-row Python; the matrix goes through a single
+predict_proba call, labels come from the argmax of those probabilities and
+are decoded with one inverse_transform.
+"""
+
+import numpy as np
+import pandas as pd
+
+from metrics import timed
+
+FEATURE_COLUMNS = ['lag_1', 'lag_2', 'lag_3', 'roll_mean_3', 'roll_std_3', 'month_num']
+UNKNOWN = ("Unknown", 0.0)
+
+
+def features_from_tails(tails, month_nums):
+    """
+    Vectorized FEATURE_COLUMNS for a (rows x 3) array of the last three
+    values (oldest -> newest) and the target month of each row.
+    """
+    tails = np.asarray(tails, dtype=float).reshape(-1, 3)
+    out = np.empty((len(tails), len(FEATURE_COLUMNS)))
+    out[:, 0:3] = tails[:, ::-1]
+    out[:, 3] = tails.mean(axis=1)
+    out[:, 4] = tails.std(axis=1, ddof=1)
+    out[:, 5] = month_nums
+    return out
+
+
+def horizon_tails(tails, forecasts):
+    """
+    (rows x horizons x 3) windows: horizon h sees the last three of the real
+    tail followed by the forecasts for months 1..h-1. `tails` is (rows x 3),
+    oldest first (MonthlyPanel.tails()), `forecasts` is (rows x horizons).
+    """
+    tails = np.asarray(tails, dtype=float).reshape(-1, 3)
+    forecasts = np.asarray(forecasts, dtype=float).reshape(len(tails), -1)
+    combined = np.hstack((tails, forecasts))
+    return np.lib.stride_tricks.sliding_window_view(combined, 3, axis=1)[:, :forecasts.shape[1]]
+
+
+def score(clf, label_encoder, features):
+    """Returns [(severity_label, confidence)] for every row of `features`."""
+    if clf is None or features is None or len(features) == 0:
+        return []
+    with timed("rf_predict"):
+        proba = clf.predict_proba(features)
+    best = proba.argmax(axis=1)
+    codes = np.asarray(clf.classes_)[best]
+    labels = label_encoder.inverse_transform(codes) if label_encoder is not None else codes
+    confidences = proba[np.arange(len(best)), best]
+    return [(str(label), float(conf)) for label, conf in zip(labels, confidences)]
+
+
+def score_tails(clf, label_encoder, tails, month_nums):
+    """
+    Scores every (tail, month) row in one call; all rows come back as
+    ("Unknown", 0.0) if the model is missing or fails.
+    """
+    n = len(month_nums)
+    if n == 0:
+        return []
+    try:
+        features = pd.DataFrame(features_from_tails(tails, month_nums), columns=FEATURE_COLUMNS)
+        features['month_num'] = features['month_num'].astype(int)
+        scored = score(clf, label_encoder, features)
+    except Exception as e:
+        print(f"   ⚠️ Severity scoring failed: {e}")
+        scored = []
+    return scored or [UNKNOWN] * n
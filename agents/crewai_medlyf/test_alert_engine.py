@@ -0,0 +1,78 @@
+import asyncio
+
+from alert_engine import AlertEngine, DedupCache, digest
+
+
+class Clock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def make_engine(clock, **kwargs):
+    sent = []
+
+    async def send(recipient, alerts):
+        sent.append((recipient, [a["hospital_id"] for a in alerts]))
+
+    kwargs = {"dedup_ttl_s": 60, "window_s": 10, "rate_per_min": 1, "burst": 1, **kwargs}
+    return AlertEngine(send, clock=clock, **kwargs), sent
+
+
+def test_dedup_entries_expire_after_ttl():
+    clock = Clock()
+    cache = DedupCache(60, clock)
+    assert not cache.seen(("H1", "occupancy"))
+    assert cache.seen(("H1", "occupancy"))
+    assert not cache.seen(("H1", "plan"))
+    clock.t += 61
+    assert not cache.seen(("H2", "occupancy"))
+    assert len(cache) == 1  # both H1 entries evicted
+    assert not cache.seen(("H1", "occupancy"))
+
+
+def test_surge_becomes_one_digest_per_recipient():
+    clock = Clock()
+
+    async def main():
+        engine, sent = make_engine(clock)
+        for i in range(20):
+            for _ in range(3):  # every hospital uploads three times
+                engine.submit(f"H{i}", "occupancy", "over capacity", ["admin", "ops"])
+        await engine.flush()
+        return engine, sent
+
+    engine, sent = asyncio.run(main())
+    assert sorted(r for r, _ in sent) == ["admin", "ops"]
+    assert all(len(hospitals) == 20 for _, hospitals in sent)
+    stats = engine.stats()
+    assert stats["queued"] == 20 and stats["deduped"] == 40 and stats["sent"] == 40 and stats["pending"] == 0
+
+    alerts = [{"hospital_id": f"H{i}", "kind": "plan", "message": "m", "severity": "high"} for i in range(5)]
+    hospital_id, message, severity = digest(alerts, limit=2)
+    assert hospital_id == "city" and severity == "high"
+    assert message.startswith("5 alerts for 5 hospitals") and "and 3 more" in message
+
+
+def test_rate_limited_recipient_gets_merged_digest_later():
+    clock = Clock()
+
+    async def main():
+        engine, sent = make_engine(clock, dedup_ttl_s=0)
+        engine.submit("H1", "occupancy", "m", ["admin"])
+        await engine.flush()
+        engine.submit("H2", "occupancy", "m", ["admin"])
+        await engine.flush()  # no token left: waits
+        engine.submit("H3", "occupancy", "m", ["admin"])
+        await engine.flush()
+        assert sent == [("admin", ["H1"])]
+        clock.t += 60  # one token per minute
+        await engine.flush()
+        await engine.drain()
+        return engine, sent
+
+    engine, sent = asyncio.run(main())
+    assert sent == [("admin", ["H1"]), ("admin", ["H2", "H3"])]
+    assert engine.stats()["rate_limited"] == 2
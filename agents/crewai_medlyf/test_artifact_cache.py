@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import tarfile
+
+import joblib
+
+from artifact_cache import ArtifactCache, lfs_pointer, read_manifest, verify_folder
+from model_registry import ModelRegistry, is_model_file
+
+
+def make_upstream(path):
+    """Real model files plus a checkout of the same repo holding only LFS pointers."""
+    real, checkout = path / "upstream", path / "checkout"
+    real.mkdir()
+    checkout.mkdir()
+    joblib.dump(["high", "low"], real / "label_encoder.joblib")
+    for name in ("Malaria", "HIV_AIDS"):
+        joblib.dump({"name": name}, real / f"prophet_{name}.pkl")
+    for f in real.iterdir():
+        data = f.read_bytes()
+        (checkout / f.name).write_text("version https://git-lfs.github.com/spec/v1\n"
+                                       f"oid sha256:{hashlib.sha256(data).hexdigest()}\nsize {len(data)}\n")
+    return real, checkout
+
+
+def test_pointers_resolve_from_a_tarball_and_are_never_unpickled(tmp_path):
+    real, checkout = make_upstream(tmp_path)
+    assert lfs_pointer(checkout / "prophet_Malaria.pkl")["size"] == (real / "prophet_Malaria.pkl").stat().st_size
+    assert lfs_pointer(real / "prophet_Malaria.pkl") is None
+    # A pointer nobody can serve stays a pointer and is left out of the models
+    (checkout / "prophet_Measles.pkl").write_text("version https://git-lfs.github.com/spec/v1\n"
+                                                 f"oid sha256:{'0' * 64}\nsize 10\n")
+    tarball = tmp_path / "models.tar.gz"
+    with tarfile.open(tarball, "w:gz") as tar:
+        tar.add(real, arcname="models")
+
+    registry = ModelRegistry(str(checkout))
+    registry.artifacts = ArtifactCache(str(tmp_path / "cache"))
+    registry.sources = [str(tarball)]
+    assert registry.find_prophet("malaria") == {"name": "Malaria"}
+    assert sorted(registry.prophet) == ["hiv aids", "malaria"]
+    report = registry.stats()["artifacts"]
+    assert report["unusable"] == ["prophet_Measles.pkl"]
+    assert report["files"]["label_encoder.joblib"] == f"fetched:{tarball}"
+    assert (checkout / "label_encoder.joblib").read_bytes() == (real / "label_encoder.joblib").read_bytes()
+
+
+def test_corrupt_copies_are_rejected_and_repaired(tmp_path):
+    real, checkout = make_upstream(tmp_path)
+    bad = tmp_path / "bad"
+    bad.mkdir()
+    for f in real.iterdir():
+        (bad / f.name).write_bytes(f.read_bytes()[:-1] + b"x")  # same size, wrong hash
+
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    report = cache.resolve(str(checkout), [str(bad), str(real)], want=is_model_file)
+    assert set(report["files"].values()) == {f"fetched:{real}"}
+    assert len(report["corrupt_sources"]) == 3
+
+    # The pointers are gone now, but their pins were kept in manifest.json
+    assert read_manifest(str(checkout)) == json.loads((checkout / "manifest.json").read_text())
+    (checkout / "prophet_HIV_AIDS.pkl").write_bytes(b"truncated")
+    report = cache.resolve(str(checkout), [], want=is_model_file)
+    assert report["files"]["prophet_HIV_AIDS.pkl"] == "repaired:cache"
+    assert joblib.load(checkout / "prophet_HIV_AIDS.pkl") == {"name": "HIV_AIDS"}
+
+
+def test_prewarmed_cache_serves_an_air_gapped_node(tmp_path):
+    real, checkout = make_upstream(tmp_path)
+    shared = ArtifactCache(str(tmp_path / "shared"))
+    warmed = shared.prewarm(str(checkout), [str(real)], want=is_model_file)
+    assert warmed["missing"] == [] and len(warmed["files"]) == 3
+
+    # No sources at all: everything comes from the shared cache
+    report = shared.resolve(str(checkout), [], want=is_model_file)
+    assert report["unusable"] == [] and set(report["files"].values()) == {"fetched:cache"}
+    # Second start: files are real and verified, nothing is copied
+    assert set(shared.resolve(str(checkout), [], want=is_model_file)["files"].values()) == {"ok"}
+
+    empty = tmp_path / "fresh"
+    shared.resolve(str(empty), [str(real)], want=is_model_file)  # bootstrap from a directory
+    assert sorted(os.listdir(empty)) == sorted([*os.listdir(real), "manifest.json"])
+
+
+def test_verify_reports_mismatches_without_touching_the_folder(tmp_path):
+    real, checkout = make_upstream(tmp_path)
+    ArtifactCache(str(tmp_path / "cache")).resolve(str(checkout), [str(real)], want=is_model_file)
+    assert set(verify_folder(str(checkout), is_model_file)["files"].values()) == {"ok"}
+
+    (checkout / "prophet_HIV_AIDS.pkl").write_bytes(b"truncated")
+    (checkout / "prophet_Malaria.pkl").unlink()
+    before = {f.name: f.read_bytes() for f in checkout.iterdir()}
+    report = verify_folder(str(checkout), is_model_file)
+    assert report["mismatched"] == ["prophet_HIV_AIDS.pkl", "prophet_Malaria.pkl"]
+    assert report["files"]["prophet_Malaria.pkl"] == "missing"
+    assert report["files"]["prophet_HIV_AIDS.pkl"] == "corrupt"
+    assert {f.name: f.read_bytes() for f in checkout.iterdir()} == before
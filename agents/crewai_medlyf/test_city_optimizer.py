@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from city_optimizer import CityOptimizer, match_uniform, plan_city, solve_transport
+
+
+def test_uniform_matching_moves_surplus_to_deficits_in_one_pass():
+    actions, summary = plan_city(["a", "b", "c", "d"], [100, 60, 95, 40], capacity=80, reserve=0.1)
+    transfers = {(a["from"], a["to"]): a["amount"] for a in actions if a["action"] == "transfer"}
+    assert transfers == {("b", "a"): 12.0, ("d", "a"): 8.0, ("d", "c"): 15.0}
+    assert summary["unmet"] == 0 and summary["tankers"] == 0
+
+
+def test_uncovered_deficit_becomes_tankers():
+    actions, summary = plan_city(["a", "b"], [125, 70], capacity=80, reserve=0.0)
+    tanker = [a for a in actions if a["action"] == "request_tanker"]
+    assert tanker == [{"action": "request_tanker", "hospital_id": "a", "quantity": 4,
+                       "reason": "unmet predicted demand 35.0 above capacity after transfers"}]
+    assert summary["transferred"] == 10
+
+
+def test_uniform_matching_conserves_every_unit():
+    rng = np.random.default_rng(1)
+    deficit = np.where(rng.random(500) < 0.5, rng.uniform(0, 20, 500), 0)
+    surplus = np.where(deficit == 0, rng.uniform(0, 20, 500), 0)
+    donor, receiver, amount, unmet = match_uniform(deficit, surplus)
+    assert np.allclose(np.bincount(receiver, amount, 500) + unmet, deficit)
+    assert np.all(np.bincount(donor, amount, 500) <= surplus + 1e-9)
+    assert amount.sum() == pytest.approx(min(deficit.sum(), surplus.sum()))
+
+
+def test_lp_prefers_nearby_donors_and_tankers_over_long_transfers():
+    pytest.importorskip("scipy")
+    xy = np.array([[0.0, 0.0], [1.0, 0.0], [30.0, 0.0], [200.0, 0.0]])
+    deficit = np.array([10.0, 0.0, 0.0, 0.0])
+    surplus = np.array([0.0, 4.0, 20.0, 50.0])
+    donor, receiver, amount, unmet = solve_transport(deficit, surplus, xy, neighbours=3, tanker_cost=50)
+    flows = dict(zip(donor.tolist(), amount.tolist()))
+    # 4 from 1km away, the rest from 30km; 200km costs more than a tanker
+    assert flows == pytest.approx({1: 4.0, 2: 6.0})
+    assert unmet.sum() == pytest.approx(0.0)
+
+
+def test_optimizer_keeps_latest_forecast_per_hospital_and_expires_old_ones():
+    clock = [1000.0]
+    opt = CityOptimizer(capacity=80, max_age_s=60, clock=lambda: clock[0], reserve=0.0)
+    opt.observe("a", [{"yhat": 70}, {"yhat": 90}])
+    opt.observe("b", [{"yhat": 50}])
+    opt.observe("a", [{"yhat": 85}])
+    ids, peaks, _, coords = opt.snapshot()
+    assert ids == ["a", "b"] and peaks.tolist() == [85.0, 50.0] and coords is None
+    clock[0] += 120
+    opt.observe("c", [{"yhat": 95}], location={"lat": 19.07, "lng": 72.87})
+    actions, summary = opt.plan()
+    assert summary["hospitals"] == 1 and summary["method"] == "lp"
+    assert actions[0]["hospital_id"] == "c" and actions[0]["quantity"] == 2
+
+
+def test_consecutive_windows_do_not_repeat_dispatched_actions():
+    opt = CityOptimizer(capacity=80, reserve=0.0, tanker_capacity=10)
+    opt.observe("a", [{"yhat": 120}])  # 40 over: 30 from b, a tanker for the rest
+    opt.observe("b", [{"yhat": 50}])
+    first, _ = opt.plan()
+    assert sorted(a["action"] for a in first) == ["request_tanker", "transfer"]
+    opt.dispatched(first)
+
+    opt.observe("c", [{"yhat": 60}])  # another hospital uploads
+    opt.observe("b", [{"yhat": 50}])  # and b re-uploads the same forecast
+    second, summary = opt.plan()
+    assert second == [] and summary["already_covered"] == 1
+
+    opt.observe("d", [{"yhat": 95}])  # a new deficit can't use b's promised surplus
+    third, _ = opt.plan()
+    assert [(a["action"], a.get("from"), a["hospital_id"]) for a in third] == [("transfer", "c", "d")]
+    opt.dispatched(third)
+
+    opt.observe("a", [{"yhat": 85}])  # a's forecast changes: it is planned again
+    fourth, _ = opt.plan()
+    assert fourth and all(a["hospital_id"] == "a" for a in fourth)
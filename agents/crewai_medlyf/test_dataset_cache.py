@@ -0,0 +1,66 @@
+import os
+import threading
+
+from dataset_cache import DatasetCache, normalize_disease_name
+
+CSV = """year,month,disease,condition,reported_cases
+2020,Jan,COVID-19,medium,5000
+2020,Jan,HIV/AIDS,low,500
+2020,Feb,COVID-19,high,7000
+2020,Feb,HIV/AIDS,low,450
+"""
+
+
+def write_csv(path, text, mtime_ns=None):
+    path.write_text(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_partitions_are_monthly_ds_y_series(tmp_path):
+    path = tmp_path / "data.csv"
+    write_csv(path, CSV)
+    snap = DatasetCache(str(path)).get()
+
+    assert snap.diseases == ["COVID-19", "HIV/AIDS"]
+    covid = snap.series("covid-19")
+    assert list(covid.columns) == ["ds", "y"]
+    assert covid["y"].tolist() == [5000, 7000]
+    assert str(covid["ds"].iloc[-1].date()) == "2020-02-01"
+    assert snap.series("HIV/AIDS") is snap.partitions[normalize_disease_name("HIV/AIDS")]
+
+
+def test_hit_miss_and_reload_on_change(tmp_path):
+    path = tmp_path / "data.csv"
+    write_csv(path, CSV, mtime_ns=1_000_000_000)
+    cache = DatasetCache(str(path))
+
+    first = cache.get()
+    assert cache.get() is first
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    write_csv(path, CSV + "2020,Mar,COVID-19,high,9000\n", mtime_ns=2_000_000_000)
+    second = cache.get()
+    assert second is not first
+    assert second.series("covid 19")["y"].tolist() == [5000, 7000, 9000]
+    assert cache.stats()["reloads"] == 1
+
+
+def test_concurrent_readers_parse_once(tmp_path):
+    path = tmp_path / "data.csv"
+    write_csv(path, CSV)
+    cache = DatasetCache(str(path))
+    seen = []
+
+    def reader():
+        seen.append(cache.get())
+
+    threads = [threading.Thread(target=reader) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len({id(s) for s in seen}) == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 15
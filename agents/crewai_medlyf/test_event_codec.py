@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import fakeredis
+import numpy as np
+import pandas as pd
+import pytest
+
+from event_codec import EVENT_CODEC, EventError, decode, encode
+from event_dispatcher import EventDispatcher
+from event_transport import StreamTransport
+
+EVENT = {
+    "event_type": "prediction_ready",
+    "ts": "2024-03-01T00:00:00Z",
+    "hospital_id": "H1",
+    "predictions": [
+        {"ds": "2024-03-02", "yhat": 71.5, "yhat_lower": 65.0, "yhat_upper": 78.0},
+        {"ds": "2024-03-03", "yhat": 73.0, "yhat_lower": 66.0, "yhat_upper": 80.0},
+    ],
+    "model_meta": {"model": "prophet", "trained_rows": 120},
+}
+
+
+@pytest.mark.parametrize("codec", ["msgpack", "json", "v1"])
+def test_round_trip_in_every_codec(codec):
+    wire = encode(EVENT, codec)
+    assert decode(wire) == EVENT
+    if codec != "v1":
+        assert len(wire) < len(json.dumps(EVENT))
+
+
+def test_pandas_values_and_legacy_events_decode():
+    event = dict(EVENT, predictions=[{"ds": pd.Timestamp("2024-03-02"), "yhat": np.float64(71.5)}],
+                 model_meta={"trained_rows": np.int64(120)})
+    assert decode(encode(event, "msgpack"))["predictions"] == [{"ds": "2024-03-02", "yhat": 71.5}]
+    assert decode(encode(event, "msgpack"))["model_meta"] == {"trained_rows": 120}
+    # Events from producers that predate the codec: plain JSON text, no version
+    legacy = json.dumps({"event_type": "data_uploaded", "hospital_id": "H2", "file_path": "/tmp/h2.csv"})
+    assert decode(legacy)["file_path"] == "/tmp/h2.csv"
+    assert decode(legacy.encode())["hospital_id"] == "H2"
+
+
+def test_producers_default_to_v1_for_old_consumers():
+    assert EVENT_CODEC == "v1"
+    assert json.loads(encode(EVENT)) == EVENT  # what a v1-only consumer parses
+
+
+@pytest.mark.parametrize("codec", ["msgpack", "json"])
+def test_keys_from_later_rows_and_text_fields_survive_v2(codec):
+    event = dict(EVENT, predictions=[
+        {"ds": "2024-03-02", "yhat": 71.5, "disease": "Malaria"},
+        {"ds": "2024-03-03", "yhat": 73.0, "disease": "Malaria", "yhat_lower": 66.0},
+    ])
+    assert decode(encode(event, codec))["predictions"] == [
+        {"ds": "2024-03-02", "yhat": 71.5, "disease": "Malaria", "yhat_lower": None},
+        {"ds": "2024-03-03", "yhat": 73.0, "disease": "Malaria", "yhat_lower": 66.0},
+    ]
+
+
+def test_invalid_events_are_rejected():
+    with pytest.raises(EventError):
+        encode({"event_type": "alert_sent", "hospital_id": "H1"})  # no message
+    with pytest.raises(EventError):
+        decode(json.dumps({"event_type": "alert_sent", "hospital_id": "H1", "message": "x", "v": 3}))
+    with pytest.raises(EventError):
+        decode(json.dumps(dict(EVENT, v=2, predictions={"ds": [0, 86400], "yhat": [1.0]})))
+    with pytest.raises(EventError):
+        decode(b"\x93\x01\x02")  # msgpack, but not an object
+    with pytest.raises(EventError):
+        decode("not json")
+
+
+def test_msgpack_events_through_a_stream_with_raw_responses():
+    seen = []
+
+    async def handler(payload):
+        seen.append(payload)
+
+    async def main():
+        r = fakeredis.FakeAsyncRedis(decode_responses=False)
+        producer = StreamTransport(r, "events", "crew", encode=lambda e: encode(e, "msgpack"))
+        await producer.ensure_group()
+        await producer.publish(EVENT)
+
+        consumer = StreamTransport(r, "events", "crew", consumer="c1", block_ms=20)
+        dispatcher = EventDispatcher({"prediction_ready": [handler]})
+        task = asyncio.create_task(consumer.consume(dispatcher.dispatch, decode))
+        await asyncio.sleep(0.2)
+        await dispatcher.join()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await dispatcher.close()
+        return consumer
+
+    consumer = asyncio.run(main())
+    assert seen == [EVENT] and consumer.acked == 1
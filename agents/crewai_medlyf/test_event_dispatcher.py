@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+from event_dispatcher import EventDispatcher, event_age_s
+
+
+def test_same_hospital_in_order_different_hospitals_concurrent():
+    seen = []
+
+    async def slow_handler(payload):
+        await asyncio.sleep(0.05)
+        seen.append((payload["hospital_id"], payload["seq"]))
+
+    async def main():
+        d = EventDispatcher({"data_uploaded": [slow_handler]}, lanes=8)
+        start = time.perf_counter()
+        for seq in range(3):
+            for hid in ("h1", "h2", "h3"):
+                await d.dispatch({"event_type": "data_uploaded", "hospital_id": hid, "seq": seq})
+        await d.join()
+        elapsed = time.perf_counter() - start
+        stats = d.stats()
+        await d.close()
+        return elapsed, stats
+
+    elapsed, stats = asyncio.run(main())
+    for hid in ("h1", "h2", "h3"):
+        assert [s for h, s in seen if h == hid] == [0, 1, 2]
+    # 9 events x 50 ms serially would take 450 ms
+    assert elapsed < 0.35
+    assert stats["event_types"]["data_uploaded"]["handled"] == 9
+
+
+def test_full_lane_applies_backpressure_and_failures_are_counted():
+    release = asyncio.Event()
+
+    async def blocked(payload):
+        await release.wait()
+        if payload.get("boom"):
+            raise RuntimeError("boom")
+
+    async def main():
+        d = EventDispatcher({"prediction_ready": [blocked]}, lanes=1, queue_size=1)
+        await d.dispatch({"event_type": "prediction_ready", "hospital_id": "h1"})
+        await asyncio.sleep(0)  # worker takes the first event
+        await d.dispatch({"event_type": "prediction_ready", "hospital_id": "h1", "boom": True})
+        third = asyncio.create_task(d.dispatch({"event_type": "prediction_ready", "hospital_id": "h1"}))
+        await asyncio.sleep(0.05)
+        waiting = not third.done()
+        depth = d.stats()["event_types"]["prediction_ready"]["queue_depth"]
+        release.set()
+        await third
+        await d.join()
+        stats = d.stats()
+        await d.close()
+        return waiting, depth, stats
+
+    waiting, depth, stats = asyncio.run(main())
+    assert waiting and depth == 1
+    assert stats["blocked_dispatches"] == 1
+    assert stats["event_types"]["prediction_ready"]["failed"] == 1
+    assert stats["event_types"]["prediction_ready"]["handled"] == 2
+
+
+def test_event_age_from_crew_timestamp():
+    assert event_age_s({"ts": "2025-01-01T00:00:00Z"}) > 0
+    assert event_age_s({}) is None
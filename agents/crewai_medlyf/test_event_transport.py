@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+import fakeredis
+
+from event_dispatcher import EventDispatcher
+from event_transport import StreamTransport
+
+
+def decode(data):
+    return json.loads(data)
+
+
+async def consume_for(transport, dispatcher, seconds=0.2):
+    task = asyncio.create_task(transport.consume(dispatcher.dispatch, decode))
+    await asyncio.sleep(seconds)
+    await dispatcher.join()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def test_events_published_while_down_are_delivered_and_acked():
+    seen = []
+
+    async def handler(payload):
+        seen.append(payload["hospital_id"])
+
+    async def main():
+        r = fakeredis.FakeAsyncRedis(decode_responses=True)
+        producer = StreamTransport(r, "events", "crew", maxlen=1000)
+        await producer.ensure_group()
+        for hid in ("h1", "h2"):
+            await producer.publish({"event_type": "data_uploaded", "hospital_id": hid})
+
+        consumer = StreamTransport(r, "events", "crew", consumer="c1", block_ms=20)
+        dispatcher = EventDispatcher({"data_uploaded": [handler]})
+        await consume_for(consumer, dispatcher)
+        await dispatcher.close()
+        return consumer, await r.xpending("events", "crew")
+
+    consumer, pending = asyncio.run(main())
+    assert sorted(seen) == ["h1", "h2"]
+    assert consumer.acked == 2 and pending["pending"] == 0
+
+
+def test_failed_entry_stays_pending_and_is_reclaimed_by_another_replica():
+    attempts = []
+
+    async def flaky(payload):
+        attempts.append(payload["hospital_id"])
+        if len(attempts) == 1:
+            raise RuntimeError("crew replica crashed mid-forecast")
+
+    async def main():
+        r = fakeredis.FakeAsyncRedis(decode_responses=True)
+        first = StreamTransport(r, "events", "crew", consumer="c1", block_ms=20)
+        await first.ensure_group()
+        await first.publish({"event_type": "data_uploaded", "hospital_id": "h1"})
+        d1 = EventDispatcher({"data_uploaded": [flaky]})
+        await consume_for(first, d1)
+        await d1.close()
+        assert (await r.xpending("events", "crew"))["pending"] == 1
+
+        second = StreamTransport(r, "events", "crew", consumer="c2", reclaim_idle_ms=0)
+        d2 = EventDispatcher({"data_uploaded": [flaky]})
+        await second.reclaim_once(d2.dispatch, decode)
+        await d2.join()
+        await d2.close()
+        return first, second, await r.xpending("events", "crew")
+
+    first, second, pending = asyncio.run(main())
+    assert attempts == ["h1", "h1"]
+    assert first.nacked == 1 and second.reclaimed == 1 and second.acked == 1
+    assert pending["pending"] == 0
+
+
+def test_poison_entry_goes_to_dead_letter_stream():
+    async def main():
+        r = fakeredis.FakeAsyncRedis(decode_responses=True)
+        t = StreamTransport(r, "events", "crew", consumer="c1", reclaim_idle_ms=0, max_deliveries=0)
+        await t.ensure_group()
+        await t.publish({"event_type": "data_uploaded", "hospital_id": "h9"})
+        await r.xreadgroup("crew", "dead-consumer", {"events": ">"})
+        d = EventDispatcher({"data_uploaded": []})
+        await t.reclaim_once(d.dispatch, decode)
+        await d.close()
+        return t, await r.xlen("events:dead"), await r.xpending("events", "crew")
+
+    t, dead, pending = asyncio.run(main())
+    assert t.dead_lettered == 1 and dead == 1 and pending["pending"] == 0
+
+
+def test_replicas_in_one_group_share_entries_without_duplicates():
+    seen = []
+
+    async def handler(payload):
+        seen.append(payload["i"])
+
+    async def main():
+        r = fakeredis.FakeAsyncRedis(decode_responses=True)
+        replicas = [StreamTransport(r, "events", "crew", consumer=f"c{n}", batch=5, block_ms=20) for n in (1, 2)]
+        await replicas[0].ensure_group()
+        for i in range(40):
+            await replicas[0].publish({"event_type": "data_uploaded", "hospital_id": f"h{i}", "i": i})
+        dispatchers = [EventDispatcher({"data_uploaded": [handler]}) for _ in replicas]
+        await asyncio.gather(*(consume_for(t, d) for t, d in zip(replicas, dispatchers)))
+        for d in dispatchers:
+            await d.close()
+        return replicas
+
+    replicas = asyncio.run(main())
+    assert sorted(seen) == list(range(40))
+    assert all(t.acked > 0 for t in replicas)
+
+
+def test_reclaim_skips_entries_still_being_handled_here():
+    release = asyncio.Event()
+    attempts = []
+
+    async def slow_then_fail(payload):
+        attempts.append(payload["hospital_id"])
+        if len(attempts) == 1:
+            await release.wait()
+            raise RuntimeError("first real failure")
+
+    async def main():
+        r = fakeredis.FakeAsyncRedis(decode_responses=True)
+        t = StreamTransport(r, "events", "crew", consumer="c1", block_ms=20, reclaim_idle_ms=0, max_deliveries=2)
+        await t.ensure_group()
+        await t.publish({"event_type": "data_uploaded", "hospital_id": "h1"})
+        d = EventDispatcher({"data_uploaded": [slow_then_fail]})
+        task = asyncio.create_task(t.consume(d.dispatch, decode))
+        await asyncio.sleep(0.1)
+        for _ in range(3):  # reclaim ticks while the handler is still running
+            await t.reclaim_once(d.dispatch, decode)
+        delivered = (await r.xpending_range("events", "crew", min="-", max="+", count=1))[0]["times_delivered"]
+        release.set()
+        await d.join()
+        await t.reclaim_once(d.dispatch, decode)  # the first failure is retried, not dead-lettered
+        await d.join()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await d.close()
+        return t, delivered
+
+    t, delivered = asyncio.run(main())
+    assert delivered == 1 and attempts == ["h1", "h1"]
+    assert t.dead_lettered == 0 and t.acked == 1
@@ -0,0 +1,56 @@
+import threading
+
+from forecast_table import ForecastTable, materialize
+
+
+def fake_compute(diseases, horizons):
+    out = {}
+    for disease in diseases:
+        if disease == "Unknown":
+            out[disease] = {h: {"error": "No AI model for Unknown"} for h in horizons}
+        else:
+            out[disease] = {h: {"disease": disease, "horizon": h, "predicted_cases": 10 * h} for h in horizons}
+    return out
+
+
+def test_materialize_skips_errors_and_lookup_normalizes_names():
+    rows, by_disease = materialize(["HIV/AIDS", "Unknown"], fake_compute, [1, 2])
+    assert set(rows) == {("HIV/AIDS", 1), ("HIV/AIDS", 2)}
+    assert "error" in by_disease["Unknown"][1]
+
+    table = ForecastTable()
+    table.replace(rows, dataset_version=(1, 2))
+    result, ts = table.lookup("hiv-aids", 2, dataset_version=(1, 2))
+    assert result["predicted_cases"] == 20 and ts is not None
+    assert table.horizons() == [1, 2]
+
+
+def test_unknown_horizon_or_stale_dataset_is_a_miss():
+    table = ForecastTable()
+    table.replace(materialize(["Malaria"], fake_compute, [1])[0], dataset_version=(1, 2))
+
+    assert table.lookup("malaria", 4) is None
+    assert table.lookup("malaria", 1, dataset_version=(9, 9)) is None
+    assert table.stats()["misses"] == 2
+
+
+def test_stale_table_is_rebuilt_once_in_the_background():
+    table = ForecastTable()
+    assert table.refresh_if_stale((1, 2), lambda: None) is None  # empty: startup fills it
+    table.replace(materialize(["Malaria"], fake_compute, [1])[0], dataset_version=(1, 2))
+    assert table.refresh_if_stale((1, 2), lambda: None) is None
+
+    started, release = threading.Event(), threading.Event()
+
+    def rebuild():
+        started.set()
+        release.wait(5)
+        table.replace(materialize(["Malaria"], fake_compute, [1])[0], dataset_version=(3, 4))
+
+    thread = table.refresh_if_stale((3, 4), rebuild)
+    assert started.wait(5)
+    assert table.refresh_if_stale((3, 4), rebuild) is None  # one rebuild at a time
+    release.set()
+    thread.join(5)
+    assert table.lookup("malaria", 1, dataset_version=(3, 4))
+    assert table.stats()["refreshes"] == 1
@@ -0,0 +1,136 @@
+import asyncio
+import json
+
+from aiohttp import web
+
+from http_client import JobBatcher, ServerClient
+
+
+class StubServer:
+    """Local aiohttp server standing in for the Node API."""
+
+    def __init__(self, bulk=True, fail_first=0, fail_status=503, delay_s=0):
+        self.requests = []
+        self.peers = set()
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.delay_s = delay_s
+        self.app = web.Application()
+        self.app.router.add_post("/api/jobs", self.create_job)
+        if bulk:
+            self.app.router.add_post("/api/jobs/bulk", self.create_jobs)
+
+    async def create_job(self, request):
+        self.peers.add(request.transport.get_extra_info("peername"))
+        body = await request.json()
+        self.requests.append(("single", body))  # saved before the reply goes out
+        await asyncio.sleep(self.delay_s)
+        if self.fail_first > 0:
+            self.fail_first -= 1
+            return web.json_response({"error": "busy"}, status=self.fail_status)
+        return web.json_response(dict(body, _id=f"job-{len(self.requests)}"), status=201)
+
+    async def create_jobs(self, request):
+        body = await request.json()
+        self.requests.append(("bulk", body))
+        return web.json_response({"results": [{"status": 201, "job": dict(j, _id=f"job-{i}")} for i, j in enumerate(body["jobs"])]})
+
+    async def __aenter__(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def test_requests_reuse_one_pooled_connection():
+    async def main():
+        async with StubServer() as server:
+            client = ServerClient(server.url)
+            for i in range(10):
+                status, _ = await client.post("/api/jobs", {"hospitalId": f"h{i}"})
+                assert status == 201
+            await client.close()
+            return server, client.stats()
+
+    server, stats = asyncio.run(main())
+    assert len(server.peers) == 1
+    assert stats["/api/jobs"]["requests"] == 10 and stats["/api/jobs"]["p99_ms"] is not None
+
+
+def test_transient_errors_are_retried_then_succeed():
+    async def main():
+        async with StubServer(fail_first=2) as server:
+            client = ServerClient(server.url, max_retries=3, backoff_s=0.001)
+            status, text = await client.post("/api/jobs", {"hospitalId": "h1"})
+            await client.close()
+            return status, text, client.stats()
+
+    status, text, stats = asyncio.run(main())
+    assert status == 201 and json.loads(text)["hospitalId"] == "h1"
+    assert stats["/api/jobs"]["retries"] == 2 and stats["/api/jobs"]["errors"] == 0
+
+
+def test_unreachable_server_reports_500_after_retries():
+    async def main():
+        client = ServerClient("http://127.0.0.1:9", max_retries=1, backoff_s=0.001)
+        result = await client.post("/api/jobs", {})
+        await client.close()
+        return result, client.stats()
+
+    (status, _), stats = asyncio.run(main())
+    assert status == 500 and stats["/api/jobs"]["requests"] == 2
+
+
+def test_failures_after_the_job_may_be_saved_are_not_retried():
+    async def main():
+        out = []
+        async with StubServer(fail_first=1, fail_status=504) as server:
+            client = ServerClient(server.url, max_retries=3, backoff_s=0.001)
+            out.append((await client.post("/api/jobs", {"hospitalId": "h1"}))[0])
+            await client.close()
+            out.append(len(server.requests))
+        async with StubServer(delay_s=0.5) as server:
+            client = ServerClient(server.url, timeout_s=0.1, max_retries=3, backoff_s=0.001)
+            out.append((await client.post("/api/jobs", {"hospitalId": "h2"}))[0])
+            await client.close()
+            out.append(len(server.requests))
+        return out
+
+    assert asyncio.run(main()) == [504, 1, 500, 1]
+
+
+def test_concurrent_jobs_are_coalesced_into_one_bulk_request():
+    async def main():
+        async with StubServer() as server:
+            client = ServerClient(server.url)
+            batcher = JobBatcher(client, window_s=0.02)
+            results = await asyncio.gather(*(batcher.submit({"hospitalId": f"h{i}"}) for i in range(20)))
+            await client.close()
+            return server, batcher, results
+
+    server, batcher, results = asyncio.run(main())
+    assert [kind for kind, _ in server.requests] == ["bulk"]
+    assert [json.loads(text)["hospitalId"] for _, text in results] == [f"h{i}" for i in range(20)]
+    assert all(status == 201 for status, _ in results)
+    assert batcher.stats()["avg_batch"] == 20
+
+
+def test_server_without_bulk_endpoint_gets_jobs_one_by_one():
+    async def main():
+        async with StubServer(bulk=False) as server:
+            client = ServerClient(server.url)
+            batcher = JobBatcher(client, window_s=0.02, max_batch=3)
+            results = await asyncio.gather(*(batcher.submit({"hospitalId": f"h{i}"}) for i in range(3)))
+            await client.close()
+            return server, batcher, results
+
+    server, batcher, results = asyncio.run(main())
+    assert sorted(json.loads(text)["hospitalId"] for _, text in results) == ["h0", "h1", "h2"]
+    assert sum(kind == "single" for kind, _ in server.requests) == 3
+    assert batcher.stats()["bulk_supported"] is False
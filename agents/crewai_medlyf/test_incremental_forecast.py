@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("prophet")
+
+from incremental_forecast import IncrementalForecaster, data_fingerprint
+
+
+def occupancy(days, start="2024-01-01", level=50.0, seed=0):
+    rng = np.random.default_rng(seed)
+    ds = pd.date_range(start, periods=days, freq="D")
+    y = level + 5 * np.sin(2 * np.pi * np.arange(days) / 7) + rng.normal(0, 1, days)
+    return pd.DataFrame({"ds": ds, "y": y})
+
+
+def test_fingerprint_ignores_ds_formatting_but_not_values():
+    df = occupancy(30)
+    as_text = df.assign(ds=df["ds"].dt.strftime("%Y-%m-%d"))
+    assert data_fingerprint(as_text.assign(ds=pd.to_datetime(as_text["ds"]))) == data_fingerprint(df)
+    assert data_fingerprint(df.assign(y=df["y"] + 1)) != data_fingerprint(df)
+
+
+def test_upload_sequence_fits_once_then_reuses_skips_and_warm_refits(tmp_path):
+    forecaster = IncrementalForecaster(tmp_path, periods=5, min_new_rows=7)
+    data = occupancy(70)
+
+    preds, meta = forecaster.forecast("h1", data.iloc[:60])
+    assert meta["mode"] == "cold_fit" and len(preds) == 5
+    assert preds[0]["ds"] == "2024-03-01"
+    assert (tmp_path / "h1_prophet.joblib").exists()
+
+    again, meta = forecaster.forecast("h1", data.iloc[:60])
+    assert meta["mode"] == "duplicate" and again == preds
+
+    # Two more days: forecast moves forward without a refit
+    preds, meta = forecaster.forecast("h1", data.iloc[:62])
+    assert meta["mode"] == "reused" and meta["new_rows"] == 2
+    assert preds[0]["ds"] == "2024-03-03"
+
+    preds, meta = forecaster.forecast("h1", data)
+    assert meta["mode"] == "warm_refit" and meta["refit_reason"] == "new_rows"
+    assert meta["trained_rows"] == 70
+    assert forecaster.stats()["counts"]["cold_fit"] == 1
+
+
+def test_drift_and_revised_history_force_a_refit(tmp_path):
+    forecaster = IncrementalForecaster(tmp_path, periods=3, min_new_rows=30)
+    data = occupancy(60)
+    forecaster.forecast("h2", data.iloc[:50])
+
+    jumped = data.iloc[:53].copy()
+    jumped.loc[50:, "y"] += 40
+    _, meta = forecaster.forecast("h2", jumped)
+    assert meta["mode"] == "warm_refit" and meta["refit_reason"] == "drift"
+
+    revised = jumped.copy()
+    revised.loc[10, "y"] += 3
+    _, meta = forecaster.forecast("h2", revised)
+    assert meta["refit_reason"] == "history_changed"
+
+
+def test_state_survives_a_restart(tmp_path):
+    data = occupancy(41)
+    IncrementalForecaster(tmp_path).forecast("h3", data.iloc[:40])
+    _, meta = IncrementalForecaster(tmp_path).forecast("h3", data.iloc[:40])
+    assert meta["mode"] == "duplicate"
+    _, meta = IncrementalForecaster(tmp_path, drift_factor=5).forecast("h3", data)
+    assert meta["mode"] == "reused"
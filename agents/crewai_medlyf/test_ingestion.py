@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestion import IngestCache, IngestError, read_daily_series
+
+
+def write_upload(path, rows=500, per_day=4, seed=0):
+    rng = np.random.default_rng(seed)
+    ds = pd.date_range("2024-01-01", periods=rows, freq=f"{24 // per_day}h")
+    df = pd.DataFrame({"ward": "ICU", "ds": ds, "y": rng.uniform(40, 100, rows)})
+    df.to_csv(path, index=False)
+    return df
+
+
+def test_chunked_aggregation_matches_a_full_groupby(tmp_path):
+    path = tmp_path / "upload.csv"
+    raw = write_upload(path)
+    frame, stats = read_daily_series(path, chunk_rows=37)
+    expected = raw.groupby(raw["ds"].dt.floor("D"))["y"].mean()
+    assert frame["y"].dtype == np.float32
+    assert frame["ds"].tolist() == expected.index.tolist()
+    assert np.allclose(frame["y"], expected.to_numpy(), rtol=1e-5)
+    assert stats["chunks"] == 14 and stats["rows"] == 500 and stats["bad_rows"] == 0
+
+
+def test_a_few_malformed_rows_are_dropped(tmp_path):
+    path = tmp_path / "upload.csv"
+    write_upload(path, rows=100, per_day=1)
+    with open(path, "a") as f:
+        f.write("ICU,not-a-date,50\nICU,2024-05-01,n/a\n")
+    frame, stats = read_daily_series(path, chunk_rows=40)
+    assert stats["bad_rows"] == 2 and len(frame) == 100
+
+
+def test_mostly_malformed_upload_is_rejected_early(tmp_path):
+    path = tmp_path / "upload.csv"
+    pd.DataFrame({"ds": ["garbage"] * 1000, "y": range(1000)}).to_csv(path, index=False)
+    with pytest.raises(IngestError, match="first 100 rows"):
+        read_daily_series(path, chunk_rows=100)
+
+
+def test_file_that_breaks_after_the_first_chunk_is_rejected(tmp_path):
+    path = tmp_path / "upload.csv"
+    write_upload(path, rows=300, per_day=1)
+    lines = path.read_text().splitlines(keepends=True)
+    lines[201] = 'ICU,"2024-07-20,50\n'  # unterminated quote
+    path.write_text("".join(lines))
+    with pytest.raises(IngestError, match="unreadable CSV"):
+        read_daily_series(path, chunk_rows=100)
+
+
+def test_missing_columns_are_rejected(tmp_path):
+    path = tmp_path / "upload.csv"
+    pd.DataFrame({"date": ["2024-01-01"], "occupancy": [1]}).to_csv(path, index=False)
+    with pytest.raises(IngestError, match="ds, y"):
+        read_daily_series(path)
+
+
+def test_unchanged_upload_is_memory_mapped_from_the_cache(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "upload.csv"
+    write_upload(path)
+    cache = IngestCache(tmp_path / "ingest")
+    first = cache.load("h1", path)
+    second = cache.load("h1", path)
+    assert not first.stats["cached"] and second.stats["cached"]
+    pd.testing.assert_frame_equal(first.frame, second.frame)
+
+    write_upload(path, rows=600)
+    os.utime(path, ns=(1, 1))
+    third = cache.load("h1", path)
+    assert not third.stats["cached"] and third.stats["rows"] == 600
+    assert cache.stats() == {"hits": 1, "misses": 2, "rejected": 0, "arrow": True}
@@ -0,0 +1,79 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from metrics import STAGE_ERRORS, STAGE_SECONDS, MetricsRegistry, ProfileSwitch, profiled, propagate, timed
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+def test_render_prometheus_text():
+    reg = MetricsRegistry()
+    requests = reg.counter("app_requests_total", "Requests.", ("endpoint", "status"))
+    latency = reg.histogram("app_seconds", "Latency.", ("endpoint",), buckets=(0.1, 1))
+    reg.callback("app_inflight", "In flight.", lambda: 3)
+    reg.callback("app_broken", "Raises.", lambda: 1 / 0)
+
+    requests.inc(endpoint='say "hi"', status=200)
+    requests.inc(2, endpoint='say "hi"', status=200)
+    for value in (0.05, 0.5, 5):
+        latency.observe(value, endpoint="predict")
+
+    text = reg.render()
+    assert '# TYPE app_requests_total counter' in text
+    assert 'app_requests_total{endpoint="say \\"hi\\"",status="200"} 3' in text
+    assert 'app_seconds_bucket{endpoint="predict",le="0.1"} 1' in text
+    assert 'app_seconds_bucket{endpoint="predict",le="1"} 2' in text
+    assert 'app_seconds_bucket{endpoint="predict",le="+Inf"} 3' in text
+    assert 'app_seconds_count{endpoint="predict"} 3' in text
+    assert "app_inflight 3" in text
+    assert "# app_broken unavailable" in text
+    with pytest.raises(ValueError):
+        requests.inc(endpoint="x")  # missing label
+
+
+def test_timed_records_duration_and_errors():
+    before = STAGE_SECONDS.count(stage="test_stage"), STAGE_ERRORS.value(stage="test_stage")
+
+    @timed("test_stage")
+    def work(fail):
+        if fail:
+            raise RuntimeError("boom")
+
+    work(False)
+    with pytest.raises(RuntimeError):
+        work(True)
+    assert STAGE_SECONDS.count(stage="test_stage") == before[0] + 2
+    assert STAGE_ERRORS.value(stage="test_stage") == before[1] + 1
+
+
+def test_profile_only_when_armed_and_follows_pool_threads(tmp_path, monkeypatch):
+    import metrics
+
+    switch = ProfileSwitch()
+    monkeypatch.setattr(metrics, "PROFILES", switch)
+    monkeypatch.setattr(metrics, "PROFILE_DIR", str(tmp_path))
+
+    with profiled("scan") as profiler:
+        assert profiler is None  # not armed: no sampler thread
+    switch.arm("scan")
+    with ThreadPoolExecutor(max_workers=1) as pool, profiled("scan") as profiler:
+        assert profiler is not None
+        pool.submit(propagate(busy), 0.2).result()
+    assert switch.take("scan") is False  # armed once, used once
+
+    summary = switch.recent[-1]
+    assert summary["samples"] > 5
+    assert any(fn.endswith(":busy") for fn, _ in summary["top"])
+    folded = open(summary["path"]).read()
+    assert summary["path"].startswith(str(tmp_path))
+    assert "test_metrics.py:busy" in folded
+    assert not any(t.name.startswith("profiler-") for t in threading.enumerate())
@@ -0,0 +1,114 @@
+import joblib
+import numpy as np
+
+from model_registry import LazyModels, ModelRegistry, prophet_files, resolve_key
+
+
+def make_models_dir(tmp_path):
+    joblib.dump({"weights": np.arange(1000.0)}, tmp_path / "severity_rf.joblib")
+    joblib.dump(["high", "low"], tmp_path / "label_encoder.joblib")
+    for name in ("Malaria", "HIV_AIDS", "COVID-19"):
+        joblib.dump({"name": name}, tmp_path / f"prophet_{name}.pkl")
+    return str(tmp_path)
+
+
+def test_prophet_models_load_on_first_access(tmp_path):
+    calls = []
+
+    def loader(path):
+        calls.append(path)
+        return joblib.load(path)
+
+    models = LazyModels(prophet_files(make_models_dir(tmp_path)), loader=loader)
+    assert sorted(models) == ["covid 19", "hiv aids", "malaria"]
+    assert calls == []
+
+    assert models["hiv aids"] == {"name": "HIV_AIDS"}
+    assert models["hiv aids"] is models["hiv aids"]
+    assert len(calls) == 1 and models.loaded() == ["hiv aids"]
+
+
+def test_resolve_key_does_not_load_anything(tmp_path):
+    models = LazyModels(prophet_files(make_models_dir(tmp_path)))
+    assert resolve_key(models, "malaria") == "malaria"
+    assert resolve_key(models, "cerebral malaria") == "malaria"
+    assert resolve_key(models, "measles") is None
+    assert models.loaded() == []
+
+
+def test_registry_is_lazy_and_warmup_loads_everything(tmp_path):
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 6))
+    forest = RandomForestClassifier(n_estimators=20, max_depth=6, random_state=0).fit(X, (X[:, 0] > 0) + (X[:, 1] > 1))
+    make_models_dir(tmp_path)
+    joblib.dump(forest, tmp_path / "severity_rf.joblib")
+    registry = ModelRegistry(str(tmp_path))
+    assert registry.stats()["rf_loaded"] is False
+
+    # The trees are served from memory-mapped arrays, not a private unpickled copy
+    rf = registry.rf
+    assert isinstance(rf.threshold, np.memmap) and isinstance(rf.proba, np.memmap)
+    assert np.allclose(rf.predict_proba(X), forest.predict_proba(X))
+    assert (rf.predict(X) == forest.predict(X)).all()
+    # Another process on the node maps the same files
+    other = ModelRegistry(str(tmp_path)).rf
+    assert other.threshold.filename == rf.threshold.filename
+
+    registry.warmup()
+    stats = registry.stats()
+    assert stats["prophet_loaded"] == 3 and stats["warmup_s"] is not None
+    assert stats["rss_mb"] > 0 and stats["rf_packed"] is True
+
+
+class TinyRF:
+    classes_ = np.array([0, 1])
+
+    def __init__(self, broken=False):
+        self.broken = broken
+
+    def predict_proba(self, X):
+        return np.array([[np.nan, np.nan]]) if self.broken else np.array([[0.3, 0.7]])
+
+
+class TinyEncoder:
+    def __init__(self, tag=0):
+        self.tag = tag
+
+    def inverse_transform(self, codes):
+        return np.array(["low", "high"])[codes]
+
+
+def write_real_models(models_dir, rf):
+    joblib.dump(rf, models_dir / "severity_rf.joblib")
+    joblib.dump(TinyEncoder(), models_dir / "label_encoder.joblib")
+
+
+def test_reload_swaps_validated_version_and_rolls_back(tmp_path):
+    write_real_models(tmp_path, TinyRF())
+    registry = ModelRegistry(str(tmp_path))
+    swapped = []
+    registry.on_swap.append(lambda models: swapped.append(models.version))
+    first = registry.active()
+    assert registry.reload() == {"status": "unchanged", "version": first.version}
+
+    joblib.dump(TinyEncoder(tag=2), tmp_path / "label_encoder.joblib")
+    status = registry.reload()
+    assert status["status"] == "swapped" and status["previous"] == first.version
+    assert registry.active().version != first.version and swapped == [registry.active().version]
+    assert registry.versions()["previous"][0]["version"] == first.version
+
+    assert registry.rollback() == first.version
+    assert registry.active() is first
+
+
+def test_reload_rejects_models_that_fail_the_smoke_test(tmp_path):
+    write_real_models(tmp_path, TinyRF())
+    registry = ModelRegistry(str(tmp_path))
+    first = registry.active()
+
+    write_real_models(tmp_path, TinyRF(broken=True))
+    status = registry.reload()
+    assert status["status"] == "rejected"
+    assert registry.active() is first
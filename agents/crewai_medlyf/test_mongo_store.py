@@ -0,0 +1,126 @@
+import mongomock
+from pymongo.errors import AutoReconnect, BulkWriteError, OperationFailure
+
+from mongo_store import BatchedWriter, get_client
+
+
+def make_writer(**kwargs):
+    col = mongomock.MongoClient().db.predictions
+    return col, BatchedWriter(lambda: col, sleep=lambda s: None, **kwargs)
+
+
+def result(disease, cases, date="2025-01-01"):
+    return {"disease": disease, "predicted_date": date, "predicted_cases": cases}
+
+
+def test_rerun_upserts_instead_of_duplicating():
+    col, writer = make_writer()
+    for cases in (10, 12):
+        writer.add(result("Malaria", cases))
+        writer.add(result("Dengue", 5))
+        assert writer.flush() == 2
+
+    docs = list(col.find({}, {"_id": 0}))
+    assert len(docs) == 2
+    malaria = col.find_one({"disease": "Malaria"})
+    assert malaria["predicted_cases"] == 12
+    assert malaria["created_at"] <= malaria["updated_at"]
+
+
+def test_documents_without_key_fields_are_inserted():
+    col, writer = make_writer()
+    writer.add({"raw_output": "???", "disease": "Unknown_Parse_Error"})
+    writer.add({"raw_output": "???", "disease": "Unknown_Parse_Error"})
+    writer.flush()
+    assert col.count_documents({}) == 2
+
+
+def test_batch_size_triggers_flush_and_stats():
+    col, writer = make_writer(batch_size=3)
+    for i in range(7):
+        writer.add(result("Malaria", i, date=f"2025-0{i + 1}-01"))
+    assert col.count_documents({}) == 6 and writer.pending() == 1
+    stats = writer.stats()
+    assert stats["flushes"] == 2 and stats["last_batch_size"] == 3
+    assert stats["last_flush_ms"] is not None
+
+
+class FlakyCollection:
+    def __init__(self, col, failures, error=AutoReconnect, apply=False):
+        self.col, self.failures, self.error, self.apply = col, failures, error, apply
+        self.calls = 0
+
+    def bulk_write(self, ops, ordered=False):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            if self.apply:  # the write reached the server, the reply didn't
+                self.col.bulk_write(ops, ordered=ordered)
+            raise self.error("primary stepped down")
+        return self.col.bulk_write(ops, ordered=ordered)
+
+
+def test_retries_with_backoff_then_keeps_batch_on_failure():
+    col = mongomock.MongoClient().db.predictions
+    sleeps = []
+    flaky = FlakyCollection(col, failures=2)
+    writer = BatchedWriter(lambda: flaky, max_retries=2, backoff_s=0.1, sleep=sleeps.append)
+    writer.add(result("Malaria", 1))
+    assert writer.flush() == 1
+    assert sleeps == [0.1, 0.2] and writer.stats()["retries"] == 2
+
+    flaky.failures = 5
+    writer.add(result("Dengue", 1))
+    assert writer.flush() == 0
+    assert writer.pending() == 1 and writer.stats()["failed_flushes"] == 1
+
+
+def test_resent_inserts_are_not_duplicated_and_fatal_errors_not_retried():
+    col = mongomock.MongoClient().db.predictions
+    flaky = FlakyCollection(col, failures=1, apply=True)
+    writer = BatchedWriter(lambda: flaky, sleep=lambda s: None, max_pending=3)
+    writer.add({"raw_output": "???", "disease": "Unknown_Parse_Error"})
+    writer.add(result("Malaria", 1))
+    assert writer.flush() == 2
+    assert col.count_documents({}) == 2 and writer.stats()["retries"] == 1
+
+    flaky.failures, flaky.error, flaky.apply, flaky.calls = 1, OperationFailure, False, 0
+    for i in range(5):
+        writer.add(result("Dengue", i, date=f"2025-0{i + 1}-01"))
+    assert writer.pending() == 3 and writer.stats()["docs_dropped"] == 2  # capped
+    assert writer.flush() == 0 and flaky.calls == 1 and writer.pending() == 3
+
+
+def test_partial_bulk_error_resends_only_retryable_failures():
+    col = mongomock.MongoClient().db.predictions
+    sent = []
+
+    class Partial:
+        def bulk_write(self, ops, ordered=False):
+            sent.append(len(ops))
+            if len(sent) == 1:
+                col.bulk_write([ops[0]], ordered=ordered)
+                raise BulkWriteError({"writeErrors": [
+                    {"index": 1, "code": 11600, "errmsg": "interrupted at shutdown"},
+                    {"index": 2, "code": 121, "errmsg": "document failed validation"},
+                ]})
+            return col.bulk_write(ops, ordered=ordered)
+
+    writer = BatchedWriter(lambda: Partial(), sleep=lambda s: None)
+    for disease in ("Malaria", "Dengue", "Typhoid"):
+        writer.add(result(disease, 1))
+    assert writer.flush() == 2 and sent == [3, 1]
+    assert sorted(col.distinct("disease")) == ["Dengue", "Malaria"]
+    assert writer.stats()["docs_dropped"] == 1 and writer.pending() == 0
+
+
+def test_client_is_shared_per_process():
+    made = []
+
+    def factory(uri, **kwargs):
+        made.append(uri)
+        return mongomock.MongoClient()
+
+    a = get_client("mongodb://test-shared", client_factory=factory)
+    b = get_client("mongodb://test-shared", client_factory=factory)
+    assert a is b and made == ["mongodb://test-shared"]
@@ -0,0 +1,52 @@
+import time
+
+from name_index import NameIndex
+
+KEYS = ["covid 19", "dengue", "malaria", "hiv aids", "measles", "typhoid", "viral flu", "tuberculosis"]
+
+
+def test_exact_spacing_and_aliases():
+    index = NameIndex(KEYS)
+    assert index.resolve("COVID-19") == "covid 19"
+    assert index.resolve("covid19") == "covid 19"
+    assert index.resolve("HIV") == "hiv aids"
+    assert index.resolve("TB") == "tuberculosis"
+    assert index.resolve("Influenza") == "viral flu"
+
+
+def test_most_specific_key_wins_over_substrings():
+    index = NameIndex(["flu", "viral flu", "malaria"])
+    assert index.resolve("viral flu ward 7") == "viral flu"
+    assert index.resolve("avian flu") == "flu"
+    assert index.resolve("cerebral malaria") == "malaria"
+    # substring of a word is not a match ("flu" in "fluoride")
+    assert NameIndex(["flu"], aliases={}).resolve("fluoride poisoning") is None
+
+
+def test_typos_resolve_by_trigrams_and_unrelated_names_do_not():
+    index = NameIndex(KEYS)
+    assert index.resolve("tuberclosis") == "tuberculosis"
+    assert index.resolve("malria") == "malaria"
+    assert index.resolve("chikungunya") is None
+
+
+def test_results_and_misses_are_cached():
+    index = NameIndex(KEYS, negative_size=2)
+    for _ in range(3):
+        index.resolve("Dengue")
+        index.resolve("ebola")
+    stats = index.stats()
+    assert stats["exact"] == 1 and stats["cache_hits"] == 2
+    assert stats["unknown"] == 1 and stats["negative_hits"] == 2
+    index.resolve("zika")
+    index.resolve("nipah")
+    assert index.stats()["negative"] == 2
+
+
+def test_thousands_of_ward_keys_resolve_quickly():
+    keys = [f"{d} ward {w}" for d in KEYS for w in range(500)]
+    start = time.perf_counter()
+    index = NameIndex(keys)
+    assert index.resolve("Dengue Ward 317") == "dengue ward 317"
+    assert index.resolve("viral flu ward 42 east") == "viral flu ward 42"
+    assert time.perf_counter() - start < 2.0
@@ -0,0 +1,56 @@
+import time
+
+import joblib
+import pandas as pd
+
+from parallel_scan import ScanPool
+
+
+class FakeProphet:
+    """Picklable stand-in with Prophet's make_future_dataframe/predict API."""
+
+    def __init__(self, level, delay=0.0):
+        self.level = level
+        self.delay = delay
+
+    def make_future_dataframe(self, periods, freq="MS"):
+        return pd.DataFrame({"ds": pd.date_range("2024-11-01", periods=2 + periods, freq=freq)})
+
+    def predict(self, future):
+        time.sleep(self.delay)
+        return future.assign(yhat=[self.level + i for i in range(len(future))])
+
+
+def make_models(tmp_path, models):
+    for name, model in models.items():
+        joblib.dump(model, tmp_path / f"prophet_{name}.pkl")
+    return str(tmp_path)
+
+
+def test_results_keep_input_order_and_report_speedup(tmp_path):
+    models_dir = make_models(tmp_path, {"Malaria": FakeProphet(100), "HIV_AIDS": FakeProphet(200), "Dengue": FakeProphet(300)})
+    pool = ScanPool(models_dir, workers=2, timeout_s=30)
+    try:
+        results, summary = pool.forecast(["Dengue", "HIV/AIDS", "Unknown", "Malaria"], periods=2)
+    finally:
+        pool.recycle()
+
+    assert [d for d, _ in results] == ["Dengue", "HIV/AIDS", "Unknown", "Malaria"]
+    assert results[1][1][2]["yhat"] == 203.0
+    assert str(results[0][1][1]["ds"].date()) == "2025-01-01"
+    assert "error" in results[2][1]
+    assert list(summary["durations_s"]) == ["Dengue", "HIV/AIDS", "Unknown", "Malaria"]
+    assert summary["workers"] == 2 and summary["timeouts"] == 0
+
+
+def test_slow_disease_times_out_without_blocking_others(tmp_path):
+    models_dir = make_models(tmp_path, {"Slow": FakeProphet(1, delay=30), "Fast": FakeProphet(2)})
+    pool = ScanPool(models_dir, workers=2, timeout_s=2)
+    try:
+        results, summary = pool.forecast(["Slow", "Fast"], periods=1)
+    finally:
+        pool.recycle()
+
+    assert "timed out" in results[0][1]["error"]
+    assert results[1][1][1]["yhat"] == 4.0
+    assert summary["timeouts"] == 1
@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+from ingestion import IngestCache, IngestError
+from patient_store import PatientStore
+
+NORTH = [
+    {"name": "A", "reason": "Fever", "condition": "Stable", "alive": True, "timeOfAdmit": "2025-01-01T08:00:00Z"},
+    {"name": "B", "reason": "Accident", "condition": "Critical", "alive": True, "timeOfAdmit": "2025-01-02T09:00:00Z"},
+    {"name": "C", "reason": "Fever", "condition": "Stable", "alive": False, "timeOfAdmit": "2025-01-02T10:00:00Z"},
+    {"name": "D", "reason": "Fever", "condition": "Stable", "timeOfAdmit": "not a date"},
+]
+SOUTH = [
+    {"name": "E", "disease": "Cough", "inHospital": "yes", "active": True, "timeOfAdmit": "2025-01-01T12:00:00.000Z"},
+    {"name": "F", "disease": "Fever", "inHospital": "no", "active": False, "timeOfAdmit": "2025-01-04T12:00:00.000Z"},
+]
+
+
+def write(path, doc, mtime_ns=None):
+    path.write_text(json.dumps(doc))
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+def test_window_condition_and_occupancy_queries(tmp_path):
+    write(tmp_path / "north.json", NORTH)
+    write(tmp_path / "south.json", SOUTH)
+    write(tmp_path / "oxygen.json", {"patientName": "x", "litresUsed": 5})  # not admissions
+    adm = PatientStore(tmp_path).get()
+
+    assert len(adm) == 5 and adm.rejected == 1
+    assert sorted(adm.by_hospital) == ["north", "south"]
+    assert adm.admissions("2025-01-01", "2025-01-03") == 4
+    assert adm.admissions("2025-01-01", "2025-01-03", hospital="north") == 3
+    assert adm.counts("2025-01-01", "2025-01-03", hospital="north") == {"Stable": 2, "Critical": 1}
+    assert adm.counts("2025-01-01", "2025-01-05", hospital="south", by="reason") == {"Cough": 1, "Fever": 1}
+    assert adm.occupancy("2025-01-02T12:00:00Z", stay_days=1) == 2  # admitted after Jan 1 12:00
+    assert adm.census("south") == 1
+
+    series = adm.series("north", stay_days=2)
+    assert list(series.columns) == ["ds", "y"]
+    assert [str(d.date()) for d in series["ds"]] == ["2025-01-01", "2025-01-02"]
+    assert series["y"].tolist() == [1.0, 3.0]
+
+
+def test_only_changed_files_are_reparsed(tmp_path, monkeypatch):
+    import patient_store
+
+    parsed = []
+    real_parse = patient_store.parse_file
+    monkeypatch.setattr(patient_store, "parse_file", lambda path, *a, **kw: parsed.append(path) or real_parse(path, *a, **kw))
+    write(tmp_path / "north.json", NORTH, mtime_ns=1_000_000_000)
+    write(tmp_path / "south.json", SOUTH, mtime_ns=1_000_000_000)
+    store = PatientStore(tmp_path)
+
+    first = store.get()
+    assert store.get() is first and len(parsed) == 2
+    write(tmp_path / "south.json", SOUTH[:1], mtime_ns=2_000_000_000)
+    second = store.get()
+    assert parsed[2:] == [str(tmp_path / "south.json")]
+    assert len(second) == 4 and second.counts("2025-01-01", "2025-02-01")["Stable"] == 2
+    (tmp_path / "broken.json").write_text("[{\"name\": ")
+    assert len(store.get()) == 4 and store.stats()["unreadable_files"] == [str(tmp_path / "broken.json")]
+
+
+def test_admissions_export_is_a_forecast_upload(tmp_path):
+    cache = IngestCache(tmp_path / "ingest")
+    upload = write(tmp_path / "upload.json", NORTH)
+    result = cache.load("north", upload)
+    assert result.frame["y"].tolist() == [1.0, 3.0] and result.stats["bad_rows"] == 1
+    assert cache.load("north", upload).frame["y"].tolist() == [1.0, 3.0]
+
+    with pytest.raises(IngestError):
+        cache.load("empty", write(tmp_path / "empty.json", []))
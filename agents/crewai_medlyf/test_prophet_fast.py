@@ -0,0 +1,82 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("prophet")
+from prophet import Prophet
+
+from prophet_fast import FastProphet, engine_for, forecast_rows, predict_frame
+
+logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+
+
+def fit(df, **kwargs):
+    model = Prophet(**kwargs)
+    model.fit(df)
+    return model
+
+
+@pytest.fixture(scope="module")
+def monthly():
+    rng = np.random.default_rng(0)
+    t = np.arange(60)
+    y = 100 + t + 20 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 3, 60)
+    df = pd.DataFrame({"ds": pd.date_range("2020-01-01", periods=60, freq="MS"), "y": y})
+    return fit(df, yearly_seasonality=True, weekly_seasonality=False, daily_seasonality=False)
+
+
+@pytest.fixture(scope="module")
+def daily_multiplicative():
+    rng = np.random.default_rng(1)
+    t = np.arange(200)
+    y = 70 + 0.05 * t + 5 * np.sin(2 * np.pi * t / 7) + rng.normal(0, 2, 200)
+    df = pd.DataFrame({"ds": pd.date_range("2024-01-01", periods=200, freq="D"), "y": y})
+    return fit(df, weekly_seasonality=True, seasonality_mode="multiplicative")
+
+
+@pytest.mark.parametrize("name,freq", [("monthly", "MS"), ("daily_multiplicative", "D")])
+def test_matches_prophet_predict(request, name, freq):
+    model = request.getfixturevalue(name)
+    engine = engine_for(model)
+    assert isinstance(engine, FastProphet)
+
+    expected = model.predict(model.make_future_dataframe(periods=6, freq=freq))
+    future = expected.tail(6)
+    got = engine.forecast(6, freq)
+    assert list(got["ds"]) == list(future["ds"])
+    np.testing.assert_allclose(got["yhat"], future["yhat"], rtol=1e-9)
+    np.testing.assert_allclose(got["trend"], future["trend"], rtol=1e-9)
+
+    # Any dates, including the history
+    history = engine.predict(expected["ds"])
+    np.testing.assert_allclose(history["yhat"], expected["yhat"], rtol=1e-9)
+
+    rows = forecast_rows(model, 6, freq)
+    assert rows[6]["ds"] == future["ds"].iloc[-1]
+    assert rows[1]["yhat"] == pytest.approx(future["yhat"].iloc[0])
+
+
+def test_intervals_agree_with_prophet_up_to_sampling_noise(daily_multiplicative):
+    model = daily_multiplicative
+    future = model.make_future_dataframe(periods=10, freq="D").tail(10)
+    expected = model.predict(future)
+    got = predict_frame(model, future["ds"], intervals=True)
+    width = (expected["yhat_upper"] - expected["yhat_lower"]).to_numpy()
+    for col in ("yhat_lower", "yhat_upper"):
+        assert np.all(np.abs(got[col].to_numpy() - expected[col].to_numpy()) < 0.25 * width)
+    assert np.all(got["yhat_lower"] < got["yhat"]) and np.all(got["yhat"] < got["yhat_upper"])
+
+
+def test_unsupported_models_fall_back_to_predict(monthly):
+    holidays = pd.DataFrame({"holiday": "festival", "ds": pd.to_datetime(["2021-10-01", "2022-10-01", "2023-10-01"])})
+    df = monthly.history[["ds", "y"]]
+    with_holidays = fit(df, holidays=holidays, weekly_seasonality=False, daily_seasonality=False)
+    assert engine_for(with_holidays) is None
+
+    expected = with_holidays.predict(with_holidays.make_future_dataframe(periods=2, freq="MS")).tail(2)
+    rows = forecast_rows(with_holidays, 2, "MS")
+    assert [rows[h]["yhat"] for h in (1, 2)] == pytest.approx(expected["yhat"].tolist())
+
+    assert engine_for({"not": "a model"}) is None
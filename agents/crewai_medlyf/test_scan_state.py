@@ -0,0 +1,102 @@
+import os
+
+from dataset_cache import DatasetCache
+from scan_state import ScanState, disease_digests
+
+CSV = """year,month,disease,condition,reported_cases
+2020,Jan,COVID-19,medium,5000
+2020,Jan,HIV/AIDS,low,500
+2020,Feb,COVID-19,high,7000
+2020,Feb,HIV/AIDS,low,450
+"""
+
+
+class StubModels:
+    def __init__(self, prophet):
+        self.prophet = prophet
+        self.digests = {"severity_rf.joblib": "rf1", "label_encoder.joblib": "le1"}
+
+    def prophet_digest(self, clean_name):
+        return self.prophet.get(clean_name)
+
+
+def digests_for(tmp_path, csv, prophet, mtime_ns):
+    path = tmp_path / "data.csv"
+    path.write_text(csv)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return disease_digests(DatasetCache(str(path)).get(), StubModels(prophet), [1, 2])
+
+
+def test_only_changed_series_or_models_are_dirty(tmp_path):
+    prophet = {"covid 19": "c1", "hiv aids": "h1"}
+    before = digests_for(tmp_path, CSV, prophet, 1_000_000_000)
+    state = ScanState(tmp_path / "state.json").load()
+    assert state.partition(before) == (["COVID-19", "HIV/AIDS"], [])
+
+    state.begin(before)
+    for disease in before:
+        state.record(disease, before[disease], results={1: {"disease": disease, "predicted_cases": 1}})
+    state.finish()
+
+    state = ScanState(tmp_path / "state.json").load()
+    assert state.partition(before) == ([], ["COVID-19", "HIV/AIDS"])
+    assert state.results("COVID-19") == {1: {"disease": "COVID-19", "predicted_cases": 1}}
+
+    # New month for HIV/AIDS only; then a new COVID-19 model
+    after = digests_for(tmp_path, CSV + "2020,Mar,HIV/AIDS,low,400\n", prophet, 2_000_000_000)
+    assert state.partition(after) == (["HIV/AIDS"], ["COVID-19"])
+    after = digests_for(tmp_path, CSV, {**prophet, "covid 19": "c2"}, 3_000_000_000)
+    assert state.partition(after) == (["COVID-19"], ["HIV/AIDS"])
+
+
+def test_failed_diseases_are_retried_and_summary_is_kept(tmp_path):
+    state = ScanState(tmp_path / "state.json").load()
+    digests = {"A": "a", "B": "b", "C": "c"}
+    state.begin(digests)
+    state.record("A", "a", results={1: {"predicted_cases": 3}})
+    state.record("B", "b", error="Forecast math failed")
+    state.record("C", "c", results={1: {"predicted_cases": 5}})
+    state.finish()
+
+    state.load()
+    assert state.partition(digests) == (["B"], ["A", "C"])
+    state.begin({"A": "a", "B": "b"})  # C left the dataset
+    state.skip("A")
+    state.record("B", "b", results={1: {"predicted_cases": 4}})
+    summary = state.finish()
+
+    assert summary["skipped"] == ["A"] and summary["recomputed"] == ["B"] and summary["failed"] == {}
+    stats = ScanState(tmp_path / "state.json").load().stats()
+    assert stats["diseases"] == 2 and stats["skipped"] == 1 and stats["recomputed"] == 1
+
+
+def test_corrupt_or_invalidated_state_recomputes_everything(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text("{not json")
+    state = ScanState(path).load()
+    assert state.partition({"A": "a"}) == (["A"], [])
+
+    state.begin({"A": "a"})
+    state.record("A", "a", results={1: {"predicted_cases": 3}})
+    state.finish()
+    state.invalidate()
+    assert not path.exists()
+    assert state.load().partition({"A": "a"}) == (["A"], [])
+
+
+def test_invalidation_during_a_scan_is_not_written_back(tmp_path):
+    path = tmp_path / "state.json"
+    state = ScanState(path).load()
+    state.begin({"A": "a"})
+    state.record("A", "a", results={1: {"predicted_cases": 3}})
+    state.finish()
+
+    # /trigger-scan?full=1 while the next scan is between load() and finish()
+    state.load()
+    assert state.partition({"A": "a"}) == ([], ["A"])
+    state.begin({"A": "a"})
+    state.invalidate()
+    state.skip("A")
+    summary = state.finish()
+    assert summary["skipped"] == ["A"]
+    assert ScanState(path).load().partition({"A": "a"}) == (["A"], [])
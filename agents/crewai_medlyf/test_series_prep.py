@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from series_prep import MonthlyPanel, build_ds, month_numbers, normalize_names
+from severity import features_from_tails
+
+
+def test_months_parse_in_any_mixed_format():
+    nums = month_numbers(["Jan", "February", " sep ", "12", "13", "Smarch", None])
+    assert nums[:4].tolist() == [1, 2, 9, 12]
+    assert np.isnan(nums[4:]).all()
+    ds = build_ds(pd.DataFrame({"year": [2020, 2021, "x"], "month": ["Mar", "march", "Mar"]}))
+    assert ds.iloc[:2].dt.strftime("%Y-%m-%d").tolist() == ["2020-03-01", "2021-03-01"]
+    assert pd.isna(ds.iloc[2])
+
+
+def test_names_normalize_once_and_merge_spellings():
+    clean = normalize_names(pd.Series(["HIV/AIDS", "COVID-19", "HIV-AIDS", None]))
+    assert clean.tolist()[:3] == ["hiv aids", "covid 19", "hiv aids"]
+    assert list(clean.cat.categories) == ["hiv aids", "covid 19"] and pd.isna(clean.iloc[3])
+
+
+def test_panel_matches_per_disease_groupby():
+    rng = np.random.default_rng(3)
+    n = 5000
+    df = pd.DataFrame({
+        "disease": rng.choice(["flu", "dengue", "tb"], n),
+        "ds": pd.to_datetime("2019-01-01") + pd.to_timedelta(rng.integers(0, 1500, n), unit="D"),
+        "y": rng.integers(0, 50, n),
+    })
+    df = df[~((df["disease"] == "tb") & (df["ds"].dt.year == 2020))]  # an interior gap
+    df = df[~((df["disease"] == "dengue") & (df["ds"] < "2019-06-01"))]  # a late start
+    panel = MonthlyPanel.build(df["disease"], df["ds"], df["y"])
+
+    assert panel.keys == list(df["disease"].unique())
+    for key, part in df.groupby("disease"):
+        expected = part[["ds", "y"]].groupby(pd.Grouper(key="ds", freq="MS")).sum().reset_index()
+        got = panel.series(key)
+        assert got["ds"].tolist() == expected["ds"].tolist()
+        assert got["y"].tolist() == expected["y"].tolist()
+    assert panel.frame().shape == (len(panel.months), 3)
+
+
+def test_tails_are_padded_with_the_first_value_and_match_pandas_rolling():
+    df = pd.DataFrame({
+        "disease": ["a", "a", "a", "a", "b"],
+        "ds": pd.to_datetime(["2024-01-01", "2024-02-01", "2024-03-01", "2024-04-01", "2024-04-01"]),
+        "y": [1.0, 4.0, 9.0, 16.0, 7.0],
+    })
+    panel = MonthlyPanel.build(df["disease"], df["ds"], df["y"])
+    tails = panel.tails()
+    assert tails.tolist() == [[4.0, 9.0, 16.0], [7.0, 7.0, 7.0]]
+
+    feats = features_from_tails(tails, [5, 5])
+    assert feats[0, :3].tolist() == [16.0, 9.0, 4.0] and feats[1].tolist() == [7.0, 7.0, 7.0, 7.0, 0.0, 5.0]
+    rolling = df[df["disease"] == "a"]["y"].rolling(3)
+    assert np.isclose(feats[0, 3], rolling.mean().iloc[-1]) and np.isclose(feats[0, 4], rolling.std().iloc[-1])
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from serving import LoadShedder, inflight_cap, PredictionPool, PredictionTimeout, ProcessLock, ScanQueue
+
+
+def test_process_lock_is_exclusive_and_released(tmp_path):
+    path = tmp_path / "scheduler.lock"
+    first, second = ProcessLock(path), ProcessLock(path)
+
+    assert first.acquire()
+    assert not second.acquire()
+    assert second.holder() is not None
+
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+def test_scan_queue_merges_requests_while_one_runs(tmp_path):
+    gate = threading.Event()
+    runs = []
+
+    def run(full=False):
+        runs.append(full)
+        gate.wait(5)
+
+    queue = ScanQueue(run, lock=ProcessLock(tmp_path / "scan.lock"))
+    first, status = queue.submit()
+    assert status == "queued"
+    while queue.status()["running"] is None:
+        time.sleep(0.01)
+
+    # One follow-up is queued behind the running scan; the rest merge into it
+    follow_up, status = queue.submit()
+    assert status == "queued"
+    for full in (False, True, False, False, False):
+        job, status = queue.submit(full=full)
+        assert status == "merged" and job["id"] == follow_up["id"]
+
+    gate.set()
+    assert queue.wait_idle(5)
+    status = queue.status()
+    assert runs == [False, True]  # a full request merged into the follow-up makes it full
+    assert status["completed"] == 2 and status["merged"] == 5
+    assert [j["id"] for j in status["recent"]] == [first["id"], follow_up["id"]]
+
+
+def test_scan_queue_rejects_scan_running_in_another_process(tmp_path):
+    other = ProcessLock(tmp_path / "scan.lock")
+    assert other.acquire()
+    queue = ScanQueue(lambda full: None, lock=ProcessLock(tmp_path / "scan.lock"))
+
+    _, status = queue.submit()
+    assert status == "rejected"
+
+    other.release()
+    _, status = queue.submit()
+    assert status == "queued"
+    assert queue.wait_idle(5)
+
+
+def test_failed_scan_is_recorded():
+    def run(full=False):
+        raise RuntimeError("csv missing")
+
+    queue = ScanQueue(run)
+    queue.submit()
+    assert queue.wait_idle(5)
+    job = queue.status()["recent"][-1]
+    assert job["state"] == "failed" and job["error"] == "csv missing"
+
+
+def test_load_shedder_caps_inflight():
+    shedder = LoadShedder(max_inflight=2)
+    assert shedder.try_enter() and shedder.try_enter()
+    assert not shedder.try_enter()
+    shedder.leave()
+    assert shedder.try_enter()
+    assert shedder.stats() == {"max_inflight": 2, "inflight": 2, "peak": 2, "accepted": 3, "shed": 1}
+
+    # Below gunicorn's thread count, or it never triggers
+    assert inflight_cap(8) == 7 and inflight_cap(8, requested=32) == 7 and inflight_cap(8, requested=4) == 4
+    assert inflight_cap(1) == 1 and inflight_cap(8, requested=0) == 0
+
+
+def test_prediction_pool_times_out():
+    pool = PredictionPool(workers=1, timeout_s=0.05)
+    assert pool.run(lambda x: x * 2, 21) == 42
+    with pytest.raises(PredictionTimeout):
+        pool.run(time.sleep, 0.5)
+    # The abandoned sleep still holds the only thread
+    assert pool.stats()["timeouts"] == 1 and pool.stats()["busy"] == 1
+    deadline = time.monotonic() + 5
+    while pool.stats()["busy"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.stats()["busy"] == 0
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from severity import FEATURE_COLUMNS, features_from_tails, horizon_tails, score_tails
+
+
+class CountingRF(RandomForestClassifier):
+    calls = 0
+
+    def predict_proba(self, X):
+        CountingRF.calls += 1
+        return super().predict_proba(X)
+
+
+def fitted_models():
+    le = LabelEncoder().fit(["high", "low"])
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(0, 100, (200, 6)), columns=FEATURE_COLUMNS)
+    y = le.transform(np.where(X["lag_1"] > 50, "high", "low"))
+    return CountingRF(n_estimators=10, random_state=0).fit(X, y), le
+
+
+def test_horizons_see_history_then_earlier_forecasts():
+    windows = horizon_tails([[2, 4, 8], [5, 5, 5]], [[10, 20, 30], [6, 7, 8]])
+    assert windows.shape == (2, 3, 3)
+    assert windows[0].tolist() == [[2, 4, 8], [4, 8, 10], [8, 10, 20]]
+    assert windows[1, 2].tolist() == [5, 6, 7]
+
+    feats = features_from_tails(windows[0, :1], [3])[0]
+    assert feats.tolist() == [8.0, 4.0, 2.0, 14 / 3, float(np.std([2, 4, 8], ddof=1)), 3]
+
+
+def test_score_tails_single_predict_proba_call():
+    clf, le = fitted_models()
+    CountingRF.calls = 0
+    scored = score_tails(clf, le, [[10, 20, 90], [90, 80, 5]], [1, 3])
+
+    assert CountingRF.calls == 1
+    assert scored[0][0] == "high" and scored[1][0] == "low"
+    assert all(0.5 <= conf <= 1.0 for _, conf in scored)
+
+
+def test_score_tails_without_model_is_unknown():
+    assert score_tails(None, None, [[1, 2, 3]], [1]) == [("Unknown", 0.0)]
+    assert score_tails(None, None, np.empty((0, 3)), []) == []
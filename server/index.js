@@ -271,6 +271,31 @@ app.post('/api/jobs', async (req, res) => {
   }
 });
 
+// Bulk creation for the crew's logistics agent: one request per surge window.
+// Jobs are created and assigned in order; each item reports its own status.
+app.post('/api/jobs/bulk', async (req, res) => {
+  const items = Array.isArray(req.body && req.body.jobs) ? req.body.jobs : null;
+  if (!items || items.length === 0) {
+    return res.status(400).json({ error: 'jobs must be a non-empty array' });
+  }
+  const results = [];
+  for (const { type, priority, hospitalId } of items) {
+    try {
+      const job = new Job({ type, priority, hospitalId });
+      await job.save();
+
+      const assignment = await assignJob(job._id);
+      if (assignment) {
+        io.emit('job_update', assignment.job);
+      }
+      results.push({ status: 201, job });
+    } catch (err) {
+      results.push({ status: 500, error: err.message });
+    }
+  }
+  res.status(200).json({ results });
+});
+
 app.get('/api/jobs', async (req, res) => {
   try {
     const jobs = await Job.find().populate('vehicleId').sort({ scheduledAt: -1 });